@@ -1,22 +1,101 @@
-from openai import OpenAI
-import chromadb
+import time
+_IMPORT_STARTED = time.perf_counter()
 import uuid 
+import hashlib
 import datetime
 import logging
 import re
 import json
-from personas import PERSONA_LIBRARY
-
-# Initialize OpenAI client
-client = OpenAI()
-# Initialize Chroma client
-chroma_client = chromadb.PersistentClient(path="./chroma_db")
-
-SESSION_COLLECTION = None
-SESSION_ID = None
+import os
+import contextlib
+import argparse
+import sys
+from persona_registry import PERSONA_LIBRARY, PERSONA_REGISTRY
+from drift_detector import DriftDetector
+from convergence import ConvergenceMonitor
+from vector_utils import cosine_similarity_matrix, weighted_sum_vector
+from reranking import mmr_rerank, fit_to_token_budget
+from prompt_assembler import PromptAssembler, PromptCacheStats
+from essence_cache import ESSENCE_MAX_TOKENS, EssenceCache, essence_key
+from token_utils import count_tokens, truncate_to_tokens
+from local_embeddings import create_local_embedder, local_embedding_uses
+from instrumentation import TRACER
+from bounded_cache import LRUCache
+from checkpoint import SessionCheckpoint, DEFAULT_CHECKPOINT_DIR, list_checkpoints
+from session_context import SessionContext
+from budget import SessionBudget
+from turn_log import TurnLog
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from consolidation import CONSOLIDATION_DEFAULTS, recency_weights, cluster_summaries
+from persona_selection import PersonaFieldIndex, persona_field_texts
+from gap_personas import GapPersonaCreator
+
+# Clients and collections are created on first use (or by warm_up()), so importing this
+# module has no side effects. STARTUP_PROFILE records how long each one took, in ms.
+STARTUP_PROFILE = {}
+_RESOURCES = {}
+_RESOURCE_LOCKS = {name: threading.Lock()
+                   for name in ("openai", "chroma", "archive", "persona_fields", "essences",
+                                "local_embedder", "local_embedding_uses")}
+
+def _lazy_resource(name, factory):
+    resource = _RESOURCES.get(name)
+    if resource is None:
+        with _RESOURCE_LOCKS[name]:
+            resource = _RESOURCES.get(name)
+            if resource is None:
+                start = time.perf_counter()
+                resource = factory()
+                STARTUP_PROFILE[name] = (time.perf_counter() - start) * 1000
+                _RESOURCES[name] = resource
+    return resource
+
+def _http_pool_size():
+    # One kept-alive connection per call the governor lets through at once
+    from http_transport import DEFAULT_POOL_SIZE
+    return GOVERNOR.max_concurrent if GOVERNOR is not None else DEFAULT_POOL_SIZE
+
+def _create_openai_client():
+    from openai import OpenAI
+    from http_transport import build_http_client
+    return OpenAI(http_client=build_http_client(_http_pool_size()))
+
+def _create_chroma_client():
+    # Embedded by default; BRAINSTORMER_CHROMA_MODE=http shares one Chroma server between workers
+    from chroma_backend import create_chroma_client
+    return create_chroma_client(_http_pool_size())
+
+def get_openai_client():
+    return _lazy_resource("openai", _create_openai_client)
+
+def endpoint_timeout(path, max_tokens=None):
+    from http_transport import endpoint_timeout
+    return endpoint_timeout(path, max_tokens)
+
+def get_chroma_client():
+    return _lazy_resource("chroma", _create_chroma_client)
+
+# HNSW settings for 'persona_library'. Compare alternatives with `python testcases.py`,
+# which sweeps configs_to_test and reports recall@k, aspect coverage, latency, build time and memory.
+PERSONA_HNSW_CONFIG = {"M": 32, "construction_ef": 250, "search_ef": 150}
+
+def get_archive_collection():
+    """
+    Returns the archive collection shared by all sessions, creating it if needed.
+    """
+    return _lazy_resource("archive", lambda: TRACER.wrap_collection(
+        get_chroma_client().get_or_create_collection(name="all_session_archives")
+    ))
 
-# Create a new or existing archive collection:
-archive_collection = chroma_client.get_or_create_collection(name="all_session_archives")
+def get_persona_fields_collection():
+    """
+    Returns the per-field persona embeddings, kept apart from 'persona_library' so whole-persona
+    queries never see the same persona once per field.
+    """
+    return _lazy_resource("persona_fields", lambda: TRACER.wrap_collection(
+        get_chroma_client().get_or_create_collection(name="persona_fields", metadata={"hnsw:space": "cosine"})
+    ))
 
 def is_persona_collection_current():
     """
@@ -25,13 +104,14 @@ def is_persona_collection_current():
     """
     try:
         # Try to get the collection
-        collection = chroma_client.get_collection(name="persona_library")
+        collection = get_chroma_client().get_collection(name="persona_library")
         
-        # Get all stored personas
+        # Get all stored personas (the whole-description records, not their learned summaries)
         results = collection.get()
         stored_personas = {
             meta["persona_name"]: doc 
             for meta, doc in zip(results["metadatas"], results["documents"])
+            if meta.get("field_name", "desc") == "desc"
         }
         
         # Check if all current personas exist and match
@@ -47,17 +127,58 @@ def is_persona_collection_current():
     except:
         return False
 
-def create_new_conversation_collection():
-    global SESSION_COLLECTION, SESSION_ID
+def create_new_conversation_collection() -> SessionContext:
+    """
+    Creates a fresh conversation collection and returns the SessionContext that owns it.
+    """
     # Use timestamp or short UUID for uniqueness
     unique_id = str(uuid.uuid4())[:8]
-    SESSION_ID = f"session_{unique_id}"
+    session_id = f"session_{unique_id}"
     
-    SESSION_COLLECTION = chroma_client.get_or_create_collection(name=SESSION_ID)
-    print(f"Created new conversation collection: {SESSION_ID}")
+    collection = TRACER.wrap_collection(get_chroma_client().get_or_create_collection(name=session_id))
+    print(f"Created new conversation collection: {session_id}")
+    return SessionContext(session_id, collection)
 
-def initialize_persona_collection():
-    """Initialize or update collections as needed."""
+def open_existing_conversation_collection(session_id) -> SessionContext:
+    """
+    Re-opens the collection of an earlier session (used when resuming from a checkpoint).
+    """
+    collection = TRACER.wrap_collection(get_chroma_client().get_collection(name=session_id))
+    print(f"Re-opened conversation collection: {session_id}")
+    return SessionContext(session_id, collection)
+
+def seed_embedding_cache_from_session(session):
+    """
+    Loads every stored message embedding of the session into EMBEDDING_CACHE,
+    so resumed sessions never pay to re-embed messages.
+    """
+    if "session_context" in get_local_embedding_uses():
+        return  # the messages were embedded locally, nothing to seed
+    results = session.collection.get(include=["documents", "embeddings"])
+    for doc, emb in zip(results["documents"] or [], results["embeddings"] if results["embeddings"] is not None else []):
+        EMBEDDING_CACHE[doc] = list(emb)
+
+persona_collection = None
+_PERSONA_INIT_LOCK = threading.Lock()
+
+@TRACER.traced("stage.persona_init")
+def initialize_persona_collection(verbose=True):
+    """Initialize or update collections as needed. The persona index is shared by every session in the process."""
+    with _PERSONA_INIT_LOCK:
+        if persona_collection is None:
+            start = time.perf_counter()
+            _initialize_persona_collection(verbose)
+            STARTUP_PROFILE["persona_index"] = (time.perf_counter() - start) * 1000
+
+def get_persona_collection():
+    """
+    Returns the shared persona index, building or opening it on first use.
+    """
+    if persona_collection is None:
+        initialize_persona_collection()
+    return persona_collection
+
+def _initialize_persona_collection(verbose=True):
     global persona_collection
 
     # Temporarily disable ChromaDB logging
@@ -67,73 +188,246 @@ def initialize_persona_collection():
     
     # Check persona collection
     if not is_persona_collection_current():
-        print("Initializing persona collection (this may take a moment)...")
+        if verbose:
+            print("Initializing persona collection (this may take a moment)...")
         try:
-            chroma_client.delete_collection(name="persona_library")
+            get_chroma_client().delete_collection(name="persona_library")
         except:
             pass
             
-        persona_collection = chroma_client.create_collection(
+        persona_collection = TRACER.wrap_collection(get_chroma_client().create_collection(
             name="persona_library",
             metadata={
                 "hnsw:space": "cosine",
-                "hnsw:construction_ef": 250,
-                "hnsw:search_ef": 150,
-                "hnsw:M": 32
+                "hnsw:construction_ef": PERSONA_HNSW_CONFIG["construction_ef"],
+                "hnsw:search_ef": PERSONA_HNSW_CONFIG["search_ef"],
+                "hnsw:M": PERSONA_HNSW_CONFIG["M"]
             }
-        )
+        ))
         store_personas_in_chroma(PERSONA_LIBRARY)
-        print("Persona collection initialized!")
+        if verbose:
+            print("Persona collection initialized!")
     else:
-        print("Using existing persona collection...")
-        persona_collection = chroma_client.get_collection(name="persona_library")
+        if verbose:
+            print("Using existing persona collection...")
+        persona_collection = TRACER.wrap_collection(get_chroma_client().get_collection(name="persona_library"))
 
     # Restore original logging level
     chromadb_logger.setLevel(original_level)
 
-def get_openai_embedding(text: str) -> list:
+def warm_up() -> threading.Thread:
+    """
+    Creates the clients, the archive collection and the persona indexes in a background thread,
+    so they are ready by the time the user has typed their idea. Anything that needs one of
+    them first simply waits for it. Errors are left for the foreground call to raise.
+    """
+    def _warm():
+        try:
+            get_openai_client()
+            get_archive_collection()
+            initialize_persona_collection(verbose=False)
+            get_persona_field_index()
+        except Exception as e:
+            logging.getLogger(__name__).debug("Warm-up failed: %s", e)
+
+    thread = threading.Thread(target=_warm, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def startup_profile_report() -> str:
+    """
+    Formats STARTUP_PROFILE: module import, client creation, collection opening and time to first prompt.
+    """
+    labels = [
+        ("import", "import app"),
+        ("openai", "OpenAI client"),
+        ("chroma", "Chroma client"),
+        ("archive", "archive collection"),
+        ("persona_index", "persona index"),
+        ("first_prompt", "time to first prompt"),
+    ]
+    lines = ["Startup profile (ms):"]
+    for key, label in labels:
+        value = STARTUP_PROFILE.get(key)
+        lines.append(f"  {label:<22} {value:>9.1f}" if value is not None else f"  {label:<22} {'-':>9}")
+    return "\n".join(lines)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+# { text: embedding }, least recently used entries evicted (a 1536-d vector is about 50 KB as a list)
+EMBEDDING_CACHE = LRUCache(int(os.environ.get("BRAINSTORMER_EMBEDDING_CACHE_SIZE", "4096")))
+
+# Optional shared resources, set by configure_shared_resources() (e.g. by batch_runner workers)
+GOVERNOR = None         # RateGovernor wrapped around every OpenAI call
+EMBEDDING_STORE = None  # EmbeddingStore shared on disk between processes
+BATCH_QUEUE = None      # BatchQueue that takes the end-of-session bulk work (see batch_jobs.py)
+
+def configure_shared_resources(governor=None, embedding_store=None, batch_queue=None):
+    """
+    Installs a rate governor and/or a cross-process embedding store for all API calls in this process.
+    Call it before the first API call: the HTTP connection pools are sized from the governor when created.
+    With a batch queue, learned summaries and archive embeddings are deferred to the Batch API.
+    """
+    global GOVERNOR, EMBEDDING_STORE, BATCH_QUEUE
+    GOVERNOR = governor
+    EMBEDDING_STORE = embedding_store
+    BATCH_QUEUE = batch_queue
+
+def api_slot():
+    """
+    Context manager that holds a governor slot for one API call (no-op without a governor).
+    """
+    return GOVERNOR if GOVERNOR is not None else contextlib.nullcontext()
+
+def get_openai_embedding(text: str, session=None) -> list:
     """
     Returns the embedding vector for the given text using OpenAI's Embeddings API.
+    Every embedding is cached by text, so messages embedded on storage can be reused locally.
+    An API call is charged to 'session', if given.
     """
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text
-    )
-    return response.data[0].embedding
+    embedding = _cached_embedding(text)
+    if embedding is not None:
+        return embedding
+
+    TRACER.incr("embedding_cache.misses")
+    with api_slot(), TRACER.span("openai.embeddings", model=EMBEDDING_MODEL) as span:
+        response = get_openai_client().embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=text,
+            timeout=endpoint_timeout("/embeddings")
+        )
+        span.set_usage(getattr(response, "usage", None))
+    if session is not None:
+        session.record_usage(getattr(response, "usage", None), EMBEDDING_MODEL, "embeddings")
+    embedding = response.data[0].embedding
+    _remember_embedding(text, embedding)
+    return embedding
+
+EMBEDDING_BATCH_SIZE = 2048  # inputs per embeddings request (API limit)
+
+def get_openai_embeddings(texts: list, session=None) -> list:
+    """
+    Batched get_openai_embedding(): cached texts are served locally and all the rest
+    are embedded in as few API calls as possible. Returns vectors in input order.
+    """
+    embeddings = {}
+    missing = []
+    for text in dict.fromkeys(texts):
+        embedding = _cached_embedding(text)
+        if embedding is not None:
+            embeddings[text] = embedding
+        else:
+            missing.append(text)
+
+    for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+        batch = missing[start:start + EMBEDDING_BATCH_SIZE]
+        TRACER.incr("embedding_cache.misses", len(batch))
+        with api_slot(), TRACER.span("openai.embeddings", model=EMBEDDING_MODEL, inputs=len(batch)) as span:
+            response = get_openai_client().embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=batch,
+                timeout=endpoint_timeout("/embeddings")
+            )
+            span.set_usage(getattr(response, "usage", None))
+        if session is not None:
+            session.record_usage(getattr(response, "usage", None), EMBEDDING_MODEL, "embeddings")
+        for item in response.data:
+            text = batch[item.index]
+            embeddings[text] = item.embedding
+            _remember_embedding(text, item.embedding)
 
-def generate_response_for_persona(persona_name, idea, context):
+    return [embeddings[text] for text in texts]
+
+def get_local_embedding_uses() -> frozenset:
+    """
+    Uses served by the local CPU embedder instead of OpenAI (see local_embeddings.py), read
+    from the environment on first use so a bad setting fails the call, not the import.
+    """
+    return _lazy_resource("local_embedding_uses", local_embedding_uses)
+
+def get_local_embedder():
+    return _lazy_resource("local_embedder", create_local_embedder)
+
+def embed_for(use, texts, session=None) -> list:
+    """
+    Embeds 'texts' for one of LOCAL_EMBEDDING_USES, locally on the CPU when that use is in
+    get_local_embedding_uses() and with OpenAI otherwise. Vectors from the two never meet: each use
+    compares only vectors it made itself.
+    """
+    if use in get_local_embedding_uses():
+        with TRACER.span("local.embeddings", use=use, inputs=len(texts)):
+            return get_local_embedder().embed(texts)
+    return get_openai_embeddings(texts, session=session)
+
+def get_context_collection(session):
+    """
+    The collection in-session retrieval runs on: the session collection, or, with local
+    session_context embeddings, its own namespace '<session_id>-<embedder name>'.
+    """
+    if "session_context" not in get_local_embedding_uses():
+        return session.collection
+    if session.local_collection is None:
+        embedder_name = get_local_embedder().name
+        session.local_collection = TRACER.wrap_collection(get_chroma_client().get_or_create_collection(
+            name=f"{session.session_id}-{embedder_name}", metadata={"embedder": embedder_name}
+        ))
+    return session.local_collection
+
+def _cached_embedding(text):
+    embedding = EMBEDDING_CACHE.get(text)
+    if embedding is not None:
+        TRACER.incr("embedding_cache.hits")
+        return embedding
+
+    if EMBEDDING_STORE is not None:
+        embedding = EMBEDDING_STORE.get(EMBEDDING_MODEL, text)
+        if embedding is not None:
+            TRACER.incr("embedding_store.hits")
+            EMBEDDING_CACHE[text] = embedding
+            return embedding
+    return None
+
+def _remember_embedding(text, embedding):
+    EMBEDDING_CACHE[text] = embedding
+    if EMBEDDING_STORE is not None:
+        EMBEDDING_STORE.put(EMBEDDING_MODEL, text, embedding)
+
+PROMPT_ASSEMBLER = PromptAssembler()
+PROMPT_CACHE_STATS = PromptCacheStats()  # process-wide; each SessionContext keeps its own as well
+
+def create_chat_completion(session=None, purpose="chat", **kwargs):
+    """
+    Single entry point for chat completions, so usage (including cached prompt tokens)
+    is recorded for every call, and for the session the call was made for.
+    'purpose' labels the call in the session's budget report; auxiliary purposes switch to
+    the cheaper model once the session budget runs low. Without a timeout= the call gets
+    the endpoint default, scaled with max_tokens.
+    """
+    if session is not None:
+        kwargs["model"] = session.budget.model_for(kwargs["model"], purpose)
+    kwargs.setdefault("timeout", endpoint_timeout("/chat/completions", kwargs.get("max_tokens")))
+    with api_slot(), TRACER.span("openai.chat", model=kwargs.get("model")) as span:
+        completion = get_openai_client().chat.completions.create(**kwargs)
+        span.set_usage(getattr(completion, "usage", None))
+    PROMPT_CACHE_STATS.record(getattr(completion, "usage", None))
+    if session is not None:
+        session.record_usage(getattr(completion, "usage", None), kwargs["model"], purpose)
+    return completion
+
+@TRACER.traced("stage.generate")
+def generate_response_for_persona(persona_name, idea, context, critique="", session=None):
     """
     Dynamically retrieves the persona's 'essence' from Chroma and injects it into the system or developer message.
+    The prompt is assembled with per-section token budgets; the static part (essence, instructions, idea)
+    comes first and is byte-identical across a persona's turns so it can be served from the prompt cache.
     """
-    persona_desc = retrieve_persona_by_name(persona_name)
+    essence = retrieve_persona_by_name(persona_name, session=session)
 
-    messages = [
-        {
-            "role": "developer",
-            "content": (
-                f"You are {persona_name}. Below is your personality description or 'essence':\n\n"
-                f"{persona_desc}\n\n"
-                "Always leverage this mindset, worldview, and expertise. "
-                "You are participating in a dynamic brainstorming session with other experts. "
-                "Engage naturally with the other participants, responding to their points while adding your unique "
-                "expertise and perspective to the discussion. "
-                "Ask questions, challenge assumptions constructively, and help evolve the idea. Offer new insights,"
-                " reference previous points without repeating them verbatim, and move the conversation forward."
-                "Contribute to the discussion in a way that aligns with your persona's style."
-            )
-        },
-        {
-            "role": "user", 
-            "content": (
-                f"Original idea: {idea}\n\n"
-                f"Relevant conversation context: \n{context}\n\n"
-                "Please provide your next message in this brainstorming session."
-            )
-        }
-    ]
+    messages = PROMPT_ASSEMBLER.build_persona_messages(persona_name, essence, idea, context, critique)
 
     # Call your LLM of choice
-    completion = client.chat.completions.create(
+    completion = create_chat_completion(
+        session=session,
+        purpose="generation",
         model="gpt-4o",
         messages=messages,
         max_tokens=2000,
@@ -142,122 +436,161 @@ def generate_response_for_persona(persona_name, idea, context):
 
     return completion.choices[0].message.content.strip()
 
-def store_message_in_chroma(persona_name, message):
+def store_message_in_chroma(session, persona_name, message, turn_index=None):
     """
-    Stores the given message in the (session-specific) Chroma collection, using the persona name in metadata.
+    Stores the given message in the session's context collection, using the persona name in metadata.
+    The turn index is kept in metadata so retrieval can favour recent messages.
+    Returns the message embedding so callers can run local checks without re-embedding.
     """
-    if SESSION_COLLECTION is None:
-        raise ValueError("SESSION_COLLECTION is not initialized.")
+    if session is None:
+        raise ValueError("No session given to store the message in.")
     
-    embedding = get_openai_embedding(message)
-    doc_id = str(uuid.uuid4())  # generate a unique ID
+    embedding = embed_for("session_context", [message], session=session)[0]
+    collection = get_context_collection(session)
+    if turn_index is None:
+        turn_index = collection.count()
+        doc_id = str(uuid.uuid4())  # generate a unique ID
+    else:
+        # Deterministic per turn, so a turn replayed after a crash overwrites instead of duplicating
+        doc_id = f"{session.session_id}-turn-{turn_index}"
 
-    SESSION_COLLECTION.add(
+    collection.upsert(
         documents=[message],
         embeddings=[embedding],
-        metadatas=[{"persona": persona_name, "session_id": SESSION_ID}],
+        metadatas=[{"persona": persona_name, "session_id": session.session_id, "turn_index": turn_index}],
         ids=[doc_id]
     )
+    return embedding
 
 def store_personas_in_chroma(personas):
     """
     For each persona, embed their description and store in the 'persona_library' collection.
     """
     for p in personas:
-        persona_name = p["name"]
-        # Convert lists to comma-separated strings for metadata
-        metadata = {
-            "persona_name": persona_name,
-            "short_bio": p["short_bio"],
-            "domain_expertise": ", ".join(p["domain_expertise"]),      # Convert list to string
-            "personality_traits": ", ".join(p["personality_traits"]),  # Convert list to string
-            "role_function": p["role_function"],
-            "experience_level": p["experience_level"],
-            "style_keywords": ", ".join(p["style_keywords"])          # Convert list to string
-        }
-
         emb = get_openai_embedding(p["desc"]) 
-        doc_id = f"persona-{persona_name.lower().replace(' ', '-')}" 
+        doc_id = f"persona-{p['name'].lower().replace(' ', '-')}" 
         
-        persona_collection.add(
+        get_persona_collection().upsert(
             documents=[p["desc"]],
             embeddings=[emb],
-            metadatas=[metadata],
+            metadatas=[_persona_metadata(p)],
             ids=[doc_id]
         )
 
+def _persona_metadata(p) -> dict:
+    # Convert lists to comma-separated strings for metadata
+    return {
+        "persona_name": p["name"],
+        "field_name": "desc",
+        "short_bio": p["short_bio"],
+        "domain_expertise": ", ".join(p["domain_expertise"]),      # Convert list to string
+        "personality_traits": ", ".join(p["personality_traits"]),  # Convert list to string
+        "role_function": p["role_function"],
+        "experience_level": p["experience_level"],
+        "style_keywords": ", ".join(p["style_keywords"])          # Convert list to string
+    }
+
 def store_persona_fields_in_chroma(personas):
     """
-    For each persona, embed relevant fields separately and store them in 'persona_library'.
-    Each field is a separate record, letting us do field-specific searches.
+    For each persona, embed relevant fields separately and store them in 'persona_fields'.
+    Each field is a separate record, letting us do field-specific searches; local persona
+    selection fuses them. All fields are embedded in one batch and written in one upsert.
     """
+    ids, documents, metadatas = _persona_field_records(personas)
+    if not ids:
+        return
+    get_persona_fields_collection().upsert(
+        documents=documents,
+        embeddings=get_openai_embeddings(documents),
+        metadatas=metadatas,
+        ids=ids
+    )
+
+def _persona_field_records(personas):
+    ids, documents, metadatas = [], [], []
     for p in personas:
         persona_name = p["name"]
-        
-        # We'll store these fields separately
-        fields_to_embed = {
-            "desc": p["desc"],
-            "short_bio": p["short_bio"],
-            "domain_expertise": ", ".join(p["domain_expertise"]),
-            "personality_traits": ", ".join(p["personality_traits"]),
-            "role_function": p["role_function"],
-            "experience_level": p["experience_level"],
-            "style_keywords": ", ".join(p["style_keywords"])
-        }
-        
-        for field_name, field_text in fields_to_embed.items():
-            # Skip if empty
-            if not field_text:
-                continue
-            
-            emb = get_openai_embedding(field_text)
-            doc_id = f"persona-{persona_name.lower().replace(' ', '-')}-{field_name}"
-            
-            metadata = {
-                "persona_name": persona_name,
-                "field_name": field_name,
-            }
-            # We might also carry the field_text in 'documents' to reconstruct or debug
-            persona_collection.add(
-                documents=[field_text],
-                embeddings=[emb],
-                metadatas=[metadata],
-                ids=[doc_id]
-            )
+        for field_name, field_text in persona_field_texts(p).items():
+            ids.append(f"persona-{persona_name.lower().replace(' ', '-')}-{field_name}")
+            documents.append(field_text)
+            metadatas.append({"persona_name": persona_name, "field_name": field_name})
+    return ids, documents, metadatas
 
-def store_archive_message(persona_name, message):
+def index_persona(persona):
+    """
+    Indexes one persona in Chroma: the whole-description record and the per-field records.
+    """
+    store_personas_in_chroma([persona])
+    store_persona_fields_in_chroma([persona])
+
+def store_archive_message(session, persona_name, message):
     """
     Stores message in the 'all_session_archives' collection.
     We call this AFTER the session is done or as the session proceeds.
     """
-    global SESSION_ID
-    if not SESSION_ID:
+    if session is None:
         return  # or handle error
     
     emb = get_openai_embedding(message)
     doc_id = str(uuid.uuid4())
 
     metadata = {
-        "session_id": SESSION_ID,
+        "session_id": session.session_id,
         "persona_name": persona_name
     }
 
-    archive_collection.add(
+    get_archive_collection().add(
         documents=[message],
         embeddings=[emb],
         metadatas=[metadata],
         ids=[doc_id]
     )
 
-def store_persona_learned_embedding(persona_name, conversation_history):
+@TRACER.traced("stage.archive_ingest")
+def archive_session_messages(session, turn_log):
+    """
+    Copies every message of the session into 'all_session_archives' in one bulk upsert.
+    The messages were embedded when they were stored, so this normally makes no API calls.
+    """
+    turns = list(turn_log)
+    if not turns:
+        return
+    messages = [message for _, _, message in turns]
+    get_archive_collection().upsert(
+        documents=messages,
+        embeddings=get_openai_embeddings(messages, session=session),
+        metadatas=[
+            {"session_id": session.session_id, "persona_name": persona, "turn_index": turn.index,
+             "round": turn.round + 1}
+            for turn, persona, _ in turns
+        ],
+        ids=[turn.embedding_id or f"{session.session_id}-turn-{turn.index}" for turn, _, _ in turns]
+    )
+
+def store_persona_learned_embedding(session, persona_name, turn_log):
     """
     Summarizes how a persona performed or evolved in this session, 
     then stores a new 'learned embedding' for them in 'persona_library'.
     """
-    # 1) Generate a summary or reflection
-    # We can pass the conversation_history specifically for this persona
-    persona_dialogue = conversation_history.get(persona_name, [])
-    dialogue_text = "\n\n".join(persona_dialogue)
+    learned_summary = generate_learned_summary(session, persona_name, turn_log)
+    store_learned_summaries(session, {persona_name: learned_summary})
+
+@TRACER.traced("stage.learned_embedding")
+def generate_learned_summary(session, persona_name, turn_log) -> str:
+    """
+    Asks the model how the persona expressed themselves in this session.
+    """
+    completion = create_chat_completion(
+        session=session,
+        purpose="learned_summary",
+        **_learned_summary_request(persona_name, turn_log)
+    )
+
+    return completion.choices[0].message.content.strip()
+
+def _learned_summary_request(persona_name, turn_log) -> dict:
+    # 1) Generate a summary or reflection from this persona's own messages
+    dialogue_text = "\n\n".join(turn_log.for_persona(persona_name))
 
     system_prompt = (
         "You are an analyzer for persona evolution. The user has a conversation where this persona participated. "
@@ -269,41 +602,238 @@ def store_persona_learned_embedding(persona_name, conversation_history):
         {"role": "developer", "content": system_prompt},
         {"role": "user", "content": f"Persona Name: {persona_name}\n\nConversation:\n{dialogue_text}"}
     ]
-    
-    completion = client.chat.completions.create(
-        model="gpt-4o",
-        messages=prompt_messages,
-        max_tokens=500,
-        temperature=0.7
+    return {"model": "gpt-4o", "messages": prompt_messages, "max_tokens": 500, "temperature": 0.7}
+
+def store_learned_summaries(session, learned_summaries: dict):
+    """
+    Embeds { persona_name: summary } in one batch and stores them in persona_library with one bulk write.
+    """
+    if not learned_summaries:
+        return
+    summaries = list(learned_summaries.values())
+    _upsert_learned_summaries(session.session_id, learned_summaries,
+                              get_openai_embeddings(summaries, session=session))
+    for name, summary in learned_summaries.items():
+        print(f"Stored learned embedding for {name} from session {session.session_id}.\nSummary:\n{summary}\n")
+
+def _upsert_learned_summaries(session_id, learned_summaries: dict, embeddings):
+    # 2) Store in persona_library with a special doc_id
+    persona_names = list(learned_summaries)
+    get_persona_collection().upsert(
+        documents=[learned_summaries[name] for name in persona_names],
+        embeddings=embeddings,
+        metadatas=[
+            {"persona_name": name, "learned_from_session": session_id, "field_name": "learned_summary",
+             "learned_at": time.time()}
+            for name in persona_names
+        ],
+        ids=[f"persona-{name.lower().replace(' ', '-')}-learned-{session_id}" for name in persona_names]
     )
+    for name in persona_names:
+        invalidate_persona_essence(name)
 
-    learned_summary = completion.choices[0].message.content.strip()
+# Batch API path (batch_jobs.py): the same bulk work, queued as requests whose results are
+# applied later by BATCH_HANDLERS. Every handler upserts on deterministic ids.
+CHAT_ENDPOINT = "/v1/chat/completions"
+EMBEDDINGS_ENDPOINT = "/v1/embeddings"
 
-    # 2) Embed and store in persona_library with a special doc_id
-    learned_emb = get_openai_embedding(learned_summary)
-    doc_id = f"persona-{persona_name.lower().replace(' ', '-')}-learned-{SESSION_ID}"
+def enqueue_learned_summaries(queue, session, turn_log, persona_names):
+    """
+    Queues a learned-summary request per persona; once a summary is back it is embedded
+    through the Batch API as well and stored like store_learned_summaries() does.
+    """
+    for persona_name in persona_names:
+        queue.enqueue(f"learned-{session.session_id}-{persona_name.lower().replace(' ', '-')}", CHAT_ENDPOINT,
+                      _learned_summary_request(persona_name, turn_log),
+                      {"type": "learned_summary", "persona_name": persona_name, "session_id": session.session_id})
 
-    metadata = {
-        "persona_name": persona_name,
-        "learned_from_session": SESSION_ID,
-        "field_name": "learned_summary"
-    }
+def enqueue_archive_messages(queue, session, turn_log):
+    """
+    archive_session_messages() for the Batch API: messages whose embeddings are already cached
+    are archived at once, only the rest are queued for embedding.
+    """
+    ready, missing = [], []
+    for turn, persona, message in turn_log:
+        record = (turn.embedding_id or f"{session.session_id}-turn-{turn.index}", message,
+                  {"session_id": session.session_id, "persona_name": persona, "turn_index": turn.index,
+                   "round": turn.round + 1})
+        (ready if _cached_embedding(message) is not None else missing).append(record)
+    if ready:
+        get_archive_collection().upsert(
+            ids=[doc_id for doc_id, _, _ in ready],
+            documents=[message for _, message, _ in ready],
+            embeddings=[_cached_embedding(message) for _, message, _ in ready],
+            metadatas=[metadata for _, _, metadata in ready]
+        )
+    for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+        chunk = missing[start:start + EMBEDDING_BATCH_SIZE]
+        queue.enqueue(f"archive-{session.session_id}-{start}", EMBEDDINGS_ENDPOINT,
+                      {"model": EMBEDDING_MODEL, "input": [message for _, message, _ in chunk]},
+                      {"type": "upsert", "collection": "all_session_archives",
+                       "ids": [doc_id for doc_id, _, _ in chunk], "metadatas": [metadata for _, _, metadata in chunk]})
+
+def enqueue_persona_reindex(queue, personas=PERSONA_LIBRARY) -> int:
+    """
+    Queues a re-embedding of the personas' whole-description and per-field records. Request ids
+    hash the texts, so queueing an unchanged library twice adds nothing. Returns the number queued.
+    """
+    ids, documents, metadatas = _persona_field_records(personas)
+    targets = [
+        ("persona_library", [f"persona-{p['name'].lower().replace(' ', '-')}" for p in personas],
+         [p["desc"] for p in personas], [_persona_metadata(p) for p in personas]),
+        ("persona_fields", ids, documents, metadatas),
+    ]
+    queued = 0
+    for collection, ids, documents, metadatas in targets:
+        for start in range(0, len(ids), EMBEDDING_BATCH_SIZE):
+            chunk = slice(start, start + EMBEDDING_BATCH_SIZE)
+            digest = hashlib.sha256("\x00".join(ids[chunk] + documents[chunk]).encode("utf-8")).hexdigest()[:16]
+            queued += queue.enqueue(f"reindex-{collection}-{digest}", EMBEDDINGS_ENDPOINT,
+                                    {"model": EMBEDDING_MODEL, "input": documents[chunk]},
+                                    {"type": "upsert", "collection": collection,
+                                     "ids": ids[chunk], "metadatas": metadatas[chunk]})
+    return queued
+
+def _batch_embeddings(response) -> list:
+    return [item["embedding"] for item in sorted(response["data"], key=lambda item: item["index"])]
+
+def _apply_learned_summary(queue, custom_id, action, request, response):
+    summary = response["choices"][0]["message"]["content"].strip()
+    queue.enqueue(f"{custom_id}-embedding", EMBEDDINGS_ENDPOINT, {"model": EMBEDDING_MODEL, "input": [summary]},
+                  {**action, "type": "learned_embedding", "summary": summary})
+
+def _apply_learned_embedding(queue, custom_id, action, request, response):
+    persona_name = action["persona_name"]
+    _upsert_learned_summaries(action["session_id"], {persona_name: action["summary"]}, _batch_embeddings(response))
+    maybe_consolidate_learned_summaries(persona_name)
+
+def _apply_upsert(queue, custom_id, action, request, response):
+    collections = {"all_session_archives": get_archive_collection, "persona_library": get_persona_collection,
+                   "persona_fields": get_persona_fields_collection}
+    embeddings = _batch_embeddings(response)
+    for text, embedding in zip(request["input"], embeddings):
+        _remember_embedding(text, embedding)
+    collections[action["collection"]]().upsert(
+        ids=action["ids"], documents=request["input"], embeddings=embeddings, metadatas=action["metadatas"]
+    )
 
-    persona_collection.add(
-        documents=[learned_summary],
-        embeddings=[learned_emb],
-        metadatas=[metadata],
-        ids=[doc_id]
+BATCH_HANDLERS = {
+    "learned_summary": _apply_learned_summary,
+    "learned_embedding": _apply_learned_embedding,
+    "upsert": _apply_upsert,
+}
+
+def _learned_summary_filter(persona_name):
+    return {"$and": [{"persona_name": persona_name}, {"field_name": "learned_summary"}]}
+
+def maybe_consolidate_learned_summaries(persona_name, session=None):
+    """
+    Consolidates a persona's learned summaries once there are more than CONSOLIDATION_DEFAULTS["trigger_count"].
+    """
+    stored = get_persona_collection().get(where=_learned_summary_filter(persona_name), include=[])
+    if len(stored["ids"]) > CONSOLIDATION_DEFAULTS["trigger_count"]:
+        return consolidate_learned_summaries(persona_name, session=session)
+    return None
+
+@TRACER.traced("stage.consolidate_learned")
+def _consolidated_summary_id(slug, source_ids):
+    # Named after the records it replaces, so a re-run (or a second worker) merging the same
+    # records overwrites the merged record instead of adding a copy
+    digest = hashlib.sha256("\x00".join(sorted(source_ids)).encode("utf-8")).hexdigest()[:16]
+    return f"persona-{slug}-learned-consolidated-{digest}"
+
+def consolidate_learned_summaries(persona_name, max_summaries=None, similarity_threshold=None,
+                                  half_life_days=None, session=None) -> dict:
+    """
+    Keeps persona_library bounded: clusters a persona's learned summaries by embedding, merges each
+    multi-member cluster into one compact, recency-weighted summary, then writes the merged records
+    and deletes the ones they replace. Merged records are written before anything is deleted, so an
+    interrupted run leaves duplicates for the next run to fold in, never a gap. A merged record's id
+    is derived from the records it replaces, so merging the same records again overwrites it.
+    Returns {"before": int, "after": int, "merged_clusters": int}.
+    """
+    if max_summaries is None:
+        max_summaries = CONSOLIDATION_DEFAULTS["max_summaries"]
+    if similarity_threshold is None:
+        similarity_threshold = CONSOLIDATION_DEFAULTS["similarity_threshold"]
+    if half_life_days is None:
+        half_life_days = CONSOLIDATION_DEFAULTS["half_life_days"]
+
+    stored = get_persona_collection().get(
+        where=_learned_summary_filter(persona_name),
+        include=["documents", "metadatas", "embeddings"]
     )
+    ids, documents, metadatas = stored["ids"], stored["documents"], stored["metadatas"]
+    if len(ids) <= max_summaries:
+        return {"before": len(ids), "after": len(ids), "merged_clusters": 0}
+
+    # Summaries stored before timestamps were recorded count as the oldest ones
+    known = [meta["learned_at"] for meta in metadatas if "learned_at" in meta]
+    timestamps = [meta.get("learned_at", min(known, default=time.time())) for meta in metadatas]
+    weights = recency_weights(timestamps, time.time(), half_life_days)
+    clusters = cluster_summaries(stored["embeddings"], weights, similarity_threshold, max_summaries)
+    to_merge = [cluster for cluster in clusters if len(cluster) > 1]
+
+    with ThreadPoolExecutor(max_workers=max(1, len(to_merge)), thread_name_prefix="consolidate") as pool:
+        merged = list(pool.map(
+            lambda cluster: _merge_learned_summaries(persona_name, [documents[i] for i in cluster],
+                                                     [weights[i] for i in cluster], session),
+            to_merge
+        ))
+
+    slug = persona_name.lower().replace(' ', '-')
+    if merged:
+        get_persona_collection().upsert(
+            documents=merged,
+            embeddings=get_openai_embeddings(merged),
+            metadatas=[
+                {
+                    "persona_name": persona_name,
+                    "field_name": "learned_summary",
+                    "learned_from_session": metadatas[cluster[0]].get("learned_from_session", ""),
+                    "learned_at": max(timestamps[i] for i in cluster),
+                    "consolidated_from": sum(metadatas[i].get("consolidated_from", 1) for i in cluster),
+                }
+                for cluster in to_merge
+            ],
+            ids=[_consolidated_summary_id(slug, [ids[i] for i in cluster]) for cluster in to_merge]
+        )
+        get_persona_collection().delete(ids=[ids[i] for cluster in to_merge for i in cluster])
+        invalidate_persona_essence(persona_name)
+
+    after = len(ids) - sum(len(cluster) for cluster in to_merge) + len(merged)
+    print(f"Consolidated learned summaries for {persona_name}: {len(ids)} -> {after}")
+    return {"before": len(ids), "after": after, "merged_clusters": len(merged)}
 
-    print(f"Stored learned embedding for {persona_name} from session {SESSION_ID}.\nSummary:\n{learned_summary}\n")
+def _merge_learned_summaries(persona_name, summaries, weights, session=None) -> str:
+    # summaries arrive most recent first
+    listing = "\n\n".join(
+        f"[{i + 1}] (weight {weight:.2f})\n{summary}" for i, (summary, weight) in enumerate(zip(summaries, weights))
+    )
+    completion = create_chat_completion(
+        session=session,
+        purpose="consolidation",
+        model="gpt-4o",
+        messages=[
+            {"role": "developer", "content": (
+                "You consolidate notes about how a persona has evolved across brainstorming sessions. "
+                "Merge the summaries below into one compact summary (at most 200 words) that keeps every "
+                "distinct insight, trait or piece of knowledge and drops repetition. They are listed most "
+                "recent first with a recency weight; when they disagree, prefer the higher-weighted ones."
+            )},
+            {"role": "user", "content": f"Persona Name: {persona_name}\n\nSummaries:\n{listing}"}
+        ],
+        max_tokens=350,
+        temperature=0.3
+    )
+    return completion.choices[0].message.content.strip()
 
 def search_previous_sessions(user_query, k=5):
     """
     Searches the entire archives for relevant conversation snippets.
     """
     emb = get_openai_embedding(user_query)
-    results = archive_collection.query(query_embeddings=[emb], n_results=k)
+    results = get_archive_collection().query(query_embeddings=[emb], n_results=k)
 
     # results['documents'] is a list of lists (one per query)
     docs = results['documents'][0] if results and results['documents'] else []
@@ -385,13 +915,15 @@ def select_personas_by_list():
     try:
         indices = [int(x.strip()) for x in selection.split(",")]
         # Filter out of range
-        indices = [i for i in indices if 1 <= i <= len(PERSONA_LIBRARY)]
-        chosen_names = [PERSONA_LIBRARY[i-1]["name"] for i in indices]
+        personas = PERSONA_LIBRARY.snapshot()
+        indices = [i for i in indices if 1 <= i <= len(personas)]
+        chosen_names = [personas[i-1]["name"] for i in indices]
         return chosen_names
     except ValueError:
         print("Invalid input. Please enter numbers separated by commas.")
         return []
 
+@TRACER.traced("stage.selection.semantic")
 def select_personas_by_semantic_search():
     """
     Ask user for a short description, then do a similarity search
@@ -399,35 +931,23 @@ def select_personas_by_semantic_search():
     """
     query_desc = input("Describe the type of persona(s) you want:\n> ")
 
-    # Embed the query_desc and query the persona_collection
+    # The recommended team covers the description without redundant voices; the closest
+    # remaining matches are listed after it
     query_emb = get_openai_embedding(query_desc)
-    results = persona_collection.query(
-        query_embeddings=[query_emb],
-        n_results=5  # fetch top 5 matches
-    )
+    index = get_persona_field_index()
+    team = [pick["name"] for pick in index.team(query_emb, budget=5)]
+    others = [pick["name"] for pick in index.rank(query_emb, k=len(team) + 5)["personas"] if pick["name"] not in team]
+    top_names = team + others[:max(0, 5 - len(team))]
 
-    # results['ids'] might look like [['persona-rebecca', 'persona-leo', ...]]
-    if not results or not results["ids"]:
+    if not top_names:
         print("No matching personas found.")
         return []
 
-    # Flatten the IDs from the first query (since we only used one query)
-    top_ids = results["ids"][0]
-    top_docs = results["documents"][0]
-    top_metadata = results["metadatas"][0]
-
-    # Let's display them
+    bios = {p["name"]: p.get("short_bio") or "No short bio found" for p in PERSONA_LIBRARY}
     print("\nTop recommended personas based on your description:\n")
-    for i, doc_id in enumerate(top_ids):
-        # The metadata might store the persona name. If not, parse from doc_id
-        meta = top_metadata[i]
-        persona_name = meta.get("persona_name", f"Unknown_{doc_id}")
-        short_bio = "No short bio found"
-        # Optionally: we can retrieve from the local PERSONA_LIBRARY or store short bio in metadata
-        # For simplicity, let's just show the doc excerpt
-        excerpt = top_docs[i][:150] + "..." if len(top_docs[i]) > 150 else top_docs[i]
-
-        print(f"{i+1}. {persona_name} – Potential match: {excerpt}")
+    for i, persona_name in enumerate(top_names):
+        marker = " (recommended team)" if persona_name in team else ""
+        print(f"{i+1}. {persona_name}{marker} – {bios.get(persona_name, '')}")
 
     # Let user pick which ones they actually want to include
     selection = input("\nEnter the indices of the personas you want, separated by commas:\n> ")
@@ -438,13 +958,20 @@ def select_personas_by_semantic_search():
         chosen_indices = [int(x.strip()) for x in selection.split(",")]
         chosen_names = []
         for idx in chosen_indices:
-            if 1 <= idx <= len(top_ids):
-                chosen_names.append(top_metadata[idx-1].get("persona_name"))
+            if 1 <= idx <= len(top_names):
+                chosen_names.append(top_names[idx-1])
         return chosen_names
     except ValueError:
         print("Invalid input. Returning empty selection.")
         return []
 
+def search_personas_by_description(query_desc: str, n_results=5) -> list:
+    """
+    Non-interactive counterpart of select_personas_by_semantic_search:
+    returns the names of an optimized team (at most n_results) for a description.
+    """
+    return select_team(query_desc, budget=n_results)
+
 def manager_agent_select_personas(user_idea: str, all_personas: list, top_k=5):
     """
     Asks GPT-4 to figure out which domains/roles are needed for the user's idea.
@@ -472,7 +999,7 @@ def manager_agent_select_personas(user_idea: str, all_personas: list, top_k=5):
         }
     ]
 
-    completion = client.chat.completions.create(
+    completion = create_chat_completion(
         model="gpt-4o",
         messages=manager_prompt,
         max_tokens=300,
@@ -496,26 +1023,14 @@ def manager_agent_select_personas(user_idea: str, all_personas: list, top_k=5):
         print("Manager agent did not return a valid list. No domain_expertise found.")
         return []
     
-    # 3) We search the 'persona_library' for these domains
-    results = persona_collection.query(
-        query_texts=["Selecting persona for the user's idea"],
-        n_results=10,
-        where={
-            "domain_expertise": {"$in": needed_domains}
-        }
-    )
-
-    # Extract persona names from the results
-    matching_personas = []
-    if results and results['metadatas']:
-        matching_personas = [
-            meta['persona_name'] 
-            for meta in results['metadatas'][0]  # First query's metadata
-        ]
-
-    # If we found too many, limit to top_k by also doing a similarity search
-    if len(matching_personas) > top_k:
-        matching_personas = matching_personas[:top_k]
+    # 3) Build a team for the idea and these domains, preferring personas that list one of them
+    wanted = {str(domain).lower() for domain in needed_domains}
+    candidates = [
+        p["name"] for p in PERSONA_LIBRARY
+        if wanted & {domain.lower() for domain in p.get("domain_expertise", [])}
+    ]
+    matching_personas = select_team(f"{user_idea}\nExpertise needed: {', '.join(map(str, needed_domains))}",
+                                    budget=top_k, candidates=candidates if len(candidates) >= 2 else None)
 
     print(f"Manager Agent suggested: {matching_personas}")
     return matching_personas
@@ -528,15 +1043,8 @@ def manager_agent_create_persona_if_needed(user_idea: str, required_domains: lis
     3) Return list of persona names to use (both existing and new).
     """
     # First try to find some existing relevant personas via semantic search
-    query_text = f"Expert in: {', '.join(required_domains)}"
-    results = persona_collection.query(
-        query_embeddings=[get_openai_embedding(query_text)],
-        n_results=3
-    )
-    
-    existing_personas = []
-    if results and results['metadatas']:
-        existing_personas = [meta['persona_name'] for meta in results['metadatas'][0]]
+    query_text = f"{user_idea}\nExpert in: {', '.join(required_domains)}"
+    existing_personas = select_team(query_text, budget=3)
     
     if existing_personas:
         print(f"Found existing relevant personas: {existing_personas}")
@@ -571,7 +1079,7 @@ def manager_agent_create_persona_if_needed(user_idea: str, required_domains: lis
             }
         ]
         
-        completion = client.chat.completions.create(
+        completion = create_chat_completion(
             model="gpt-4",  # Using most capable model for persona creation
             messages=creation_prompt,
             max_tokens=2000,
@@ -591,22 +1099,42 @@ def manager_agent_create_persona_if_needed(user_idea: str, required_domains: lis
 
     return existing_personas
 
-def create_gap_filling_persona(user_idea: str, required_domains: list) -> list:
+# Cosine similarity between the gap domains and a persona's domain_expertise from which an
+# existing persona fills the gap instead of a new one being created. The default has not been
+# calibrated on real gap reports; set BRAINSTORMER_GAP_REUSE_SIMILARITY to tune it (0 always
+# reuses the closest persona, anything above 1 always creates a new one).
+DEFAULT_GAP_REUSE_SIMILARITY = 0.6
+
+def gap_reuse_similarity() -> float:
+    return float(os.environ.get("BRAINSTORMER_GAP_REUSE_SIMILARITY", DEFAULT_GAP_REUSE_SIMILARITY))
+
+def create_gap_filling_persona(user_idea: str, required_domains: list, session=None, exclude=(),
+                               reuse_similarity=None) -> list:
     """
     Similar to manager_agent_create_persona_if_needed but specifically for filling gaps
     during conversation. Only creates one persona at a time if needed.
+    An existing persona (other than those in 'exclude', e.g. the session's) is reused when its
+    domain expertise is at least 'reuse_similarity' (default: gap_reuse_similarity()) similar
+    to the gap domains.
     """
-    # First try to find an existing relevant persona via semantic search
-    query_text = f"Expert in: {', '.join(required_domains)}"
-    results = persona_collection.query(
-        query_embeddings=[get_openai_embedding(query_text)],
-        n_results=1
+    if reuse_similarity is None:
+        reuse_similarity = gap_reuse_similarity()
+    # First try to find an existing persona whose expertise covers the gap
+    get_persona_field_index()  # stores the field records of personas not indexed yet
+    results = get_persona_fields_collection().query(
+        query_embeddings=[get_openai_embedding(", ".join(required_domains), session=session)],
+        where={"field_name": "domain_expertise"},
+        n_results=len(exclude) + 1,
+        include=["metadatas", "distances"]
     )
-    
-    if results and results['metadatas']:
-        persona_name = results['metadatas'][0][0]['persona_name']
-        print(f"Found existing relevant persona for gap: {persona_name}")
-        return [persona_name]
+    for meta, distance in zip(results["metadatas"][0], results["distances"][0]):
+        if meta["persona_name"] in exclude:
+            continue
+        if 1.0 - distance >= reuse_similarity:
+            print(f"Found existing relevant persona for gap: {meta['persona_name']} "
+                  f"(similarity {1.0 - distance:.2f})")
+            return [meta["persona_name"]]
+        break
     
     # If no existing persona found, create a new one
     print("Creating new persona to fill expertise gap...")
@@ -633,7 +1161,9 @@ def create_gap_filling_persona(user_idea: str, required_domains: list) -> list:
         }
     ]
     
-    completion = client.chat.completions.create(
+    completion = create_chat_completion(
+        session=session,
+        purpose="gap_persona",
         model="gpt-4",
         messages=creation_prompt,
         max_tokens=2000,
@@ -658,7 +1188,7 @@ def find_personas_by_domains(domains: list, top_k=5) -> list:
         return []
     
     # Query using the OpenAI embedding and a simpler where clause
-    results = persona_collection.query(
+    results = get_persona_collection().query(
         query_embeddings=[get_openai_embedding("Retrieving persona by domain expertise")],
         where={
             "$or": [
@@ -682,40 +1212,16 @@ def find_personas_by_domains(domains: list, top_k=5) -> list:
 
 def store_new_persona_in_chroma(persona_dict):
     """
-    Takes a newly minted persona dict and stores it in both ChromaDB and the PERSONA_LIBRARY file.
+    Takes a newly minted persona dict and stores it in the persona registry and in ChromaDB.
+    The registry lists the persona only once it is indexed in Chroma, and drops it if indexing fails.
     """
-    # ... [previous ChromaDB storage code remains the same] ...
-
-    # Append to PERSONA_LIBRARY file
-    personas_file_path = "personas.py"
-    with open(personas_file_path, 'r') as file:
-        content = file.read()
-    
-    # Find the last entry and ensure it ends with a comma
-    if '}]' in content:
-        content = content.replace('}]', '},')
-    elif '}\n]' in content:
-        content = content.replace('}\n]', '},')
-
-    # Format the new persona as a dictionary string
-    new_persona_str = f"""    {{
-        'name': {repr(persona_dict["name"])},
-        'short_bio': {repr(persona_dict["short_bio"])},
-        'desc': {repr(persona_dict["desc"])},
-        'domain_expertise': {repr(persona_dict["domain_expertise"])},
-        'personality_traits': {repr(persona_dict["personality_traits"])},
-        'role_function': {repr(persona_dict["role_function"])},
-        'experience_level': {repr(persona_dict["experience_level"])},
-        'style_keywords': {repr(persona_dict["style_keywords"])}
-    }}\n]"""
-
-    # Write the updated content
-    with open(personas_file_path, 'w') as file:
-        file.write(content)
-        file.write(new_persona_str)
-
-    print(f"New Persona '{persona_dict['name']}' created and stored in both ChromaDB and PERSONA_LIBRARY.\n")
+    added = PERSONA_REGISTRY.add(persona_dict, index=index_persona)
+    if added:
+        print(f"New Persona '{persona_dict['name']}' created and stored in both ChromaDB and the persona registry.\n")
+    else:
+        print(f"Persona '{persona_dict['name']}' already exists; using the stored one.\n")
 
+@TRACER.traced("stage.selection.manager")
 def manager_agent_decide_personas(user_idea):
     """
     Manager agent logic that decides which domain_expertise are needed,
@@ -727,7 +1233,7 @@ def manager_agent_decide_personas(user_idea):
         {"role": "system", "content": "You are a manager agent deciding domain expertise needed."},
         {"role": "user", "content": f"User idea:\n{user_idea}\n\nWhich 2-3 domains are needed?"}
     ]
-    completion = client.chat.completions.create(
+    completion = create_chat_completion(
         model="gpt-4o",
         messages=manager_prompt,
         max_tokens=200,
@@ -740,23 +1246,146 @@ def manager_agent_decide_personas(user_idea):
     persona_names = manager_agent_create_persona_if_needed(user_idea, domain_list)
     return persona_names
 
-def manager_agent_monitor_conversation(conversation_history, persona_names, user_idea):
+_FIELD_INDEX = {"version": None, "index": None}
+_FIELD_INDEX_LOCK = threading.Lock()
+
+def get_persona_field_index() -> PersonaFieldIndex:
+    """
+    Returns the in-memory field index for local selection, rebuilt when the persona registry changes.
+    Field embeddings are read from 'persona_fields'; personas missing there (or whose text changed)
+    are embedded and stored first.
+    """
+    with _FIELD_INDEX_LOCK:
+        version = PERSONA_REGISTRY.version()
+        if _FIELD_INDEX["index"] is not None and _FIELD_INDEX["version"] == version:
+            return _FIELD_INDEX["index"]
+
+        personas = list(PERSONA_LIBRARY)
+        stored = get_persona_fields_collection().get(include=["documents", "metadatas", "embeddings"])
+        records = {
+            (meta["persona_name"], meta["field_name"]): (doc, emb)
+            for doc, meta, emb in zip(stored["documents"], stored["metadatas"], stored["embeddings"])
+        }
+        label_vectors = {
+            doc: emb for doc, meta, emb in zip(stored["documents"], stored["metadatas"], stored["embeddings"])
+            if meta["field_name"] == "domain_label"
+        }
+        stale = [
+            p for p in personas
+            if any(records.get((p["name"], field), (None,))[0] != text for field, text in persona_field_texts(p).items())
+        ]
+        if stale:
+            store_persona_fields_in_chroma(stale)
+
+        field_vectors = {}
+        for p in personas:
+            for field, text in persona_field_texts(p).items():
+                record = records.get((p["name"], field))
+                # Fresh records were just embedded, so these lookups hit the embedding cache
+                field_vectors[(p["name"], field)] = record[1] if record and record[0] == text else get_openai_embedding(text)
+
+        # Individual domain labels, used to measure how much of an idea's domain space a team covers
+        persona_domains = {p["name"]: list(p.get("domain_expertise") or []) for p in personas}
+        missing_labels = sorted({label for labels in persona_domains.values() for label in labels} - set(label_vectors))
+        if missing_labels:
+            embeddings = get_openai_embeddings(missing_labels)
+            get_persona_fields_collection().upsert(
+                documents=missing_labels,
+                embeddings=embeddings,
+                metadatas=[{"persona_name": "", "field_name": "domain_label"} for _ in missing_labels],
+                ids=[f"domain-label-{hashlib.sha1(label.encode('utf-8')).hexdigest()[:16]}" for label in missing_labels]
+            )
+            label_vectors.update(zip(missing_labels, embeddings))
+
+        index = PersonaFieldIndex([p["name"] for p in personas], field_vectors, persona_domains, label_vectors)
+        _FIELD_INDEX.update(version=version, index=index)
+        return index
+
+@TRACER.traced("stage.selection.local")
+def select_personas_locally(user_idea, num_personas=3, verbose=True) -> dict:
+    """
+    Scores every persona against the idea as a weighted fusion of its field embeddings and picks
+    a team of at most 'num_personas' that covers the idea's domains without redundant voices.
+    One embedding call for the idea (none if cached), no LLM call. Returns the PersonaFieldIndex.rank()
+    result with "personas" replaced by the team picks.
+    """
+    index = get_persona_field_index()
+    query_emb = get_openai_embedding(user_idea)
+    ranking = index.rank(query_emb, k=num_personas)
+    ranking["personas"] = index.team(query_emb, budget=num_personas)
+    if verbose:
+        for pick in ranking["personas"]:
+            fields = ", ".join(f"{field} {similarity:.2f}" for field, similarity in
+                               sorted(pick["fields"].items(), key=lambda item: -item[1])[:3])
+            print(f"  {pick['name']}: score {pick['score']:.2f}, adds {pick['coverage_gain']:.2f} coverage "
+                  f"(strongest: {pick['top_field']}; {fields})")
+    return ranking
+
+def select_team(query_text, budget=3, candidates=None) -> list:
+    """
+    Names of a team of at most 'budget' personas that covers 'query_text' with as little overlap
+    as possible (see PersonaFieldIndex.team), optionally chosen from 'candidates' only.
+    """
+    picks = get_persona_field_index().team(get_openai_embedding(query_text), budget=budget, candidates=candidates)
+    return [pick["name"] for pick in picks]
+
+def decide_personas(user_idea, num_personas=3) -> list:
+    """
+    Automatic selection: a local multi-field embedding match, falling back to the manager
+    agent (an LLM call) only when the local match is not confident.
+    """
+    print("Matching personas to your idea...")
+    ranking = select_personas_locally(user_idea, num_personas)
+    confidence = ranking["confidence"]
+    if confidence["confident"]:
+        return [pick["name"] for pick in ranking["personas"]]
+    print(f"Local match is not confident (top score {confidence['top_score']:.2f}, "
+          f"separation {confidence['separation']:.2f}); asking the Manager Agent.")
+    return manager_agent_decide_personas(user_idea)
+
+def get_persona_expertise_text(persona_name: str) -> str:
+    """
+    Returns the text describing a persona's expertise, used to build its expertise vector.
+    Falls back to the persona_library metadata or description for personas created at runtime.
+    """
+    for persona in PERSONA_LIBRARY:
+        if persona["name"] == persona_name:
+            return f"{persona['role_function']}: {', '.join(persona['domain_expertise'])}"
+
+    results = get_persona_collection().get(where={"persona_name": persona_name})
+    for meta in results.get("metadatas") or []:
+        if meta.get("domain_expertise"):
+            return f"{meta.get('role_function', '')}: {meta['domain_expertise']}"
+
+    return retrieve_persona_by_name(persona_name) or persona_name
+
+@TRACER.traced("stage.gap_monitor")
+def manager_agent_monitor_conversation(turn_log, persona_names, user_idea,
+                                       round_embeddings=None, drift_detector=None, session=None,
+                                       persona_creator=None):
     """
     Looks at the last round of conversation, checks if there's a domain gap.
     If there's a gap, create/inject a new persona.
-    Returns possibly updated persona_names if we add a new one.
+    Returns persona_names, with any new persona appended (it is also added to the turn log).
+    With a GapPersonaCreator, the persona is requested from it instead and persona_names is
+    returned unchanged; the caller adds the persona once it is ready.
+
+    When a drift_detector and the round's message embeddings are given, the LLM gap check
+    only runs if coverage of the personas' expertise dropped or the topic shifted.
     """
-    # First ensure all personas have conversation history entries
-    for persona in persona_names:
-        if persona not in conversation_history:
-            conversation_history[persona] = []
-    
     # Get last responses, but only for personas who have spoken
-    last_responses = [conversation_history[p][-1] for p in persona_names if conversation_history[p]]
+    last_responses = [m for m in (turn_log.last_message(p) for p in persona_names) if m is not None]
     
     # If no responses yet, return without changes
     if not last_responses:
         return persona_names
+
+    # Cheap local gate before paying for the LLM gap check
+    if drift_detector is not None and round_embeddings is not None:
+        drift_report = drift_detector.observe_round(round_embeddings)
+        if not drift_report["should_check"]:
+            return persona_names
+        print(f"Gap check triggered: {drift_report['reason']}")
     
     # feed that into an LLM prompt
     monitor_prompt = [
@@ -767,7 +1396,9 @@ def manager_agent_monitor_conversation(conversation_history, persona_names, user
             "Do we have any domain gaps? If so, name them or say 'No Gap' if everything is covered."
         )}
     ]
-    completion = client.chat.completions.create(
+    completion = create_chat_completion(
+        session=session,
+        purpose="gap_monitor",
         model="gpt-4o",
         messages=monitor_prompt,
         max_tokens=300,
@@ -783,28 +1414,49 @@ def manager_agent_monitor_conversation(conversation_history, persona_names, user
     if not new_domains:
         return persona_names
 
+    if persona_creator is not None:
+        if persona_creator.request(new_domains):
+            print(f"Creating a persona for {', '.join(new_domains)} in the background.")
+        return persona_names
+
     # create new persona if none exist
-    new_personas = create_gap_filling_persona(user_idea, new_domains)
-    # add them to persona_names and initialize their conversation history
+    new_personas = create_gap_filling_persona(user_idea, new_domains, session=session, exclude=persona_names)
+    # add them to persona_names and the turn log; they speak from the next round on
+    return join_gap_personas(turn_log, persona_names, new_personas, drift_detector, session=session)
+
+def join_gap_personas(turn_log, persona_names, new_personas, drift_detector=None, session=None):
+    """
+    Adds gap personas not yet in the session to persona_names, the turn log and the drift detector.
+    """
     for new_persona in new_personas:
         if new_persona not in persona_names:
             persona_names.append(new_persona)
-            conversation_history[new_persona] = []
-            
+            turn_log.add_persona(new_persona)
+            if drift_detector is not None:
+                drift_detector.set_expertise(
+                    new_persona, embed_for("drift", [get_persona_expertise_text(new_persona)], session=session)[0]
+                )
     return persona_names
 
-def reasoning_agent_review(conversation_history, persona_names):
+def prepare_gap_persona(user_idea, domains, session=None, exclude=()) -> list:
+    """
+    Background task of a GapPersonaCreator: creates (or finds) and indexes the persona, then
+    warms its essence and expertise embedding so joining the conversation costs no API call.
+    """
+    new_personas = create_gap_filling_persona(user_idea, domains, session=session, exclude=exclude)
+    persona_essences(new_personas, session=session)
+    embed_for("drift", [get_persona_expertise_text(name) for name in new_personas], session=session)
+    return new_personas
+
+@TRACER.traced("stage.critique")
+def reasoning_agent_review(turn_log, session=None):
     """
     The reasoning agent reads the entire conversation so far,
     highlights contradictions or suggestions to refine.
     Returns a short string summarizing them.
     """
-    # Convert conversation_history into a text block
-    transcript = ""
-    for pn in persona_names:
-        # Just the last response or the entire conversation, up to you
-        for i, resp in enumerate(conversation_history[pn], start=1):
-            transcript += f"{pn} (turn {i}): {resp}\n"
+    # The whole conversation so far, in speaking order
+    transcript = turn_log.render_text("{persona} (round {round}): {message}\n")
 
     # Now call GPT-4 to find contradictions, improvements
     agent_prompt = [
@@ -823,7 +1475,9 @@ def reasoning_agent_review(conversation_history, persona_names):
             )
         }
     ]
-    completion = client.chat.completions.create(
+    completion = create_chat_completion(
+        session=session,
+        purpose="critique",
         model="gpt-4o",
         messages=agent_prompt,
         max_tokens=400,
@@ -833,136 +1487,350 @@ def reasoning_agent_review(conversation_history, persona_names):
     critique = completion.choices[0].message.content.strip()
     return critique
 
-PERSONA_CACHE = {}  # { persona_name: persona_desc }
+PERSONA_CACHE = {}  # { persona_name: essence }, dropped by invalidate_persona_essence()
 
-def retrieve_persona_by_name(persona_name: str) -> str:
+def get_essence_cache():
+    return _lazy_resource("essences", EssenceCache)
+
+def retrieve_persona_by_name(persona_name: str, session=None) -> str:
     """
-    Fetches the persona description from the persona_library collection.
-    Uses a cache to avoid repeated queries.
+    Returns the persona's essence: its description and learned summaries distilled to at most
+    ESSENCE_MAX_TOKENS tokens. Uses a cache to avoid repeated queries.
     """
-    
-    if persona_name in PERSONA_CACHE:
-        # Already fetched in this session
-        return PERSONA_CACHE[persona_name]
-
-    # 1) Find the doc with field_name=desc
-    # 2) Also find docs with field_name=learned_summary
-    # 3) Combine them
-    # We'll do a naive approach here for brevity:
-    query_text = f"{persona_name} learned_summary desc"
-    emb = get_openai_embedding(query_text)
-    results = persona_collection.query(
-        query_embeddings=[emb],
-        n_results=5
-    )
-
-    # parse out the best match for "desc" and also any "learned_summary"
-    # for simplicity, just combine them
-    combined_desc = ""
-    for docs, metas in zip(results["documents"], results["metadatas"]):
-        for doc, meta in zip(docs, metas):
-            if meta.get("persona_name") == persona_name:
-                # e.g. if "field_name" in ["desc","learned_summary"]
-                if meta.get("field_name") in ("desc", "learned_summary"):
-                    combined_desc += doc + "\n---\n"
-    
-    # Store in cache for future lookups
-    PERSONA_CACHE[persona_name] = combined_desc
-    return combined_desc
+    return persona_essences([persona_name], session=session)[persona_name]
 
-def run_brainstorming_with_reasoning(persona_names, idea, total_turns_each=10, k=3):
+def persona_essences(persona_names, session=None) -> dict:
     """
-    'persona_names' is a list of persona names from our persona library in Chroma.
-    Each persona gets 'total_turns_each' opportunities to speak.
+    Returns { persona_name: essence }. Personas not cached in this process are looked up with
+    one Chroma call for all of their learned summaries; an essence is only distilled again
+    when its inputs changed (their content hash is not in the EssenceCache).
     """
-    conversation_history = {name: [] for name in persona_names}
-    num_personas = len(persona_names)
-    total_turns = num_personas * total_turns_each
-
-    for turn_index in range(total_turns):
-        current_persona_index = turn_index % num_personas
-        persona_name = persona_names[current_persona_index]
-        
-        # Formulate a retrieval query
-        last_message = conversation_history[persona_name][-1] if conversation_history[persona_name] else ""
-        retrieval_query = f"New turn for {persona_name}. Last message from them: {last_message}. Idea: {idea}"
-        
-        # Retrieve top k relevant docs from the conversation collection
-        relevant_context = retrieve_relevant_context(retrieval_query, k=k)
+    missing = [name for name in dict.fromkeys(persona_names) if name not in PERSONA_CACHE]
+    if missing:
+        stored = get_persona_collection().get(
+            where={"$and": [{"persona_name": {"$in": missing}}, {"field_name": "learned_summary"}]},
+            include=["documents", "metadatas"]
+        )
+        learned = {name: [] for name in missing}
+        for doc, meta in zip(stored["documents"], stored["metadatas"]):
+            learned[meta["persona_name"]].append((meta.get("learned_at", 0), doc))
+
+        to_distill = {}
+        for name in missing:
+            desc = _persona_desc(name)
+            summaries = [doc for _, doc in sorted(learned[name])]
+            key = essence_key(desc, summaries)
+            essence = get_essence_cache().get(name, key)
+            if essence is not None:
+                PERSONA_CACHE[name] = essence
+            elif not summaries and count_tokens(desc) <= ESSENCE_MAX_TOKENS:
+                # Already short enough: the description is the essence
+                get_essence_cache().put(name, key, desc)
+                PERSONA_CACHE[name] = desc
+            else:
+                to_distill[name] = (key, desc, summaries)
+
+        if to_distill:
+            with ThreadPoolExecutor(max_workers=len(to_distill), thread_name_prefix="essence") as pool:
+                futures = {name: pool.submit(_distill_essence, name, desc, summaries, session)
+                           for name, (_, desc, summaries) in to_distill.items()}
+            for name, future in futures.items():
+                essence = future.result()
+                get_essence_cache().put(name, to_distill[name][0], essence)
+                PERSONA_CACHE[name] = essence
+    return {name: PERSONA_CACHE[name] for name in persona_names}
+
+def invalidate_persona_essence(persona_name):
+    """
+    Drops the in-process essence and prompt prefixes of a persona whose learned summaries changed.
+    """
+    PERSONA_CACHE.pop(persona_name, None)
+    PROMPT_ASSEMBLER.invalidate(persona_name)
 
-        # Reasoning agent critique so far
-        critique = reasoning_agent_review(conversation_history, persona_names)
+def _persona_desc(persona_name) -> str:
+    try:
+        return PERSONA_REGISTRY.get_desc(persona_name)
+    except KeyError:
+        # Not in the registry: fall back to the whole-description record in Chroma
+        doc_id = f"persona-{persona_name.lower().replace(' ', '-')}"
+        documents = get_persona_collection().get(ids=[doc_id], include=["documents"])["documents"]
+        return documents[0] if documents else ""
+
+@TRACER.traced("stage.essence")
+def _distill_essence(persona_name, desc, learned_summaries, session=None) -> str:
+    history = "\n\n".join(f"[{i + 1}] {summary}" for i, summary in enumerate(learned_summaries))
+    completion = create_chat_completion(
+        session=session,
+        purpose="essence",
+        model="gpt-4o",
+        messages=[
+            {"role": "developer", "content": (
+                "You distill a brainstorming persona into a compact essence used as its system prompt. "
+                "Keep its identity, expertise, worldview and communication style from the description, and "
+                "the most important insights or traits it developed in past sessions (listed oldest first; "
+                "prefer later ones when they disagree). Write in the second person ('You are ...'), "
+                f"at most {ESSENCE_MAX_TOKENS * 3 // 4} words, with no preamble."
+            )},
+            {"role": "user", "content": (
+                f"Persona: {persona_name}\n\nDescription:\n{desc}\n\n"
+                f"Learned in past sessions:\n{history or '(nothing yet)'}"
+            )}
+        ],
+        max_tokens=ESSENCE_MAX_TOKENS,
+        temperature=0.3
+    )
+    return truncate_to_tokens(completion.choices[0].message.content.strip(), ESSENCE_MAX_TOKENS)
 
-        # Combine everything in the 'context'
-        combined_context = (
-            f"{relevant_context}\n\n"
-            f"Reasoning Agent Critique:\n{critique}"
-        )
-        
-        # Generate persona’s response with their “essence”
-        next_response = generate_response_for_persona(persona_name, idea, relevant_context)
-        
-        # Store in local history + vector DB
-        conversation_history[persona_name].append(next_response)
-        store_message_in_chroma(persona_name, next_response)
+def run_brainstorming_with_reasoning(session, persona_names, idea, total_turns_each=10, k=3,
+                                     convergence_policy="balanced", checkpoint=None, on_turn=None):
+    """
+    'session' is the SessionContext whose conversation collection the messages go to.
+    'persona_names' is a list of persona names from our persona library in Chroma.
+    The session runs up to 'total_turns_each' rounds in which every persona speaks once;
+    personas added by the gap monitor join from the next round on.
+    'convergence_policy' (a name from CONVERGENCE_POLICIES or a custom dict) ends the session
+    early once the discussion stops producing novel messages.
 
-        # After each complete round (when all personas have spoken), check for gaps
-        if (turn_index + 1) % num_personas == 0:
-            updated_persona_names = manager_agent_monitor_conversation(conversation_history, persona_names, idea)
-            if len(updated_persona_names) > len(persona_names):
-                # New persona(s) were added
-                persona_names = updated_persona_names
-                num_personas = len(persona_names)
-                total_turns = num_personas * total_turns_each
-                # Initialize conversation history for new personas
-                for name in persona_names:
-                    if name not in conversation_history:
-                        conversation_history[name] = []
+    If a SessionCheckpoint is given, it is updated after every turn. A checkpoint that already
+    has completed turns is resumed: its turn log and persona list replace the arguments
+    and the loop continues from the next turn.
 
-    return conversation_history
+    'on_turn', if given, is called with {"turn", "round", "persona", "message"} after every
+    stored turn (used to stream turns to service clients). Returns the session's TurnLog.
 
+    The session's budget degrades the loop as it runs low: the critique is skipped, fewer
+    snippets are retrieved, and eventually the brainstorm ends before the planned rounds
+    and no more gap personas are added.
 
-def retrieve_relevant_context(query_text: str, k=5):
+    Gap personas are created in the background while the rounds go on, and join at the
+    first round boundary after they are ready. Creations still running when the session
+    ends are not waited for, and are not carried over by a resume.
+    """
+    budget = session.budget
+    budget.start()
+    resuming = checkpoint is not None and checkpoint.state["next_turn_index"] > 0
+    if resuming:
+        persona_names = list(checkpoint.state["persona_names"])
+        turn_log = TurnLog.from_state(checkpoint.state["turn_log"])
+        for name in persona_names:
+            turn_log.add_persona(name)
+        start_round = checkpoint.state.get("rounds_done", 0)
+        num_selected = checkpoint.state["config"].get("num_selected", len(persona_names))
+        print(f"Resuming session {checkpoint.session_id} at turn {len(turn_log) + 1}.")
+    else:
+        persona_names = list(persona_names)
+        turn_log = TurnLog(persona_names)
+        start_round = 0
+        num_selected = len(persona_names)
+        if checkpoint is not None:
+            checkpoint.start(idea, persona_names, {
+                "total_turns_each": total_turns_each,
+                "k": k,
+                "convergence_policy": convergence_policy,
+                "num_selected": len(persona_names),
+            })
+
+    # Every persona's essence in one round trip, instead of one query per persona on its first turn
+    persona_essences(persona_names, session=session)
+
+    # Local drift/coverage detector that gates the per-round gap monitor
+    drift_detector = DriftDetector()
+    expertise_embeddings = embed_for("drift", [get_persona_expertise_text(name) for name in persona_names],
+                                     session=session)
+    for name, embedding in zip(persona_names, expertise_embeddings):
+        drift_detector.set_expertise(name, embedding)
+    round_embeddings = []
+
+    # Novelty tracker that ends the loop once the discussion converges
+    convergence_monitor = ConvergenceMonitor(convergence_policy)
+
+    # Retrieval runs on cached vectors: the idea is embedded once per session and each
+    # persona's last message reuses the embedding computed when it was stored.
+    idea_embedding = embed_for("session_context", [idea], session=session)[0]
+    last_embeddings = {}  # { persona_name: embedding of their last message }
+
+    if resuming:
+        # Rebuild the local monitors from the embeddings already stored in the session collection
+        seed_embedding_cache_from_session(session)
+        for round_number in range(turn_log.rounds):
+            messages = list(turn_log.for_round(round_number))
+            for (_, persona_name, _), embedding in zip(messages, embed_for(
+                    "session_context", [message for _, _, message in messages], session=session)):
+                last_embeddings[persona_name] = embedding
+            round_embeddings = embed_for("drift", [message for _, _, message in messages], session=session)
+            if round_number < start_round:
+                convergence_monitor.observe_round(round_embeddings)
+                drift_detector.observe_round(round_embeddings)
+                round_embeddings = []
+
+    persona_creator = GapPersonaCreator(
+        lambda domains: prepare_gap_persona(idea, domains, session=session, exclude=list(persona_names)),
+        handled=checkpoint.state.get("gap_domains", []) if resuming else None
+    )
+    try:
+        out_of_budget = False
+        for round_number in range(start_round, total_turns_each):
+            # A resumed round continues with the personas who have not spoken in it yet
+            spoken = {persona_name for _, persona_name, _ in turn_log.for_round(round_number)}
+            for persona_name in [p for p in persona_names if p not in spoken]:
+                if budget.degraded("end_rounds"):
+                    out_of_budget = True
+                    break
+                turn_index = len(turn_log)
+                with TRACER.span("stage.turn", persona=persona_name, turn=turn_index + 1):
+                    # Formulate a retrieval query from the persona's last message and the idea
+                    if persona_name in last_embeddings:
+                        query_embeddings = [last_embeddings[persona_name], idea_embedding]
+                        query_weights = [0.6, 0.4]
+                    else:
+                        query_embeddings = [idea_embedding]
+                        query_weights = [1.0]
+
+                    # Retrieve top k relevant docs from the conversation collection
+                    relevant_context = retrieve_relevant_context_by_vectors(
+                        session, query_embeddings, weights=query_weights, k=budget.context_k(k)
+                    )
+
+                    # Reasoning agent critique so far
+                    critique = "" if budget.degraded("skip_critique") else reasoning_agent_review(turn_log, session=session)
+
+                    # Generate persona’s response with their “essence”, the retrieved context and the critique
+                    next_response = generate_response_for_persona(persona_name, idea, relevant_context, critique,
+                                                                  session=session)
+
+                    # Store in the vector DB, then in the turn log
+                    last_embeddings[persona_name] = store_message_in_chroma(
+                        session, persona_name, next_response, turn_index=turn_index
+                    )
+                    turn_log.append(persona_name, next_response, round_number,
+                                    embedding_id=f"{session.session_id}-turn-{turn_index}")
+                    round_embeddings.append(embed_for("drift", [next_response], session=session)[0])
+
+                    if checkpoint is not None:
+                        checkpoint.record_turn(turn_index, turn_log, persona_names, budget=budget)
+                    if on_turn is not None:
+                        on_turn({"turn": turn_index + 1, "round": round_number + 1, "persona": persona_name,
+                                 "message": next_response})
+
+            if out_of_budget:
+                print(f"Session budget nearly spent ({budget.used():.0%}); ending the brainstorm "
+                      f"in round {round_number + 1} of {total_turns_each}.")
+                break
+
+            # After each complete round (when all personas have spoken), check for gaps
+            convergence_monitor.observe_round(round_embeddings)
+            num_before = len(persona_names)
+            # Gap personas whose background creation finished join from the next round on
+            persona_names = join_gap_personas(turn_log, persona_names, persona_creator.ready(), drift_detector,
+                                              session=session)
+            if budget.allows_new_persona(len(persona_names) - num_selected + persona_creator.pending):
+                persona_names = manager_agent_monitor_conversation(
+                    turn_log, persona_names, idea,
+                    round_embeddings=round_embeddings, drift_detector=drift_detector, session=session,
+                    persona_creator=persona_creator
+                )
+            round_embeddings = []
+            if checkpoint is not None:
+                checkpoint.update(persona_names=list(persona_names), rounds_done=round_number + 1,
+                                  gap_domains=persona_creator.handled_domains())
+            if len(persona_names) > num_before:
+                # Give the new voice a chance before stopping
+                convergence_monitor.reset_patience()
+            elif convergence_monitor.should_stop() and not persona_creator.pending:
+                # (a persona still being created gets its chance as well)
+                break
+    finally:
+        # Also when a turn raises, so creations still queued never start for a failed session
+        persona_creator.close()
+    print(convergence_monitor.report(planned_rounds=total_turns_each))
+    print(f"Gap monitor: {drift_detector.checks_run} LLM checks run, "
+          f"{drift_detector.checks_skipped} skipped by drift detector.")
+    return turn_log
+
+
+def retrieve_relevant_context(session, query_text: str, k=5):
     """
     Retrieves the top k most relevant documents from the session-specific conversation collection.
     """
-    if SESSION_COLLECTION is None:
+    if session is None:
         return ""
     
-    query_embedding = get_openai_embedding(query_text)
+    query_embedding = embed_for("session_context", [query_text], session=session)[0]
+    return retrieve_relevant_context_by_vectors(session, [query_embedding], k=k)
+
+@TRACER.traced("stage.retrieval")
+def retrieve_relevant_context_by_vectors(session, query_embeddings: list, weights=None, k=5, mode="weighted",
+                                         fetch_k=20, lambda_mult=0.7, recency_weight=0.1,
+                                         dedup_threshold=0.95, token_budget=1200):
+    """
+    Retrieves the k most relevant documents for already-computed embeddings, with no embeddings API call.
 
-    results = SESSION_COLLECTION.query(
-        query_embeddings=[query_embedding],
-        n_results=k
+    mode="weighted": the vectors are combined into a single query by weighted sum.
+    mode="multi":    each vector is queried separately and the candidates are merged locally.
+
+    Either way, 'fetch_k' candidates are over-fetched with their embeddings and re-ranked locally:
+    maximal marginal relevance with a recency bonus, dropping near-duplicates above
+    'dedup_threshold', and keeping only what fits in 'token_budget' tokens.
+    """
+    if session is None or not query_embeddings:
+        return ""
+
+    if weights is None:
+        weights = [1.0] * len(query_embeddings)
+
+    if mode == "weighted":
+        query_batch = [weighted_sum_vector(query_embeddings, weights).tolist()]
+    elif mode == "multi":
+        query_batch = [list(e) for e in query_embeddings]
+    else:
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+
+    results = get_context_collection(session).query(
+        query_embeddings=query_batch,
+        n_results=max(k, fetch_k),
+        include=["documents", "embeddings", "metadatas"]
     )
-    
-    # results['documents'] is a list of lists (because we can have multiple queries at once)
-    relevant_docs = results['documents'][0] if results and results['documents'] else []
-    
+
+    # Merge the per-query candidate lists, keeping each document once
+    candidates = {}
+    for ids, docs, embs, metas in zip(results['ids'], results['documents'],
+                                      results['embeddings'], results['metadatas']):
+        for doc_id, doc, emb, meta in zip(ids, docs, embs, metas):
+            candidates[doc_id] = (doc, emb, meta or {})
+    if not candidates:
+        return ""
+
+    docs = [doc for doc, _, _ in candidates.values()]
+    embeddings = [emb for _, emb, _ in candidates.values()]
+
+    # Relevance is the weighted similarity to every query vector
+    total_weight = float(sum(weights)) or 1.0
+    relevance = cosine_similarity_matrix(embeddings, query_embeddings) @ [w / total_weight for w in weights]
+
+    # Recency: scale turn indices to 0..1 with the newest message at 1
+    turn_indices = [meta.get("turn_index", 0) for _, _, meta in candidates.values()]
+    newest = max(turn_indices) or 1
+    recency = [t / newest for t in turn_indices]
+
+    local_uses = get_local_embedding_uses()
+    if "dedup" in local_uses and "session_context" not in local_uses:
+        # Near-duplicates are judged on local vectors of the candidates
+        embeddings = embed_for("dedup", docs)
+    chosen = mmr_rerank(relevance, embeddings, k, recency=recency, lambda_mult=lambda_mult,
+                        recency_weight=recency_weight, dedup_threshold=dedup_threshold)
+    relevant_docs = fit_to_token_budget([docs[i] for i in chosen], token_budget)
+
     # We'll just concatenate them. You could handle them differently, e.g. bullet points, etc.
     context_text = "\n".join(relevant_docs)
     return context_text
 
-def synthesize_final_output(conversation_history, persona_names, idea):
-    # Combine all conversation_history entries into a single summary
-    chat_transcript = ""
-    
-    # Get the number of turns from the first persona's history
-    total_turns = len(conversation_history[persona_names[0]])
-    num_personas = len(persona_names)
-    
-    # For each turn, find which persona was speaking based on the turn number
-    for turn_index in range(total_turns * num_personas):
-        current_persona_index = turn_index % num_personas
-        persona_name = persona_names[current_persona_index]
-        round_number = turn_index // num_personas
-        
-        # Only add to transcript if this persona still has turns left
-        if round_number < len(conversation_history[persona_name]):
-            # Get persona description from ChromaDB instead of PERSONA_LIBRARY
-            persona_desc = retrieve_persona_by_name(persona_name)
-            chat_transcript += f"\n--- Turn {turn_index + 1}: {persona_name} ({persona_desc}) ---\n"
-            chat_transcript += f"{conversation_history[persona_name][round_number]}\n"
+@TRACER.traced("stage.synthesis")
+def synthesize_final_output(turn_log, idea, session=None):
+    # Each participant's bounded essence is listed once, then the whole turn log in speaking order
+    essences = persona_essences(turn_log.persona_names, session=session)
+    participants = "\n".join(f"- {name}: {essence}" for name, essence in essences.items())
+    chat_transcript = (f"Participants:\n{participants}\n"
+                       + turn_log.render_text("\n--- Turn {turn}: {persona} ---\n{message}\n"))
 
     messages = [
         {
@@ -988,7 +1856,9 @@ def synthesize_final_output(conversation_history, persona_names, idea):
         }
     ]
     
-    completion = client.chat.completions.create(
+    completion = create_chat_completion(
+        session=session,
+        purpose="synthesis",
         model="gpt-4o",
         messages=messages,
         max_tokens=5000,
@@ -997,27 +1867,237 @@ def synthesize_final_output(conversation_history, persona_names, idea):
     return completion.choices[0].message.content.strip()
 
 
-def main():
-    # STEP 1: Create a new conversation collection
-    create_new_conversation_collection()
-    
-    # STEP 2: Initialize collections (only recreates what's necessary)
+@TRACER.traced("stage.finish")
+def finish_session(session, turn_log, idea, checkpoint=None, store_learned=True, on_proposal=None):
+    """
+    End-of-session steps, run concurrently (the governor still caps API calls): synthesis,
+    a learned summary per persona and the archive ingest. The learned summaries are then
+    embedded in one batch and stored with one bulk write.
+
+    'on_proposal' is called with the proposal as soon as it is ready, while the other steps
+    are still running. With a checkpoint, steps that already completed before a crash are
+    not repeated. Learned summaries are skipped once the session budget is exhausted.
+    With a BATCH_QUEUE configured, the learned summaries and the archive embeddings are
+    queued for the Batch API instead (see batch_jobs.py) and only the synthesis runs now.
+    Returns the final proposal once every step has finished.
+    """
+    state = checkpoint.state if checkpoint is not None else {}
+    learned_done = state.get("learned_done", [])
+    if store_learned and session.budget.exhausted:
+        print("Session budget exhausted; skipping learned persona summaries.")
+        store_learned = False
+    learned_todo = [p for p in turn_log.persona_names if p not in learned_done] if store_learned else []
+
+    if BATCH_QUEUE is not None:
+        enqueue_learned_summaries(BATCH_QUEUE, session, turn_log, learned_todo)
+        if not state.get("archived"):
+            enqueue_archive_messages(BATCH_QUEUE, session, turn_log)
+        if checkpoint is not None:
+            checkpoint.update(learned_done=learned_done + learned_todo, archived=True)
+        print(f"Queued {len(learned_todo)} learned summaries and the archive for the Batch API.")
+        learned_todo = []
+        state = {**state, "archived": True}
+
+    with ThreadPoolExecutor(max_workers=len(learned_todo) + 2, thread_name_prefix="finish") as pool:
+        proposal_future = None
+        if not state.get("proposal"):
+            proposal_future = pool.submit(synthesize_final_output, turn_log, idea, session=session)
+        summary_futures = {
+            persona_name: pool.submit(generate_learned_summary, session, persona_name, turn_log)
+            for persona_name in learned_todo
+        }
+        archive_future = None
+        if not state.get("archived"):
+            archive_future = pool.submit(archive_session_messages, session, turn_log)
+
+        if proposal_future is None:
+            final_output = state["proposal"]
+        else:
+            final_output = proposal_future.result()
+            if checkpoint is not None:
+                checkpoint.update(proposal=final_output, phase="synthesized")
+        if on_proposal is not None:
+            on_proposal(final_output)
+
+        learned_summaries = {name: future.result() for name, future in summary_futures.items()}
+        store_learned_summaries(session, learned_summaries)
+        if checkpoint is not None and learned_summaries:
+            checkpoint.update(learned_done=learned_done + list(learned_summaries))
+        for persona_name in learned_summaries:
+            maybe_consolidate_learned_summaries(persona_name, session=session)
+
+        if archive_future is not None:
+            archive_future.result()
+            if checkpoint is not None:
+                checkpoint.update(archived=True)
+
+    if checkpoint is not None:
+        checkpoint.update(phase="complete", budget=session.budget.to_state())
+    return final_output
+
+def run_session(idea, selection="auto", persona_names=None, persona_query=None, num_personas=3,
+                total_turns_each=10, k=3, convergence_policy="balanced", store_learned=True,
+                checkpoint_dir=DEFAULT_CHECKPOINT_DIR, session=None, on_turn=None, budget=None):
+    """
+    Runs one complete session without any input() prompts.
+
+    selection="names":    use 'persona_names' as given
+    selection="semantic": pick the top 'num_personas' matches for 'persona_query'
+    selection="auto":     local multi-field match, with the manager agent as fallback
+    selection="local":    local multi-field match only (no LLM call)
+    selection="manager":  let the manager agent decide
+
+    A checkpoint is written to 'checkpoint_dir' after every turn (pass None to disable);
+    see resume_session(). A pre-created 'session' may be passed in (the service does this
+    to hand out the session id before the run starts); 'on_turn' streams each turn.
+    'budget' is a dict of SessionBudget limits (max_tokens, max_cost_usd, max_wall_s,
+    max_added_personas); without it the session is unbounded but its spend is still tracked.
+    Returns a dict with the session, its id, personas, turn log, final proposal and budget summary.
+    """
+    if session is None:
+        session = create_new_conversation_collection()
+    if budget:
+        session.budget = SessionBudget(**budget)
+    session.budget.start()
+    initialize_persona_collection()
+    checkpoint = SessionCheckpoint(session.session_id, checkpoint_dir) if checkpoint_dir else None
+
+    if selection == "names":
+        selected_personas = list(persona_names or [])
+    elif selection == "semantic":
+        selected_personas = search_personas_by_description(persona_query or idea, n_results=num_personas)
+    elif selection == "auto":
+        selected_personas = decide_personas(idea, num_personas)
+    elif selection == "local":
+        selected_personas = [pick["name"] for pick in select_personas_locally(idea, num_personas)["personas"]]
+    elif selection == "manager":
+        selected_personas = manager_agent_decide_personas(idea)
+    else:
+        raise ValueError(f"Unknown selection mode: {selection}")
+
+    if not selected_personas:
+        raise ValueError("No personas selected.")
+
+    turn_log = run_brainstorming_with_reasoning(
+        session,
+        persona_names=selected_personas,
+        idea=idea,
+        total_turns_each=total_turns_each,
+        k=k,
+        convergence_policy=convergence_policy,
+        checkpoint=checkpoint,
+        on_turn=on_turn
+    )
+
+    final_output = finish_session(session, turn_log, idea, checkpoint=checkpoint, store_learned=store_learned)
+
+    return {
+        "session": session,
+        "session_id": session.session_id,
+        # Includes any persona the gap monitor added mid-session
+        "personas": turn_log.persona_names,
+        "turn_log": turn_log,
+        "proposal": final_output,
+        "budget": session.budget.summary(),
+    }
+
+def resume_session(session_id, checkpoint_dir=DEFAULT_CHECKPOINT_DIR, store_learned=True):
+    """
+    Continues a session from its last completed turn, reusing the stored session collection.
+    Finished end-of-session steps are skipped. Returns the same dict as run_session().
+    """
+    checkpoint = SessionCheckpoint.load(session_id, checkpoint_dir)
+    state = checkpoint.state
+    session = open_existing_conversation_collection(session_id)
+    if state.get("budget"):
+        # Carry over what was spent before the crash
+        session.budget = SessionBudget.from_state(state["budget"])
     initialize_persona_collection()
 
-    # STEP 3: Ask user if they want to search old sessions first
+    if state["phase"] == "brainstorming":
+        config = state["config"]
+        turn_log = run_brainstorming_with_reasoning(
+            session,
+            persona_names=state["persona_names"],
+            idea=state["idea"],
+            total_turns_each=config.get("total_turns_each", 10),
+            k=config.get("k", 3),
+            convergence_policy=config.get("convergence_policy", "balanced"),
+            checkpoint=checkpoint
+        )
+    else:
+        turn_log = TurnLog.from_state(state["turn_log"])
+
+    final_output = finish_session(session, turn_log, state["idea"], checkpoint=checkpoint,
+                                  store_learned=store_learned)
+    return {
+        "session": session,
+        "session_id": session_id,
+        "personas": turn_log.persona_names,
+        "turn_log": turn_log,
+        "proposal": final_output,
+        "budget": session.budget.summary(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-persona brainstorming.")
+    parser.add_argument("--resume", metavar="SESSION_ID", help="Resume a session from its last checkpoint")
+    parser.add_argument("--list-checkpoints", action="store_true", help="Show resumable sessions")
+    parser.add_argument("--consolidate-learned", nargs="?", const="*", metavar="PERSONA",
+                        help="Merge near-duplicate learned summaries (for one persona, or all)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        default=os.environ.get("BRAINSTORMER_STARTUP_PROFILE") == "1",
+                        help="Print import, client and collection timings")
+    parser.add_argument("--max-tokens", type=int, default=None, help="Token budget for the session")
+    parser.add_argument("--max-cost", type=float, default=None, help="Cost budget for the session, in USD")
+    parser.add_argument("--max-minutes", type=float, default=None, help="Wall-time budget for the session")
+    args = parser.parse_args()
+
+    if args.list_checkpoints:
+        for state in list_checkpoints():
+            print(f"{state['session_id']}  phase={state['phase']}  turns={state['next_turn_index']}  "
+                  f"idea={(state.get('idea') or '')[:60]}")
+        return
+
+    if args.consolidate_learned:
+        names = [p["name"] for p in PERSONA_LIBRARY] if args.consolidate_learned == "*" else [args.consolidate_learned]
+        for persona_name in names:
+            consolidate_learned_summaries(persona_name)
+        return
+
+    if args.resume:
+        result = resume_session(args.resume)
+        print("\n=== FULL CONVERSATION HISTORY ===")
+        result["turn_log"].render(sys.stdout)
+        print("\n=== FINAL OUTPUT ===")
+        print(result["proposal"])
+        print(result["session"].budget.report())
+        return
+
+    # STEP 1: Open clients and collections in the background while the user answers
+    warm_up()
+
+    # STEP 2: Ask user if they want to search old sessions first
+    STARTUP_PROFILE["first_prompt"] = (time.perf_counter() - _IMPORT_STARTED) * 1000
     do_search = input("Would you like to search past sessions for inspiration? (y/n)\n> ")
     if do_search.lower().startswith('y'):
         query = input("What would you like to search for?\n> ")
         search_previous_sessions(query)
     
-    # Step 4: Ask the user for the idea.
+    # Step 3: Ask the user for the idea.
     user_idea = input("What's your idea?\n> ")
 
+    # Step 4: Create a new conversation collection
+    session = create_new_conversation_collection()
+    session.budget = SessionBudget(max_tokens=args.max_tokens, max_cost_usd=args.max_cost,
+                                   max_wall_s=args.max_minutes * 60 if args.max_minutes else None)
+    checkpoint = SessionCheckpoint(session.session_id)
+
     # Step 5: Ask how they want to select personas
     print("How would you like to select personas?")
     print("1. List all available personas and pick any number")
     print("2. Describe what you're looking for, and we'll do a semantic search")
-    print("3. Manager Agent picks for me.")
+    print("3. Pick for me (fast local match; the Manager Agent steps in if it's unsure).")
     choice = input("Enter 1, 2, or 3:\n> ").strip()
 
     if choice == "1":
@@ -1028,7 +2108,7 @@ def main():
         selected_personas = select_personas_by_semantic_search()
     elif choice == "3":
         # (C) Auto-select based on the idea
-        selected_personas = manager_agent_decide_personas(user_idea)
+        selected_personas = decide_personas(user_idea)
     else:
         print("Invalid choice. Defaulting to listing all personas.")
         selected_personas = select_personas_by_list()
@@ -1037,42 +2117,41 @@ def main():
         print("No personas selected. Exiting.")
         return
 
-    # Step 6: Run the brainstorming loop
-    conversation_history = run_brainstorming_with_reasoning(
+    # Step 6: Run the brainstorming loop (checkpointed after every turn)
+    print(f"Checkpointing to {checkpoint.path} (resume with: python app.py --resume {session.session_id})")
+    turn_log = run_brainstorming_with_reasoning(
+        session,
         persona_names=selected_personas,
         idea=user_idea,
         total_turns_each=10,
-        k=3
+        k=3,
+        checkpoint=checkpoint
     )
 
-    # Step 7: Print out the final conversation in round-robin order
-    # Get the number of turns from the first persona's history
-    total_turns = len(conversation_history[selected_personas[0]])
-    num_personas = len(selected_personas)
-    
-    # Print full conversation history
+    # Step 7: Print out the final conversation in speaking order
     print("\n=== FULL CONVERSATION HISTORY ===")
+    turn_log.render(sys.stdout)
 
-    # For each turn, find which persona was speaking based on the turn number
-    for turn_index in range(total_turns * num_personas):
-        current_persona_index = turn_index % num_personas
-        persona_name = selected_personas[current_persona_index]
-        round_number = turn_index // num_personas
-        
-        # Only print if this persona still has turns left
-        if round_number < len(conversation_history[persona_name]):
-            print(f"\n{persona_name}, Turn {round_number + 1}:")
-            print(f"{conversation_history[persona_name][round_number]}\n")
+    # Step 8: Synthesize the final output, learn from the session and archive it, all at once.
+    # The proposal is printed as soon as it is ready; the learned summaries follow.
+    def show_proposal(final_output):
+        print("\n=== FINAL OUTPUT ===")
+        print(final_output)
+        print("\nSaving learned persona summaries and archiving the session...\n")
 
-    # Step 8. Synthesize final output
-    final_output = synthesize_final_output(conversation_history, selected_personas, user_idea)
+    finish_session(session, turn_log, user_idea, checkpoint=checkpoint, on_proposal=show_proposal)
 
-    # Step 9: For each persona in the session, store a learned embedding
-    for persona_name in selected_personas:
-        store_persona_learned_embedding(persona_name, conversation_history)
-    
-    print("\n=== FINAL OUTPUT ===")
-    print(final_output)
+    print(session.prompt_cache_stats.report())
+    print(session.budget.report())
+    if args.profile_startup:
+        print(startup_profile_report())
+    if TRACER.enabled:
+        from http_transport import CONNECTION_STATS
+        print(CONNECTION_STATS.report())
+        print(TRACER.summary_table())
+        TRACER.export_jsonl()
+
+STARTUP_PROFILE["import"] = (time.perf_counter() - _IMPORT_STARTED) * 1000
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,319 @@
+# Offline Batch API path for bulk work that does not need interactive latency: learned persona
+# summaries, archive embeddings and persona re-indexing. Requests are queued in SQLite (shared
+# by every process that points at the same directory), written to one JSONL file per endpoint,
+# submitted through the provider's Batch API and polled; results are applied by handlers keyed
+# on each request's action type (app.BATCH_HANDLERS). Batch requests are billed at a discount
+# and do not count against the interactive rate limits.
+#
+# Applying is idempotent: downloaded results are stored before they are applied, a request is
+# marked applied only once its handler returned, and every handler writes with upserts on
+# deterministic ids. A crash at any point is repaired by the next poll. A result whose handler
+# keeps raising is retried on later polls and marked failed after BATCH_MAX_APPLY_ATTEMPTS,
+# without holding up the other results.
+#
+#   python batch_jobs.py submit             # write and submit the queued requests
+#   python batch_jobs.py poll [--wait]      # apply the results of finished batches
+#   python batch_jobs.py status
+#   python batch_jobs.py reindex-personas   # queue a re-embedding of the persona library
+#
+# BRAINSTORMER_BATCH_PROVIDER=local runs the batches in-process against simulated_openai,
+# so the whole path can be exercised offline.
+import argparse
+import json
+import os
+import time
+import uuid
+from sqlite_utils import ThreadLocalConnection
+
+DEFAULT_BATCH_DIR = os.environ.get("BRAINSTORMER_BATCH_DIR", "./batch_jobs")
+BATCH_MAX_REQUESTS = 50_000   # requests per batch file (API limit)
+BATCH_MAX_ATTEMPTS = 3        # submissions before a request left unanswered is marked failed
+BATCH_MAX_APPLY_ATTEMPTS = 3  # handler runs before a result that keeps raising is marked failed
+BATCH_COMPLETION_WINDOW = "24h"
+TERMINAL_BATCH_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+class OpenAIBatchProvider:
+    """
+    The OpenAI Batch API: the JSONL file is uploaded, a batch is created on it and its output
+    file is downloaded once the batch has finished.
+    """
+
+    def __init__(self, client=None):
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI()
+        self.client = client
+
+    def submit(self, endpoint, path) -> str:
+        with open(path, "rb") as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(input_file_id=uploaded.id, endpoint=endpoint,
+                                           completion_window=BATCH_COMPLETION_WINDOW)
+        return batch.id
+
+    def retrieve(self, batch_id) -> dict:
+        batch = self.client.batches.retrieve(batch_id)
+        return {"status": batch.status, "output_file_id": batch.output_file_id,
+                "error_file_id": batch.error_file_id}
+
+    def download(self, file_id) -> str:
+        return self.client.files.content(file_id).text
+
+class LocalBatchProvider:
+    """
+    Stand-in for the Batch API that answers from simulated_openai, with no network. A batch is
+    run the first time it is polled; batches and output files are kept in 'directory', so a
+    batch submitted by one process can be polled from another.
+    """
+
+    def __init__(self, directory):
+        from simulated_openai import SimulatedOpenAI
+        self.directory = directory
+        self.backend = SimulatedOpenAI(base_latency_ms=0, tokens_per_sec=float("inf"), embedding_latency_ms=0)
+        os.makedirs(directory, exist_ok=True)
+
+    def _batch_path(self, batch_id):
+        return os.path.join(self.directory, f"{batch_id}.json")
+
+    def submit(self, endpoint, path) -> str:
+        batch_id = f"batch_local_{uuid.uuid4().hex[:12]}"
+        with open(self._batch_path(batch_id), "w") as f:
+            json.dump({"endpoint": endpoint, "input_path": os.path.abspath(path), "status": "in_progress"}, f)
+        return batch_id
+
+    def retrieve(self, batch_id) -> dict:
+        with open(self._batch_path(batch_id)) as f:
+            batch = json.load(f)
+        if batch["status"] == "in_progress":
+            batch.update(self._run(batch_id, batch["input_path"]), status="completed")
+            with open(self._batch_path(batch_id), "w") as f:
+                json.dump(batch, f)
+        return {"status": batch["status"], "output_file_id": batch.get("output_file_id"),
+                "error_file_id": batch.get("error_file_id")}
+
+    def _run(self, batch_id, input_path) -> dict:
+        outputs, errors = [], []
+        with open(input_path) as f:
+            for line in f:
+                request = json.loads(line)
+                if request["url"] == "/v1/chat/completions":
+                    body = self.backend.chat_completion(request["body"])
+                elif request["url"] == "/v1/embeddings":
+                    body = self.backend.embeddings(request["body"])
+                else:
+                    errors.append({"custom_id": request["custom_id"], "response": None,
+                                   "error": {"code": "invalid_url", "message": f"Unsupported url {request['url']}"}})
+                    continue
+                outputs.append({"custom_id": request["custom_id"], "error": None,
+                                "response": {"status_code": 200, "body": body}})
+        files = {}
+        for kind, lines in (("output", outputs), ("error", errors)):
+            if lines:
+                file_id = f"{batch_id}-{kind}"
+                with open(os.path.join(self.directory, f"{file_id}.jsonl"), "w") as f:
+                    f.writelines(json.dumps(line) + "\n" for line in lines)
+                files[f"{kind}_file_id"] = file_id
+        return files
+
+    def download(self, file_id) -> str:
+        with open(os.path.join(self.directory, f"{file_id}.jsonl")) as f:
+            return f.read()
+
+def create_batch_provider(setting=None, directory=DEFAULT_BATCH_DIR):
+    """
+    BRAINSTORMER_BATCH_PROVIDER: "openai" (default) or "local".
+    """
+    setting = os.environ.get("BRAINSTORMER_BATCH_PROVIDER", "openai") if setting is None else setting
+    if setting == "openai":
+        return OpenAIBatchProvider()
+    if setting == "local":
+        return LocalBatchProvider(os.path.join(directory, "local_provider"))
+    raise ValueError(f"Unknown BRAINSTORMER_BATCH_PROVIDER: {setting}")
+
+class BatchQueue:
+    """
+    Requests waiting for, or going through, the Batch API. Each request carries an 'action'
+    (a JSON dict whose "type" selects the handler that applies its result). A request moves
+    queued -> submitted -> completed (result downloaded) -> applied, or ends up failed.
+    """
+
+    def __init__(self, directory=DEFAULT_BATCH_DIR):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "files"), exist_ok=True)
+        self.path = os.path.join(directory, "queue.sqlite")
+        self._connection = ThreadLocalConnection(self.path)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS requests ("
+                " custom_id TEXT PRIMARY KEY, endpoint TEXT NOT NULL, body TEXT NOT NULL, action TEXT NOT NULL,"
+                " status TEXT NOT NULL, batch_id TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+                " apply_attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, created_at REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS batches ("
+                " batch_id TEXT PRIMARY KEY, endpoint TEXT NOT NULL, status TEXT NOT NULL,"
+                " request_count INTEGER NOT NULL, submitted_at REAL, finished_at REAL)"
+            )
+
+    def enqueue(self, custom_id, endpoint, body, action) -> bool:
+        """
+        Queues one request; a custom_id that is already known is ignored. Returns True if queued.
+        """
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO requests (custom_id, endpoint, body, action, status, created_at)"
+                " VALUES (?, ?, ?, ?, 'queued', ?)",
+                (custom_id, endpoint, json.dumps(body), json.dumps(action), time.time())
+            )
+        return cursor.rowcount == 1
+
+    def counts(self) -> dict:
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM requests GROUP BY status").fetchall()
+        return dict(rows)
+
+    def open_batches(self) -> list:
+        placeholders = ", ".join("?" * len(TERMINAL_BATCH_STATUSES))
+        rows = self._connection().execute(
+            f"SELECT batch_id FROM batches WHERE status NOT IN ({placeholders})", TERMINAL_BATCH_STATUSES
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def submit(self, provider) -> list:
+        """
+        Writes the queued requests to one JSONL file per endpoint (split at BATCH_MAX_REQUESTS)
+        and submits each file as a batch. Returns the new batch ids.
+        """
+        conn = self._connection()
+        batch_ids = []
+        for (endpoint,) in conn.execute("SELECT DISTINCT endpoint FROM requests WHERE status = 'queued'").fetchall():
+            while True:
+                rows = conn.execute(
+                    "SELECT custom_id, body FROM requests WHERE status = 'queued' AND endpoint = ?"
+                    " ORDER BY created_at LIMIT ?", (endpoint, BATCH_MAX_REQUESTS)
+                ).fetchall()
+                if not rows:
+                    break
+                path = os.path.join(self.directory, "files",
+                                    f"{endpoint.strip('/').replace('/', '-')}-{uuid.uuid4().hex[:12]}.jsonl")
+                with open(path, "w") as f:
+                    for custom_id, body in rows:
+                        f.write(json.dumps({"custom_id": custom_id, "method": "POST", "url": endpoint,
+                                            "body": json.loads(body)}) + "\n")
+                batch_id = provider.submit(endpoint, path)
+                with conn:
+                    conn.execute("INSERT INTO batches (batch_id, endpoint, status, request_count, submitted_at)"
+                                 " VALUES (?, ?, 'submitted', ?, ?)", (batch_id, endpoint, len(rows), time.time()))
+                    conn.executemany(
+                        "UPDATE requests SET status = 'submitted', batch_id = ?, attempts = attempts + 1"
+                        " WHERE custom_id = ?", [(batch_id, custom_id) for custom_id, _ in rows]
+                    )
+                batch_ids.append(batch_id)
+        return batch_ids
+
+    def poll(self, provider, handlers) -> dict:
+        """
+        Checks every open batch, stores the results of the finished ones and applies all
+        results not applied yet. Requests a finished batch left unanswered are queued again,
+        up to BATCH_MAX_ATTEMPTS submissions. Returns the request counts by status.
+        """
+        conn = self._connection()
+        for batch_id in self.open_batches():
+            batch = provider.retrieve(batch_id)
+            if batch["status"] not in TERMINAL_BATCH_STATUSES:
+                with conn:
+                    conn.execute("UPDATE batches SET status = ? WHERE batch_id = ?", (batch["status"], batch_id))
+                continue
+            results, errors = [], []
+            for file_id in filter(None, (batch["output_file_id"], batch["error_file_id"])):
+                for line in provider.download(file_id).splitlines():
+                    if not line.strip():
+                        continue
+                    item = json.loads(line)
+                    response = item.get("response") or {}
+                    if response.get("status_code") == 200:
+                        results.append((json.dumps(response["body"]), item["custom_id"], batch_id))
+                    else:
+                        error = item.get("error") or response.get("body", {}).get("error") or response
+                        errors.append((json.dumps(error), item["custom_id"], batch_id))
+            with conn:
+                conn.executemany("UPDATE requests SET status = 'completed', result = ?"
+                                 " WHERE custom_id = ? AND batch_id = ? AND status = 'submitted'", results)
+                conn.executemany("UPDATE requests SET status = 'failed', error = ?"
+                                 " WHERE custom_id = ? AND batch_id = ? AND status = 'submitted'", errors)
+                conn.execute("UPDATE requests SET status = 'failed', error = ? WHERE batch_id = ?"
+                             " AND status = 'submitted' AND attempts >= ?",
+                             (f"unanswered by batch {batch_id} ({batch['status']})", batch_id, BATCH_MAX_ATTEMPTS))
+                conn.execute("UPDATE requests SET status = 'queued', batch_id = NULL"
+                             " WHERE batch_id = ? AND status = 'submitted'", (batch_id,))
+                conn.execute("UPDATE batches SET status = ?, finished_at = ? WHERE batch_id = ?",
+                             (batch["status"], time.time(), batch_id))
+        self.apply(handlers)
+        return self.counts()
+
+    def apply(self, handlers):
+        """
+        Applies every downloaded result: handlers[action["type"]](queue, custom_id, action, request, response).
+        Handlers may queue follow-up requests. A handler that raises is recorded and its result is
+        retried on the next apply; after BATCH_MAX_APPLY_ATTEMPTS failures the request is marked failed.
+        The other results are applied either way. Returns the number of results that failed to apply.
+        """
+        conn = self._connection()
+        rows = conn.execute("SELECT custom_id, body, action, result FROM requests WHERE status = 'completed'"
+                            " ORDER BY created_at").fetchall()
+        failures = 0
+        for custom_id, body, action, result in rows:
+            action = json.loads(action)
+            try:
+                handlers[action["type"]](self, custom_id, action, json.loads(body), json.loads(result))
+            except Exception as e:
+                failures += 1
+                print(f"Applying batch result {custom_id} failed: {type(e).__name__}: {e}")
+                with conn:
+                    conn.execute(
+                        "UPDATE requests SET apply_attempts = apply_attempts + 1, error = ?,"
+                        " status = CASE WHEN apply_attempts + 1 >= ? THEN 'failed' ELSE status END"
+                        " WHERE custom_id = ?", (f"{type(e).__name__}: {e}", BATCH_MAX_APPLY_ATTEMPTS, custom_id)
+                    )
+                continue
+            with conn:
+                conn.execute("UPDATE requests SET status = 'applied', error = NULL WHERE custom_id = ?", (custom_id,))
+        return failures
+
+    def drain(self, provider, handlers, interval_s=30.0, timeout_s=None) -> dict:
+        """
+        Submits, polls and applies until nothing is left in flight (follow-up requests included).
+        """
+        deadline = time.time() + timeout_s if timeout_s is not None else None
+        while True:
+            self.submit(provider)
+            counts = self.poll(provider, handlers)
+            if not any(counts.get(status) for status in ("queued", "submitted", "completed")):
+                return counts
+            if deadline is not None and time.time() > deadline:
+                return counts
+            time.sleep(interval_s if counts.get("submitted") else 0)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Submit and apply Batch API jobs for bulk, latency-tolerant work.")
+    parser.add_argument("command", choices=["submit", "poll", "status", "reindex-personas"])
+    parser.add_argument("--dir", default=DEFAULT_BATCH_DIR, help="Batch queue directory")
+    parser.add_argument("--provider", default=None, help="openai or local (default: BRAINSTORMER_BATCH_PROVIDER)")
+    parser.add_argument("--wait", action="store_true", help="With poll: keep submitting and polling until done")
+    parser.add_argument("--interval", type=float, default=30.0, help="Seconds between polls with --wait")
+    args = parser.parse_args()
+
+    queue = BatchQueue(args.dir)
+    if args.command == "status":
+        print(f"Requests: {queue.counts()}  open batches: {len(queue.open_batches())}")
+    elif args.command == "reindex-personas":
+        import app
+        print(f"Queued {app.enqueue_persona_reindex(queue)} persona re-indexing request(s).")
+    else:
+        import app
+        provider = create_batch_provider(args.provider, args.dir)
+        if args.command == "submit":
+            print(f"Submitted batches: {queue.submit(provider) or 'none'}")
+        elif args.wait:
+            print(f"Requests: {queue.drain(provider, app.BATCH_HANDLERS, interval_s=args.interval)}")
+        else:
+            print(f"Requests: {queue.poll(provider, app.BATCH_HANDLERS)}")
@@ -0,0 +1,278 @@
+# Headless batch mode: runs many ideas concurrently in a bounded process pool.
+#
+# Input is JSONL, one idea per line, e.g.
+#   {"id": "farm-cv", "idea": "Crop disease detection app", "selection": "auto"}
+#   {"id": "ar-shop", "idea": "AR furniture try-on", "selection": "names", "personas": ["Joy", "Lucas"]}
+#   {"idea": "Carbon tracking for suppliers", "selection": "semantic", "persona_query": "sustainability"}
+# Any field left out falls back to the command-line defaults.
+#
+# Each idea writes <output>/<id>/transcript.jsonl, proposal.md, metrics.json and session.log.
+# Ideas whose metrics.json reports status "ok" are skipped on the next run, so a crashed or
+# interrupted batch can simply be started again; failures are recorded in error.json.
+# Sessions are checkpointed in <output>/<id>/checkpoints, and a failed idea resumes from its
+# last completed turn instead of starting over.
+#
+#   python batch_runner.py ideas.jsonl --output batch_output --workers 4 --max-concurrent 8 --rpm 300
+#
+# With --chroma-server, a local Chroma server is started on the Chroma directory and every worker
+# connects to it over HTTP, so the indexes are loaded once instead of once per worker. Embedded
+# Chroma is not safe across processes, so with more than one worker the server is started even
+# without the flag (unless BRAINSTORMER_CHROMA_MODE=http already points at one).
+#
+# With --batch-api, the sessions' learned summaries and archive embeddings are queued in
+# <output>/batch_jobs and submitted to the Batch API once all ideas ran, instead of being made
+# as interactive calls; apply the results later with
+#   python batch_jobs.py --dir <output>/batch_jobs poll --wait
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from batch_jobs import BatchQueue, create_batch_provider
+from chroma_backend import DEFAULT_CHROMA_PORT, chroma_settings, start_local_server, use_server
+from embedding_store import EmbeddingStore
+from governor import RateGovernor
+
+JOB_DEFAULT_FIELDS = ("selection", "persona_query", "num_personas", "total_turns_each", "k",
+                      "convergence_policy", "store_learned", "budget")
+
+def load_jobs(path, defaults) -> list:
+    jobs = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            job = json.loads(line)
+            if not job.get("idea"):
+                raise ValueError(f"{path}:{line_number}: every line needs an 'idea'")
+            job.setdefault("id", f"idea-{line_number:05d}")
+            job["id"] = re.sub(r"[^A-Za-z0-9_.-]+", "-", str(job["id"]))
+            for field in JOB_DEFAULT_FIELDS:
+                job.setdefault(field, defaults[field])
+            jobs.append(job)
+    return jobs
+
+def is_done(job_dir) -> bool:
+    metrics_path = os.path.join(job_dir, "metrics.json")
+    if not os.path.exists(metrics_path):
+        return False
+    try:
+        with open(metrics_path) as f:
+            return json.load(f).get("status") == "ok"
+    except (OSError, ValueError):
+        return False
+
+def write_atomic(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def _init_worker(governor, embedding_store_path, batch_dir):
+    """
+    Runs once per worker process: installs the shared governor, embedding cache and batch queue.
+    """
+    import app
+    from instrumentation import TRACER
+    TRACER.enabled = True  # per-session token and latency metrics
+    app.configure_shared_resources(
+        governor=governor,
+        embedding_store=EmbeddingStore(embedding_store_path) if embedding_store_path else None,
+        batch_queue=BatchQueue(batch_dir) if batch_dir else None,
+    )
+
+def run_job(job, output_dir) -> dict:
+    """
+    Runs one idea in the current worker process and writes its outputs. Never raises:
+    failures are written to error.json and reported in the returned status.
+    """
+    import app
+    from checkpoint import list_checkpoints
+    from instrumentation import TRACER
+
+    job_dir = os.path.join(output_dir, job["id"])
+    checkpoint_dir = os.path.join(job_dir, "checkpoints")
+    unfinished = [s for s in list_checkpoints(checkpoint_dir) if s.get("phase") != "complete"]
+    os.makedirs(job_dir, exist_ok=True)
+    error_path = os.path.join(job_dir, "error.json")
+
+    TRACER.reset()
+    start = time.time()
+    try:
+        with open(os.path.join(job_dir, "session.log"), "a") as log, contextlib.redirect_stdout(log):
+            if unfinished:
+                result = app.resume_session(unfinished[0]["session_id"], checkpoint_dir,
+                                            store_learned=job["store_learned"])
+            else:
+                result = app.run_session(
+                    job["idea"],
+                    selection=job["selection"],
+                    persona_names=job.get("personas"),
+                    persona_query=job.get("persona_query"),
+                    num_personas=job["num_personas"],
+                    total_turns_each=job["total_turns_each"],
+                    k=job["k"],
+                    convergence_policy=job["convergence_policy"],
+                    store_learned=job["store_learned"],
+                    checkpoint_dir=checkpoint_dir,
+                    budget=job["budget"],
+                )
+    except Exception as e:
+        write_atomic(error_path, json.dumps({
+            "id": job["id"],
+            "error": f"{type(e).__name__}: {e}",
+            "traceback": traceback.format_exc(),
+            "elapsed_s": time.time() - start,
+        }, indent=2))
+        return {"id": job["id"], "status": "error", "error": f"{type(e).__name__}: {e}"}
+
+    turns = result["turn_log"]
+    write_atomic(
+        os.path.join(job_dir, "transcript.jsonl"),
+        "".join(
+            json.dumps({"turn": turn.index + 1, "round": turn.round + 1, "persona": persona, "message": message}) + "\n"
+            for turn, persona, message in turns
+        )
+    )
+    write_atomic(
+        os.path.join(job_dir, "proposal.md"),
+        f"# {job['idea']}\n\n"
+        f"_Session {result['session_id']} with {', '.join(result['personas'])}_\n\n"
+        f"{result['proposal']}\n"
+    )
+
+    stats = result["session"].prompt_cache_stats
+    metrics = {
+        "id": job["id"],
+        "status": "ok",
+        "session_id": result["session_id"],
+        "personas": result["personas"],
+        "turns": len(turns),
+        "elapsed_s": time.time() - start,
+        "prompt_tokens": TRACER.counters.get("tokens.prompt", 0),
+        "completion_tokens": TRACER.counters.get("tokens.completion", 0),
+        "cached_tokens": stats.cached_tokens,
+        "budget": result["budget"],
+        "api_calls": {name[len("calls."):]: count for name, count in TRACER.counters.items()
+                      if name.startswith("calls.openai.")},
+    }
+    # metrics.json is written last: its presence with status "ok" marks the idea as done
+    write_atomic(os.path.join(job_dir, "metrics.json"), json.dumps(metrics, indent=2))
+    if os.path.exists(error_path):
+        os.remove(error_path)
+    return {"id": job["id"], "status": "ok", "turns": len(turns), "elapsed_s": metrics["elapsed_s"]}
+
+def run_batch(jobs, output_dir, workers=4, max_concurrent=8, requests_per_minute=None,
+              embedding_store_path=None, batch_dir=None) -> list:
+    if workers > 1 and chroma_settings()["mode"] == "embedded":
+        # Each process would keep its own HNSW index over the same files and lose vectors on write
+        raise ValueError("Several workers cannot share embedded Chroma; point them at a Chroma server "
+                         "(use_server() or BRAINSTORMER_CHROMA_MODE=http) or use workers=1.")
+    os.makedirs(output_dir, exist_ok=True)
+    pending = [job for job in jobs if not is_done(os.path.join(output_dir, job["id"]))]
+    skipped = len(jobs) - len(pending)
+    if skipped:
+        print(f"Skipping {skipped} idea(s) already completed in {output_dir}.")
+    if not pending:
+        return []
+
+    if embedding_store_path:
+        EmbeddingStore(embedding_store_path)  # create the table before workers race to do it
+    if batch_dir:
+        BatchQueue(batch_dir)
+
+    statuses = []
+    with multiprocessing.Manager() as manager:
+        governor = RateGovernor.shared(manager, max_concurrent=max_concurrent,
+                                       requests_per_minute=requests_per_minute)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(governor, embedding_store_path, batch_dir)) as pool:
+            futures = {pool.submit(run_job, job, output_dir): job for job in pending}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    status = future.result()
+                except Exception as e:
+                    # The worker process itself died; the idea stays pending for the next run
+                    status = {"id": job["id"], "status": "error", "error": f"worker crashed: {e}"}
+                statuses.append(status)
+                print(f"[{len(statuses)}/{len(pending)}] {status['id']}: {status['status']}"
+                      + (f" ({status['error']})" if status["status"] == "error" else ""))
+
+    with open(os.path.join(output_dir, "batch_results.jsonl"), "a") as f:
+        for status in statuses:
+            f.write(json.dumps(status) + "\n")
+    return statuses
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run brainstorming sessions for many ideas without prompts.")
+    parser.add_argument("ideas", help="JSONL file with one idea per line")
+    parser.add_argument("--output", default="batch_output")
+    parser.add_argument("--workers", type=int, default=4, help="Sessions run in parallel")
+    parser.add_argument("--max-concurrent", type=int, default=8, help="API calls in flight across all workers")
+    parser.add_argument("--rpm", type=float, default=None, help="API requests per minute across all workers")
+    parser.add_argument("--embedding-cache", default="embedding_cache.sqlite",
+                        help="SQLite embedding cache shared by all workers ('' to disable)")
+    parser.add_argument("--selection", choices=["auto", "local", "manager", "semantic", "names"], default="auto")
+    parser.add_argument("--persona-query", default=None)
+    parser.add_argument("--num-personas", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=10, help="Maximum turns per persona")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--convergence-policy", default="balanced")
+    parser.add_argument("--no-learn", action="store_true", help="Skip storing learned persona summaries")
+    parser.add_argument("--chroma-server", nargs="?", type=int, const=DEFAULT_CHROMA_PORT, metavar="PORT",
+                        help="Share one local Chroma server between the workers instead of embedded Chroma "
+                             "(the default whenever --workers is above 1)")
+    parser.add_argument("--max-tokens", type=int, default=None, help="Token budget per idea")
+    parser.add_argument("--max-cost", type=float, default=None, help="Cost budget per idea, in USD")
+    parser.add_argument("--max-minutes", type=float, default=None, help="Wall-time budget per idea")
+    parser.add_argument("--batch-api", action="store_true",
+                        help="Defer learned summaries and archive embeddings to the Batch API")
+    args = parser.parse_args()
+
+    defaults = {
+        "selection": args.selection,
+        "persona_query": args.persona_query,
+        "num_personas": args.num_personas,
+        "total_turns_each": args.turns,
+        "k": args.k,
+        "convergence_policy": args.convergence_policy,
+        "store_learned": not args.no_learn,
+        "budget": {
+            "max_tokens": args.max_tokens,
+            "max_cost_usd": args.max_cost,
+            "max_wall_s": args.max_minutes * 60 if args.max_minutes else None,
+        },
+    }
+    jobs = load_jobs(args.ideas, defaults)
+    batch_dir = os.path.join(args.output, "batch_jobs") if args.batch_api else None
+    if args.chroma_server is None and args.workers > 1 and chroma_settings()["mode"] == "embedded":
+        print(f"Starting a local Chroma server on port {DEFAULT_CHROMA_PORT} for the {args.workers} workers "
+              "(embedded Chroma is not safe across processes).")
+        args.chroma_server = DEFAULT_CHROMA_PORT
+    chroma_server = None
+    if args.chroma_server:
+        # Workers inherit the environment, so they all connect to this server
+        chroma_server = start_local_server(chroma_settings()["path"], port=args.chroma_server)
+        use_server(port=args.chroma_server)
+    try:
+        statuses = run_batch(jobs, args.output, workers=args.workers, max_concurrent=args.max_concurrent,
+                             requests_per_minute=args.rpm, embedding_store_path=args.embedding_cache or None,
+                             batch_dir=batch_dir)
+        if batch_dir:
+            batch_ids = BatchQueue(batch_dir).submit(create_batch_provider(directory=batch_dir))
+            print(f"Submitted {len(batch_ids)} batch(es); apply them with "
+                  f"python batch_jobs.py --dir {batch_dir} poll --wait")
+    finally:
+        if chroma_server is not None:
+            chroma_server.terminate()
+            chroma_server.wait()
+    failed = [s for s in statuses if s["status"] != "ok"]
+    print(f"\nDone: {len(statuses) - len(failed)} succeeded, {len(failed)} failed. Results in {args.output}/")
+    sys.exit(1 if failed else 0)
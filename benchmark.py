@@ -0,0 +1,270 @@
+# End-to-end benchmark suite.
+#
+# Drives the real app.py flow (persona initialization, every selection mode, the brainstorming
+# loop at several persona/turn counts, synthesis and archive search) against the simulated OpenAI
+# backend in simulated_openai.py and a temporary Chroma directory. Every scenario runs in its own
+# child process so module-level state and peak RSS are measured in isolation.
+#
+#   python benchmark.py                          # run all scenarios and print a report
+#   python benchmark.py --save-baseline          # ...and store the results as the new baseline
+#   python benchmark.py --compare                # ...and fail if anything regressed vs. the baseline
+#   python benchmark.py --chroma-server          # run every scenario against a local Chroma server
+import argparse
+import builtins
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from chroma_backend import start_local_server, use_server
+from simulated_openai import SimulatedOpenAI, start_server
+
+DEFAULT_BASELINE_PATH = "benchmark_baseline.json"
+BENCH_IDEA = "A subscription app that uses computer vision to help small farms detect crop disease early."
+
+def scenario_names(persona_counts, turn_counts) -> list:
+    names = ["persona_init", "selection_list", "selection_semantic", "selection_local", "selection_manager"]
+    for personas in persona_counts:
+        for turns in turn_counts:
+            names.append(f"brainstorm_p{personas}_t{turns}")
+    names += ["synthesis", "archive_search"]
+    return names
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def scripted_input(answers):
+    """
+    Replaces input() so the interactive selection functions can run unattended.
+    """
+    answers = iter(answers)
+    return lambda prompt="": next(answers)
+
+def run_scenario(name: str) -> dict:
+    """
+    Runs one scenario inside a child process (environment already points at the simulator)
+    and returns its metrics.
+    """
+    import app
+    from instrumentation import TRACER, percentile
+
+    app.initialize_persona_collection()
+    session = app.create_new_conversation_collection()
+    persona_names = [p["name"] for p in app.PERSONA_LIBRARY]
+    turns = 0
+
+    # Work that a scenario depends on but should not be measured
+    if name == "synthesis":
+        turn_log = app.run_brainstorming_with_reasoning(
+            session, persona_names[:3], BENCH_IDEA, total_turns_each=2, convergence_policy="off"
+        )
+    elif name == "selection_local":
+        app.get_persona_field_index()  # built by warm_up() in the interactive app
+    elif name == "archive_search":
+        for i in range(30):
+            app.store_archive_message(session, persona_names[i % len(persona_names)], f"{BENCH_IDEA} archived note {i}")
+
+    if name != "persona_init":
+        TRACER.reset()
+    start = time.perf_counter()
+
+    if name == "persona_init":
+        pass  # already measured above, from an empty Chroma directory
+    elif name == "selection_list":
+        builtins.input = scripted_input(["1,2,3"])
+        app.select_personas_by_list()
+    elif name == "selection_semantic":
+        builtins.input = scripted_input(["Someone who understands farming and computer vision", "1,2,3"])
+        app.select_personas_by_semantic_search()
+    elif name == "selection_local":
+        app.select_personas_locally(BENCH_IDEA)
+    elif name == "selection_manager":
+        app.manager_agent_decide_personas(BENCH_IDEA)
+    elif name.startswith("brainstorm_"):
+        _, personas_part, turns_part = name.split("_")
+        num_personas, turns_each = int(personas_part[1:]), int(turns_part[1:])
+        turn_log = app.run_brainstorming_with_reasoning(
+            session, persona_names[:num_personas], BENCH_IDEA, total_turns_each=turns_each, convergence_policy="off"
+        )
+        turns = len(turn_log)
+    elif name == "synthesis":
+        app.synthesize_final_output(turn_log, BENCH_IDEA, session=session)
+    elif name == "archive_search":
+        app.search_previous_sessions("crop disease detection")
+    else:
+        raise ValueError(f"Unknown scenario: {name}")
+
+    wall_s = time.perf_counter() - start
+    if name == "persona_init":
+        wall_s = sum(TRACER.histograms.get("stage.persona_init", [0.0])) / 1000
+
+    stages = {}
+    for stage, values in TRACER.histograms.items():
+        values = sorted(values)
+        stages[stage] = {
+            "count": len(values),
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99),
+        }
+
+    return {
+        "scenario": name,
+        "wall_s": wall_s,
+        "turns": turns,
+        "turns_per_sec": turns / wall_s if turns and wall_s else None,
+        "prompt_tokens": TRACER.counters.get("tokens.prompt", 0),
+        "completion_tokens": TRACER.counters.get("tokens.completion", 0),
+        "cached_tokens": TRACER.counters.get("tokens.cached", 0),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stages,
+    }
+
+def run_all(args) -> list:
+    backend = SimulatedOpenAI(
+        base_latency_ms=args.latency_ms,
+        tokens_per_sec=args.tokens_per_sec,
+        embedding_latency_ms=args.embedding_latency_ms,
+        response_tokens=args.response_tokens,
+    )
+    server, base_url = start_server(backend)
+    results = []
+    try:
+        for name in scenario_names(args.personas, args.turns):
+            chroma_dir = tempfile.mkdtemp(prefix="brainstormer-bench-")
+            env = dict(
+                os.environ,
+                OPENAI_BASE_URL=base_url,
+                OPENAI_API_KEY="sk-simulated",
+                BRAINSTORMER_CHROMA_PATH=chroma_dir,
+                BRAINSTORMER_PERSONA_DB=os.path.join(chroma_dir, "personas.sqlite"),
+                BRAINSTORMER_ESSENCE_DB=os.path.join(chroma_dir, "persona_essences.sqlite"),
+                BRAINSTORMER_TRACE="1",
+            )
+            env.pop("BRAINSTORMER_TRACE_FILE", None)
+            chroma_server = None
+            try:
+                if args.chroma_server:
+                    chroma_server = start_local_server(chroma_dir, port=args.chroma_port)
+                    use_server(port=args.chroma_port, env=env)
+                print(f"Running {name}...", flush=True)
+                child = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--scenario", name],
+                    env=env, capture_output=True, text=True, check=True,
+                )
+                # The child prints app output first; the metrics are the last line
+                results.append(json.loads(child.stdout.strip().splitlines()[-1]))
+            except subprocess.CalledProcessError as e:
+                print(f"Scenario {name} failed:\n{e.stderr}")
+                results.append({"scenario": name, "error": e.stderr.strip().splitlines()[-1:]})
+            finally:
+                if chroma_server is not None:
+                    chroma_server.terminate()
+                    chroma_server.wait()
+                shutil.rmtree(chroma_dir, ignore_errors=True)
+    finally:
+        server.shutdown()
+    return results
+
+def format_report(results) -> str:
+    header = (f"{'scenario':<24}{'wall s':>9}{'turns/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'tokens':>9}{'rss MB':>9}")
+    lines = [header, "-" * len(header)]
+    for r in results:
+        if "error" in r:
+            lines.append(f"{r['scenario']:<24}  FAILED: {r['error']}")
+            continue
+        # Headline latency is the top-level stage of each scenario
+        stage = top_level_stage(r)
+        turns_per_sec = f"{r['turns_per_sec']:.2f}" if r["turns_per_sec"] else "-"
+        lines.append(
+            f"{r['scenario']:<24}{r['wall_s']:>9.2f}{turns_per_sec:>9}"
+            f"{stage.get('p50_ms', 0):>9.1f}{stage.get('p95_ms', 0):>9.1f}{stage.get('p99_ms', 0):>9.1f}"
+            f"{r['prompt_tokens'] + r['completion_tokens']:>9}{r['peak_rss_mb']:>9.1f}"
+        )
+    return "\n".join(lines)
+
+def top_level_stage(result) -> dict:
+    stages = result.get("stages", {})
+    for candidate in ("stage.turn", "stage.synthesis", "stage.persona_init",
+                      "stage.selection.semantic", "stage.selection.manager", "chroma.query"):
+        if candidate in stages:
+            return stages[candidate]
+    return {}
+
+def compare_to_baseline(results, baseline, tolerance) -> list:
+    """
+    Returns a list of regression messages: wall time, p95 of the headline stage or token volume
+    more than 'tolerance' (fractional) above the baseline.
+    """
+    previous = {r["scenario"]: r for r in baseline.get("results", []) if "error" not in r}
+    regressions = []
+    for r in results:
+        if "error" in r:
+            regressions.append(f"{r['scenario']}: failed")
+            continue
+        base = previous.get(r["scenario"])
+        if not base:
+            continue
+        checks = {
+            "wall_s": (r["wall_s"], base["wall_s"]),
+            "p95_ms": (top_level_stage(r).get("p95_ms", 0), top_level_stage(base).get("p95_ms", 0)),
+            "tokens": (r["prompt_tokens"] + r["completion_tokens"],
+                       base["prompt_tokens"] + base["completion_tokens"]),
+        }
+        for metric, (current, reference) in checks.items():
+            if reference and current > reference * (1 + tolerance):
+                regressions.append(
+                    f"{r['scenario']}: {metric} {current:.2f} vs baseline {reference:.2f} "
+                    f"(+{(current / reference - 1):.0%})"
+                )
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmarks for the brainstormer.")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)  # internal: run one scenario in this process
+    parser.add_argument("--personas", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--turns", type=int, nargs="+", default=[2, 5])
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Simulated per-request latency")
+    parser.add_argument("--tokens-per-sec", type=float, default=500.0, help="Simulated generation throughput")
+    parser.add_argument("--embedding-latency-ms", type=float, default=10.0)
+    parser.add_argument("--response-tokens", type=int, default=150)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true", help="Exit non-zero on regressions vs. the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed fractional slowdown")
+    parser.add_argument("--chroma-server", action="store_true",
+                        help="Use a local Chroma server (HttpClient) instead of embedded Chroma")
+    parser.add_argument("--chroma-port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(run_scenario(args.scenario)))
+        sys.exit(0)
+
+    results = run_all(args)
+    print("\n=== BENCHMARK RESULTS ===")
+    print(format_report(results))
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline first.")
+            sys.exit(1)
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
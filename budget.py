@@ -0,0 +1,169 @@
+import threading
+import time
+
+# USD per million tokens: (input, cached input, output). Models not listed are priced as gpt-4o.
+MODEL_PRICING = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4": (30.00, 30.00, 60.00),
+    "text-embedding-3-small": (0.02, 0.02, 0.0),
+}
+
+# Degradation steps, in the order they switch on, with the share of the budget used at which
+# they do. The last 15% is left for the final synthesis and the end-of-session steps.
+# skip_critique:   no reasoning-agent critique before each turn
+# shrink_context:  retrieve fewer conversation snippets per turn
+# cheap_auxiliary: critique, gap checks, gap personas and learned summaries use CHEAP_MODEL
+# end_rounds:      stop the brainstorm at the next turn and add no more gap personas
+DEGRADATION_STEPS = (
+    ("skip_critique", 0.50),
+    ("shrink_context", 0.60),
+    ("cheap_auxiliary", 0.70),
+    ("end_rounds", 0.85),
+)
+CHEAP_MODEL = "gpt-4o-mini"
+AUXILIARY_PURPOSES = {"critique", "gap_monitor", "gap_persona", "learned_summary", "consolidation"}
+DEFAULT_MAX_ADDED_PERSONAS = 2
+
+def usage_cost(model, usage) -> float:
+    """
+    Cost in USD of one response's 'usage', at MODEL_PRICING rates.
+    """
+    if usage is None:
+        return 0.0
+    input_rate, cached_rate, output_rate = MODEL_PRICING.get(model, MODEL_PRICING["gpt-4o"])
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    return ((prompt_tokens - cached_tokens) * input_rate + cached_tokens * cached_rate
+            + completion_tokens * output_rate) / 1_000_000
+
+class SessionBudget:
+    """
+    Per-session ceilings on tokens, cost (USD) and wall time, enforced by degrading the session
+    step by step (DEGRADATION_STEPS) as the most-used of the three runs out. Tracks the tokens
+    reported in every response and what they were spent on. A limit left as None is unbounded;
+    with no limits at all the budget only tracks and reports.
+    """
+
+    def __init__(self, max_tokens=None, max_cost_usd=None, max_wall_s=None,
+                 max_added_personas=DEFAULT_MAX_ADDED_PERSONAS, cheap_model=CHEAP_MODEL):
+        self.max_tokens = max_tokens
+        self.max_cost_usd = max_cost_usd
+        self.max_wall_s = max_wall_s
+        self.max_added_personas = max_added_personas
+        self.cheap_model = cheap_model
+        self.tokens = 0
+        self.cost_usd = 0.0
+        self.spent = {}       # purpose -> {"calls", "tokens", "cost_usd"}
+        self.activated = {}   # step -> {"used", "tokens", "elapsed_s"} when it switched on
+        self.started_at = None
+        self._elapsed_before = 0.0  # wall time spent before a resume
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.started_at is None:
+            self.started_at = time.time()
+
+    @property
+    def elapsed_s(self) -> float:
+        return self._elapsed_before + (time.time() - self.started_at if self.started_at is not None else 0.0)
+
+    def record(self, model, usage, purpose="chat"):
+        if usage is None:
+            return
+        tokens = getattr(usage, "total_tokens", None) or (
+            (getattr(usage, "prompt_tokens", 0) or 0) + (getattr(usage, "completion_tokens", 0) or 0))
+        cost = usage_cost(model, usage)
+        with self._lock:
+            self.tokens += tokens
+            self.cost_usd += cost
+            entry = self.spent.setdefault(purpose, {"calls": 0, "tokens": 0, "cost_usd": 0.0})
+            entry["calls"] += 1
+            entry["tokens"] += tokens
+            entry["cost_usd"] += cost
+
+    def used(self) -> float:
+        """
+        Share of the budget used so far: the highest of tokens, cost and wall time against their limits.
+        """
+        shares = [0.0]
+        if self.max_tokens:
+            shares.append(self.tokens / self.max_tokens)
+        if self.max_cost_usd:
+            shares.append(self.cost_usd / self.max_cost_usd)
+        if self.max_wall_s:
+            shares.append(self.elapsed_s / self.max_wall_s)
+        return max(shares)
+
+    @property
+    def exhausted(self) -> bool:
+        return self.used() >= 1.0
+
+    def degraded(self, step) -> bool:
+        """
+        True once 'step' (a name from DEGRADATION_STEPS) is in force. Steps never switch back off.
+        """
+        if step in self.activated:
+            return True
+        threshold = dict(DEGRADATION_STEPS)[step]
+        used = self.used()
+        if used < threshold:
+            return False
+        with self._lock:
+            self.activated.setdefault(step, {"used": round(used, 3), "tokens": self.tokens,
+                                             "elapsed_s": round(self.elapsed_s, 1)})
+        return True
+
+    def model_for(self, model, purpose) -> str:
+        if purpose in AUXILIARY_PURPOSES and self.degraded("cheap_auxiliary"):
+            return self.cheap_model
+        return model
+
+    def context_k(self, k) -> int:
+        return max(1, k // 2) if self.degraded("shrink_context") else k
+
+    def allows_new_persona(self, added_so_far) -> bool:
+        if self.max_added_personas is not None and added_so_far >= self.max_added_personas:
+            return False
+        return not self.degraded("end_rounds")
+
+    def summary(self) -> dict:
+        return {
+            "limits": {"max_tokens": self.max_tokens, "max_cost_usd": self.max_cost_usd,
+                       "max_wall_s": self.max_wall_s, "max_added_personas": self.max_added_personas},
+            "tokens": self.tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "elapsed_s": round(self.elapsed_s, 1),
+            "used": round(self.used(), 3),
+            "spent": {purpose: {**entry, "cost_usd": round(entry["cost_usd"], 6)}
+                      for purpose, entry in self.spent.items()},
+            "degradation": dict(self.activated),
+        }
+
+    def report(self) -> str:
+        lines = [f"Budget: {self.tokens} tokens, ${self.cost_usd:.4f}, {self.elapsed_s:.0f}s"
+                 + (f" ({self.used():.0%} of the session budget)" if self.used() else "")]
+        for purpose, entry in sorted(self.spent.items(), key=lambda item: -item[1]["cost_usd"]):
+            lines.append(f"  {purpose:<16} {entry['calls']:>4} calls {entry['tokens']:>9} tokens  ${entry['cost_usd']:.4f}")
+        for step, at in self.activated.items():
+            lines.append(f"  {step} from {at['used']:.0%} of the budget ({at['tokens']} tokens, {at['elapsed_s']}s)")
+        return "\n".join(lines)
+
+    def to_state(self) -> dict:
+        """
+        JSON-serializable form, for checkpoints.
+        """
+        return {**self.summary(), "cheap_model": self.cheap_model,
+                "spent": self.spent, "cost_usd": self.cost_usd, "elapsed_s": self.elapsed_s}
+
+    @classmethod
+    def from_state(cls, state):
+        budget = cls(cheap_model=state.get("cheap_model", CHEAP_MODEL), **state["limits"])
+        budget.tokens = state["tokens"]
+        budget.cost_usd = state["cost_usd"]
+        budget.spent = {purpose: dict(entry) for purpose, entry in state["spent"].items()}
+        budget.activated = dict(state["degradation"])
+        budget._elapsed_before = state["elapsed_s"]
+        return budget
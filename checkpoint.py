@@ -0,0 +1,88 @@
+import glob
+import json
+import os
+import time
+from turn_log import TurnLog
+
+DEFAULT_CHECKPOINT_DIR = os.environ.get("BRAINSTORMER_CHECKPOINT_DIR", "./checkpoints")
+
+class SessionCheckpoint:
+    """
+    Durable per-session state, rewritten atomically after every completed turn.
+
+    The file holds the session id, the idea and run configuration, the current persona list
+    (including personas added by the gap monitor), the turn log so far, how many rounds have
+    been closed by the gap monitor, the gap domains personas were already created for, and the
+    results of the end-of-session steps once they exist.
+    """
+
+    def __init__(self, session_id, checkpoint_dir=DEFAULT_CHECKPOINT_DIR, state=None):
+        self.session_id = session_id
+        self.checkpoint_dir = checkpoint_dir
+        self.path = os.path.join(checkpoint_dir, f"{session_id}.json")
+        self.state = state if state is not None else {
+            "session_id": session_id,
+            "phase": "brainstorming",  # brainstorming -> synthesized -> complete
+            "idea": None,
+            "config": {},
+            "persona_names": [],
+            "turn_log": TurnLog().to_state(),
+            "rounds_done": 0,          # rounds whose end-of-round checks have run
+            "gap_domains": [],         # GapPersonaCreator.handled_domains()
+            "next_turn_index": 0,
+            "proposal": None,
+            "learned_done": [],
+            "archived": False,
+        }
+
+    @classmethod
+    def load(cls, session_id, checkpoint_dir=DEFAULT_CHECKPOINT_DIR):
+        path = os.path.join(checkpoint_dir, f"{session_id}.json")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No checkpoint for session '{session_id}' in {checkpoint_dir}")
+        with open(path) as f:
+            state = json.load(f)
+        return cls(session_id, checkpoint_dir, state=state)
+
+    def save(self):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        self.state["updated_at"] = time.time()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def start(self, idea, persona_names, config):
+        self.state.update(idea=idea, persona_names=list(persona_names), config=dict(config))
+        self.state["turn_log"] = TurnLog(persona_names).to_state()
+        self.save()
+
+    def record_turn(self, turn_index, turn_log, persona_names, budget=None):
+        """
+        Marks turn 'turn_index' as completed. Called after the message is stored in Chroma.
+        """
+        self.state["turn_log"] = turn_log.to_state()
+        if budget is not None:
+            self.state["budget"] = budget.to_state()
+        self.state["persona_names"] = list(persona_names)
+        self.state["next_turn_index"] = turn_index + 1
+        self.save()
+
+    def update(self, **fields):
+        self.state.update(fields)
+        self.save()
+
+def list_checkpoints(checkpoint_dir=DEFAULT_CHECKPOINT_DIR) -> list:
+    """
+    Returns checkpoint states, most recently updated first.
+    """
+    states = []
+    for path in glob.glob(os.path.join(checkpoint_dir, "*.json")):
+        try:
+            with open(path) as f:
+                states.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(states, key=lambda s: s.get("updated_at", 0), reverse=True)
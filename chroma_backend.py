@@ -0,0 +1,158 @@
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+import httpx
+from instrumentation import TRACER
+
+# Storage backend, read when the client is created:
+#   BRAINSTORMER_CHROMA_MODE=embedded  PersistentClient on BRAINSTORMER_CHROMA_PATH (default ./chroma_db)
+#   BRAINSTORMER_CHROMA_MODE=http      HttpClient to BRAINSTORMER_CHROMA_HOST:BRAINSTORMER_CHROMA_PORT,
+#                                      so every worker process shares the server's single in-memory index
+DEFAULT_CHROMA_PATH = "./chroma_db"
+DEFAULT_CHROMA_PORT = 8000
+CHROMA_TIMEOUT_S = float(os.environ.get("BRAINSTORMER_CHROMA_TIMEOUT", "30"))
+
+PINNED_CHROMADB = "0.6.2"  # see _pool_http_session()
+
+# Retries for transient failures (connection drops, timeouts, SQLite lock contention)
+CHROMA_RETRY = {"attempts": 4, "base_delay_s": 0.2, "max_delay_s": 3.0}
+
+def chroma_settings() -> dict:
+    return {
+        "mode": os.environ.get("BRAINSTORMER_CHROMA_MODE", "embedded"),
+        "path": os.environ.get("BRAINSTORMER_CHROMA_PATH", DEFAULT_CHROMA_PATH),
+        "host": os.environ.get("BRAINSTORMER_CHROMA_HOST", "localhost"),
+        "port": int(os.environ.get("BRAINSTORMER_CHROMA_PORT", DEFAULT_CHROMA_PORT)),
+        "ssl": os.environ.get("BRAINSTORMER_CHROMA_SSL") == "1",
+    }
+
+def is_transient(error) -> bool:
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, sqlite3.OperationalError) or type(error) is Exception:
+        return "database is locked" in str(error)
+    return False
+
+def with_retries(call, *args, **kwargs):
+    """
+    Runs call(*args, **kwargs), retrying transient errors with exponential backoff and jitter.
+    Every Chroma operation the app makes is safe to repeat (ids are deterministic or upserted).
+    """
+    attempts = CHROMA_RETRY["attempts"]
+    for attempt in range(attempts):
+        try:
+            return call(*args, **kwargs)
+        except Exception as e:
+            if attempt == attempts - 1 or not is_transient(e):
+                raise
+            TRACER.incr("chroma.retries")
+            delay = min(CHROMA_RETRY["max_delay_s"], CHROMA_RETRY["base_delay_s"] * 2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+class RetryingCollection:
+    """
+    Proxy over a Chroma collection that retries transient failures of its data calls.
+    """
+    RETRIED_METHODS = ("add", "upsert", "query", "get", "delete", "count", "update", "peek")
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, attr):
+        value = getattr(self._collection, attr)
+        if attr not in self.RETRIED_METHODS:
+            return value
+        return lambda *args, **kwargs: with_retries(value, *args, **kwargs)
+
+class RetryingClient:
+    """
+    Proxy over a Chroma client: calls are retried on transient failures and the collections
+    it returns are wrapped in RetryingCollection.
+    """
+    COLLECTION_METHODS = ("get_collection", "create_collection", "get_or_create_collection")
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        if not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            result = with_retries(value, *args, **kwargs)
+            return RetryingCollection(result) if attr in self.COLLECTION_METHODS else result
+        return call
+
+def create_chroma_client(pool_size=16):
+    """
+    Returns the configured Chroma client (see chroma_settings()), wrapped with retries.
+    """
+    import chromadb
+    settings = chroma_settings()
+    if settings["mode"] == "embedded":
+        return RetryingClient(chromadb.PersistentClient(path=settings["path"]))
+    if settings["mode"] != "http":
+        raise ValueError(f"Unknown BRAINSTORMER_CHROMA_MODE: {settings['mode']}")
+    client = with_retries(chromadb.HttpClient, host=settings["host"], port=settings["port"], ssl=settings["ssl"])
+    _pool_http_session(client, pool_size)
+    return RetryingClient(client)
+
+def _pool_http_session(client, pool_size):
+    # chromadb's HttpClient talks through one httpx.Client with no timeout and default pool limits,
+    # and offers no setting for either (0.6.2 rejects custom chroma_api_impl classes). The session
+    # is swapped for a pooled, bounded-timeout one; this relies on chromadb internals, so chromadb
+    # is pinned in requirements.txt and a version that moves them fails here instead of silently.
+    from http_transport import CONNECT_TIMEOUT_S, pool_limits
+    import chromadb
+    server = getattr(client, "_server", None)
+    session = getattr(server, "_session", None)
+    if not isinstance(session, httpx.Client):
+        raise RuntimeError(f"chromadb {chromadb.__version__} no longer keeps its HTTP session in "
+                           f"client._server._session (written against {PINNED_CHROMADB}); "
+                           "update chroma_backend._pool_http_session")
+    verify = server._settings.chroma_server_ssl_verify
+    server._session = httpx.Client(limits=pool_limits(pool_size), headers=session.headers,
+                                   verify=True if verify is None else verify,
+                                   timeout=httpx.Timeout(CHROMA_TIMEOUT_S, connect=CONNECT_TIMEOUT_S))
+    session.close()
+
+def start_local_server(path=DEFAULT_CHROMA_PATH, port=DEFAULT_CHROMA_PORT, host="localhost", timeout_s=60):
+    """
+    Starts `chroma run` on 'path' in a child process and waits until it answers heartbeats.
+    Returns the process; point workers at it with use_server(), stop it with process.terminate().
+    """
+    import chromadb
+    path = os.path.abspath(path)
+    os.makedirs(path, exist_ok=True)
+    log_path = os.path.join(path, "chroma_server.log")
+    with open(log_path, "ab") as log:
+        # `chroma run` also writes chroma.log to its working directory: keep that inside 'path'
+        process = subprocess.Popen(
+            [sys.executable, "-m", "chromadb.cli.cli", "run", "--path", path, "--host", host, "--port", str(port)],
+            stdout=log, stderr=subprocess.STDOUT, cwd=path,
+        )
+    deadline = time.time() + timeout_s
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"Chroma server exited with code {process.returncode}; see {log_path}")
+        try:
+            chromadb.HttpClient(host=host, port=port).heartbeat()
+            return process
+        except Exception:
+            if time.time() > deadline:
+                process.terminate()
+                raise TimeoutError(f"Chroma server on {host}:{port} did not start within {timeout_s}s")
+            time.sleep(0.25)
+
+def use_server(host="localhost", port=DEFAULT_CHROMA_PORT, env=None):
+    """
+    Points Chroma clients created afterwards (in this process or in children started with
+    'env', default os.environ) at a Chroma server.
+    """
+    env = os.environ if env is None else env
+    env.update(BRAINSTORMER_CHROMA_MODE="http", BRAINSTORMER_CHROMA_HOST=host, BRAINSTORMER_CHROMA_PORT=str(port))
+    return env
@@ -0,0 +1,29 @@
+# Shared test setup: every store the app writes to lives in a temporary directory, and app
+# tests talk to the simulated OpenAI backend (simulated_openai.py) instead of the API.
+import os
+import tempfile
+import pytest
+
+# Set before app/persona_registry/essence_cache are imported: they read these at import time
+STORE_DIR = tempfile.mkdtemp(prefix="brainstormer-tests-")
+os.environ.update(
+    BRAINSTORMER_CHROMA_PATH=os.path.join(STORE_DIR, "chroma"),
+    BRAINSTORMER_PERSONA_DB=os.path.join(STORE_DIR, "personas.sqlite"),
+    BRAINSTORMER_ESSENCE_DB=os.path.join(STORE_DIR, "persona_essences.sqlite"),
+    BRAINSTORMER_CHECKPOINT_DIR=os.path.join(STORE_DIR, "checkpoints"),
+    BRAINSTORMER_BATCH_DIR=os.path.join(STORE_DIR, "batch_jobs"),
+)
+os.environ.pop("BRAINSTORMER_CHROMA_MODE", None)
+
+@pytest.fixture(scope="session")
+def simulated_api():
+    """
+    Starts the simulated OpenAI backend with no latency and points the app's client at it.
+    Yields the SimulatedOpenAI instance.
+    """
+    from simulated_openai import SimulatedOpenAI, start_server
+    backend = SimulatedOpenAI(base_latency_ms=0, tokens_per_sec=1e9, embedding_latency_ms=0, response_tokens=40)
+    server, base_url = start_server(backend)
+    os.environ.update(OPENAI_BASE_URL=base_url, OPENAI_API_KEY="sk-simulated")
+    yield backend
+    server.shutdown()
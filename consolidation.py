@@ -0,0 +1,61 @@
+import math
+import numpy as np
+from vector_utils import as_matrix, cosine_similarity_matrix, weighted_sum_vector
+
+# Defaults for consolidating a persona's learned summaries in persona_library.
+# max_summaries: learned summaries kept per persona after consolidation.
+# trigger_count: consolidate automatically once a persona has more than this many.
+# similarity_threshold: summaries at least this similar to a cluster's centroid join it.
+# half_life_days: a summary's weight halves every this many days, so recent sessions dominate.
+CONSOLIDATION_DEFAULTS = {
+    "max_summaries": 5,
+    "trigger_count": 10,
+    "similarity_threshold": 0.85,
+    "half_life_days": 30.0,
+}
+
+def recency_weights(timestamps, now, half_life_days=None) -> list:
+    """
+    Exponential-decay weight per timestamp (seconds); 1.0 for something learned just now.
+    """
+    if half_life_days is None:
+        half_life_days = CONSOLIDATION_DEFAULTS["half_life_days"]
+    half_life_s = half_life_days * 86400
+    return [math.pow(0.5, max(0.0, now - ts) / half_life_s) for ts in timestamps]
+
+def cluster_summaries(embeddings, weights, similarity_threshold=None, max_clusters=None) -> list:
+    """
+    Groups summaries into at most 'max_clusters' clusters of near-duplicates.
+
+    Summaries are visited heaviest (most recent) first and join the most similar cluster
+    centroid when it is at least 'similarity_threshold' similar, otherwise they start a new
+    cluster. While there are too many clusters, the two with the most similar centroids are
+    merged. Centroids are recency-weighted. Returns lists of indices, heaviest first within
+    each cluster and heaviest cluster first.
+    """
+    if similarity_threshold is None:
+        similarity_threshold = CONSOLIDATION_DEFAULTS["similarity_threshold"]
+    if max_clusters is None:
+        max_clusters = CONSOLIDATION_DEFAULTS["max_summaries"]
+    matrix = as_matrix(embeddings)
+    order = sorted(range(len(matrix)), key=lambda i: weights[i], reverse=True)
+
+    clusters = []
+    for i in order:
+        if clusters:
+            centroids = [weighted_sum_vector(matrix[c], [weights[j] for j in c]) for c in clusters]
+            similarities = cosine_similarity_matrix(matrix[i], centroids)[0]
+            best = int(np.argmax(similarities))
+            if similarities[best] >= similarity_threshold:
+                clusters[best].append(i)
+                continue
+        clusters.append([i])
+
+    while len(clusters) > max(1, max_clusters):
+        centroids = [weighted_sum_vector(matrix[c], [weights[j] for j in c]) for c in clusters]
+        similarities = cosine_similarity_matrix(centroids, centroids)
+        np.fill_diagonal(similarities, -np.inf)
+        a, b = sorted(np.unravel_index(int(np.argmax(similarities)), similarities.shape))
+        clusters[a] = sorted(clusters[a] + clusters.pop(b), key=lambda j: weights[j], reverse=True)
+
+    return sorted(clusters, key=lambda c: sum(weights[j] for j in c), reverse=True)
@@ -0,0 +1,115 @@
+from vector_utils import as_matrix, centroid, cosine_similarity_matrix
+
+# Named early-stopping policies for run_brainstorming_with_reasoning.
+# novelty_threshold: a round counts as "stale" when its mean novelty (1 - max similarity to
+#                    any earlier message) is below this value.
+# max_centroid_shift: ...and the conversation centroid moved less than this during the round.
+# patience: number of consecutive stale rounds before stopping.
+# min_rounds: never stop before this many rounds have completed.
+CONVERGENCE_POLICIES = {
+    "off": None,
+    "conservative": {"novelty_threshold": 0.10, "max_centroid_shift": 0.01, "patience": 3, "min_rounds": 5},
+    "balanced": {"novelty_threshold": 0.15, "max_centroid_shift": 0.02, "patience": 2, "min_rounds": 3},
+    "aggressive": {"novelty_threshold": 0.20, "max_centroid_shift": 0.03, "patience": 1, "min_rounds": 2},
+}
+
+class ConvergenceMonitor:
+    """
+    Tracks how much new ground each round covers, using the stored message embeddings,
+    and decides when the discussion has started repeating itself.
+    """
+
+    def __init__(self, policy="balanced"):
+        if isinstance(policy, str):
+            if policy not in CONVERGENCE_POLICIES:
+                raise ValueError(f"Unknown convergence policy '{policy}'. "
+                                 f"Choose from: {', '.join(CONVERGENCE_POLICIES)}")
+            self.policy_name = policy
+            policy = CONVERGENCE_POLICIES[policy]
+        else:
+            self.policy_name = "custom" if policy else "off"
+        self.policy = policy
+        self.history = []        # embeddings of every message seen so far
+        self.rounds = []         # per-round stats
+        self.stale_rounds = 0
+        self.stop_reason = None
+
+    def observe_round(self, round_embeddings) -> dict:
+        """
+        Records a finished round and returns its stats:
+        {"round": int, "novelty": float, "max_similarity": float, "centroid_shift": float, "stale": bool}
+        """
+        round_embeddings = [e for e in round_embeddings if e is not None]
+        previous_center = centroid(self.history) if self.history else None
+
+        novelties = []
+        max_similarity = 0.0
+        for emb in round_embeddings:
+            if self.history:
+                best = float(cosine_similarity_matrix(emb, self.history).max())
+            else:
+                best = 0.0
+            max_similarity = max(max_similarity, best)
+            novelties.append(1.0 - best)
+            self.history.append(as_matrix(emb)[0])
+
+        novelty = sum(novelties) / len(novelties) if novelties else 0.0
+        if previous_center is not None and self.history:
+            centroid_shift = float(1.0 - centroid(self.history) @ previous_center)
+        else:
+            centroid_shift = 1.0
+
+        stale = bool(
+            self.policy
+            and novelty < self.policy["novelty_threshold"]
+            and centroid_shift < self.policy["max_centroid_shift"]
+        )
+        self.stale_rounds = self.stale_rounds + 1 if stale else 0
+
+        stats = {
+            "round": len(self.rounds) + 1,
+            "novelty": novelty,
+            "max_similarity": max_similarity,
+            "centroid_shift": centroid_shift,
+            "stale": stale,
+        }
+        self.rounds.append(stats)
+        return stats
+
+    def reset_patience(self):
+        """
+        Called when the conversation changes shape (e.g. a new persona joins), so a fresh voice
+        gets a chance to contribute before the session can end.
+        """
+        self.stale_rounds = 0
+
+    def should_stop(self) -> bool:
+        if not self.policy or len(self.rounds) < self.policy["min_rounds"]:
+            return False
+        if self.stale_rounds >= self.policy["patience"]:
+            last = self.rounds[-1]
+            self.stop_reason = (
+                f"novelty stayed below {self.policy['novelty_threshold']:.2f} for "
+                f"{self.stale_rounds} round(s) (last: novelty {last['novelty']:.3f}, "
+                f"centroid shift {last['centroid_shift']:.3f})"
+            )
+            return True
+        return False
+
+    def report(self, planned_rounds=None) -> str:
+        """
+        Human-readable summary of why the session stopped and how novelty evolved.
+        """
+        lines = [f"Convergence policy: {self.policy_name}"]
+        if self.stop_reason:
+            lines.append(f"Stopped early after {len(self.rounds)} of {planned_rounds or '?'} rounds: "
+                         f"{self.stop_reason}")
+        else:
+            lines.append(f"Ran all {len(self.rounds)} rounds (no convergence detected).")
+        for stats in self.rounds:
+            lines.append(
+                f"  Round {stats['round']}: novelty {stats['novelty']:.3f}, "
+                f"max similarity {stats['max_similarity']:.3f}, "
+                f"centroid shift {stats['centroid_shift']:.3f}{' (stale)' if stats['stale'] else ''}"
+            )
+        return "\n".join(lines)
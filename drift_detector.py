@@ -0,0 +1,78 @@
+from vector_utils import as_matrix, centroid, cosine_similarity_matrix
+
+class DriftDetector:
+    """
+    Cheap local check that decides whether the LLM gap monitor needs to run after a round.
+
+    Each round's message embeddings are compared against:
+    - the expertise vectors of the personas in the session (coverage), and
+    - the centroid of all earlier rounds (topic shift).
+    The gap check is only worth paying for when coverage drops or the topic moves.
+    """
+
+    def __init__(self, min_coverage=0.30, coverage_drop=0.05, shift_threshold=0.25):
+        self.min_coverage = min_coverage          # absolute floor for round coverage
+        self.coverage_drop = coverage_drop        # drop vs. last checked coverage that triggers a check
+        self.shift_threshold = shift_threshold    # 1 - cos(round centroid, history centroid)
+        self.expertise_vectors = {}               # { persona_name: embedding }
+        self.history = []                         # embeddings of every message seen so far
+        self.last_checked_coverage = None
+        self.rounds_seen = 0
+        self.checks_run = 0
+        self.checks_skipped = 0
+
+    def set_expertise(self, persona_name, embedding):
+        self.expertise_vectors[persona_name] = embedding
+
+    def coverage(self, round_embeddings) -> float:
+        """
+        Mean over the round's messages of the best similarity to any persona's expertise.
+        """
+        if not self.expertise_vectors or not round_embeddings:
+            return 0.0
+        sims = cosine_similarity_matrix(round_embeddings, list(self.expertise_vectors.values()))
+        return float(sims.max(axis=1).mean())
+
+    def topic_shift(self, round_embeddings) -> float:
+        """
+        Distance between this round's centroid and the centroid of everything said before it.
+        """
+        if not self.history or not round_embeddings:
+            return 0.0
+        round_center = centroid(round_embeddings)
+        history_center = centroid(self.history)
+        return float(1.0 - round_center @ history_center)
+
+    def observe_round(self, round_embeddings) -> dict:
+        """
+        Records a finished round and returns a report:
+        {"should_check": bool, "reason": str, "coverage": float, "shift": float}
+        """
+        round_embeddings = [e for e in round_embeddings if e is not None]
+        coverage = self.coverage(round_embeddings)
+        shift = self.topic_shift(round_embeddings)
+
+        if self.rounds_seen == 0:
+            should_check, reason = True, "first round"
+        elif coverage < self.min_coverage:
+            should_check, reason = True, f"coverage {coverage:.2f} below {self.min_coverage:.2f}"
+        elif self.last_checked_coverage is not None and \
+                self.last_checked_coverage - coverage > self.coverage_drop:
+            should_check, reason = True, (
+                f"coverage dropped {self.last_checked_coverage:.2f} -> {coverage:.2f}"
+            )
+        elif shift > self.shift_threshold:
+            should_check, reason = True, f"topic shift {shift:.2f} above {self.shift_threshold:.2f}"
+        else:
+            should_check, reason = False, "coverage stable, no topic shift"
+
+        if round_embeddings:
+            self.history.extend(as_matrix(round_embeddings))
+        self.rounds_seen += 1
+        if should_check:
+            self.checks_run += 1
+            self.last_checked_coverage = coverage
+        else:
+            self.checks_skipped += 1
+
+        return {"should_check": should_check, "reason": reason, "coverage": coverage, "shift": shift}
@@ -0,0 +1,40 @@
+import hashlib
+import struct
+from sqlite_utils import ThreadLocalConnection
+
+class EmbeddingStore:
+    """
+    On-disk embedding cache shared by every process that points at the same SQLite file.
+    Keys are (model, sha256 of the text); vectors are stored as packed float32.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = ThreadLocalConnection(self.path)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, text_hash))"
+            )
+
+    @staticmethod
+    def _key(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, model, text):
+        row = self._connection().execute(
+            "SELECT vector FROM embeddings WHERE model = ? AND text_hash = ?", (model, self._key(text))
+        ).fetchone()
+        if row is None:
+            return None
+        blob = row[0]
+        return list(struct.unpack(f"<{len(blob) // 4}f", blob))
+
+    def put(self, model, text, vector):
+        blob = struct.pack(f"<{len(vector)}f", *vector)
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                (model, self._key(text), blob)
+            )
@@ -0,0 +1,52 @@
+import hashlib
+import os
+import time
+from sqlite_utils import ThreadLocalConnection
+
+# Bump when the distillation prompt or format changes, so every stored essence is recomputed
+ESSENCE_VERSION = 1
+# Upper bound on an essence, whatever the length of the description and learned history
+ESSENCE_MAX_TOKENS = 350
+
+DEFAULT_ESSENCE_PATH = os.environ.get("BRAINSTORMER_ESSENCE_DB", "./persona_essences.sqlite")
+
+def essence_key(desc, learned_summaries) -> str:
+    """
+    Content hash of everything an essence is distilled from (and the essence format version).
+    """
+    digest = hashlib.sha256(f"v{ESSENCE_VERSION}\n".encode("utf-8"))
+    for part in [desc or ""] + list(learned_summaries):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class EssenceCache:
+    """
+    Persistent store of distilled persona essences, shared by every process that points at the
+    same SQLite file. Each persona keeps its latest essence together with the content hash of
+    the inputs it was distilled from; a lookup with a different hash is a miss.
+    """
+
+    def __init__(self, path=DEFAULT_ESSENCE_PATH):
+        self.path = path
+        self._connection = ThreadLocalConnection(self.path)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS essences ("
+                " persona_name TEXT PRIMARY KEY, input_hash TEXT NOT NULL, essence TEXT NOT NULL,"
+                " version INTEGER NOT NULL, updated_at REAL)"
+            )
+
+    def get(self, persona_name, input_hash):
+        row = self._connection().execute(
+            "SELECT essence FROM essences WHERE persona_name = ? AND input_hash = ?", (persona_name, input_hash)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, persona_name, input_hash, essence):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO essences (persona_name, input_hash, essence, version, updated_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (persona_name, input_hash, essence, ESSENCE_VERSION, time.time())
+            )
@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+
+class GapPersonaCreator:
+    """
+    Creates gap-filling personas in the background, so the conversation carries on with the
+    current personas instead of waiting for the model and the persona index.
+
+    request() starts a creation for a set of domains unless an earlier request of the session
+    already covers them (same or a superset of domains, compared case-insensitively).
+    ready() returns the personas whose creation has finished, each once and in request order;
+    the caller adds them at the next round boundary.
+
+    'handled' restores handled_domains() of an earlier run of the session (from its checkpoint),
+    so a resumed session does not create personas for the same gaps again.
+    """
+
+    def __init__(self, create, max_workers=1, handled=None):
+        self._create = create  # domains -> list of persona names, called in a worker thread
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gap-persona")
+        self._requests = [     # {"domains": frozenset, "future": Future or None, "collected": bool}
+            {"domains": self.domain_key(domains), "future": None, "collected": True}
+            for domains in handled or []
+        ]
+
+    @staticmethod
+    def domain_key(domains) -> frozenset:
+        return frozenset(domain.strip().lower() for domain in domains if domain.strip())
+
+    def request(self, domains) -> bool:
+        key = self.domain_key(domains)
+        if not key or any(key <= r["domains"] for r in self._requests):
+            return False
+        self._requests.append({"domains": key, "future": self._executor.submit(self._create, list(domains)),
+                               "collected": False})
+        return True
+
+    @property
+    def pending(self) -> int:
+        """
+        Requests whose personas have not been handed out by ready() yet.
+        """
+        return sum(1 for r in self._requests if not r["collected"])
+
+    def handled_domains(self) -> list:
+        """
+        Domains of the requests whose personas were handed out (or failed), as sorted lists.
+        Requests still running are left out: after a crash they are requested again.
+        """
+        return [sorted(r["domains"]) for r in self._requests if r["collected"]]
+
+    def ready(self) -> list:
+        names = []
+        for r in self._requests:
+            if r["collected"] or not r["future"].done():
+                continue
+            r["collected"] = True
+            try:
+                names.extend(r["future"].result())
+            except Exception as e:
+                print(f"Gap persona creation for {', '.join(sorted(r['domains']))} failed: {e}")
+        return names
+
+    def close(self):
+        """
+        Drops creations that have not started; one already running finishes in the background
+        (its persona stays in the registry for later sessions).
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
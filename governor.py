@@ -0,0 +1,59 @@
+import threading
+import time
+
+class RateGovernor:
+    """
+    Caps concurrent API calls and paces them to a requests-per-minute limit.
+
+    By default the limits apply to the threads of one process. To share them across a process
+    pool, build the governor with RateGovernor.shared(multiprocessing.Manager(), ...) and pass it
+    to the workers: the semaphore, lock and clock then live in the manager process.
+    """
+
+    def __init__(self, max_concurrent=8, requests_per_minute=None, semaphore=None, lock=None, clock=None):
+        self.max_concurrent = max_concurrent
+        self.requests_per_minute = requests_per_minute
+        self._semaphore = semaphore if semaphore is not None else threading.BoundedSemaphore(max_concurrent)
+        self._lock = lock if lock is not None else threading.Lock()
+        # clock holds the earliest time the next request may start (a Manager Value when shared)
+        self._clock = clock if clock is not None else _LocalValue(0.0)
+
+    @classmethod
+    def shared(cls, manager, max_concurrent=8, requests_per_minute=None):
+        return cls(
+            max_concurrent=max_concurrent,
+            requests_per_minute=requests_per_minute,
+            semaphore=manager.BoundedSemaphore(max_concurrent),
+            lock=manager.Lock(),
+            clock=manager.Value("d", 0.0),
+        )
+
+    def _wait_for_slot(self):
+        if not self.requests_per_minute:
+            return
+        interval = 60.0 / self.requests_per_minute
+        with self._lock:
+            now = time.time()
+            start_at = max(now, self._clock.value)
+            self._clock.value = start_at + interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        try:
+            self._wait_for_slot()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+        return False
+
+class _LocalValue:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
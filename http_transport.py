@@ -0,0 +1,109 @@
+import importlib.util
+import os
+import threading
+import httpx
+from instrumentation import TRACER
+
+DEFAULT_POOL_SIZE = 16
+KEEPALIVE_EXPIRY_S = float(os.environ.get("BRAINSTORMER_HTTP_KEEPALIVE", "60"))
+CONNECT_TIMEOUT_S = float(os.environ.get("BRAINSTORMER_HTTP_CONNECT_TIMEOUT", "5"))
+
+# Default read timeouts per API endpoint, in seconds, used when a call passes no timeout=.
+# Chat completions get extra time per requested output token, up to MAX_TIMEOUT_S.
+ENDPOINT_TIMEOUTS = {
+    "/chat/completions": float(os.environ.get("BRAINSTORMER_CHAT_TIMEOUT", "120")),
+    "/embeddings": float(os.environ.get("BRAINSTORMER_EMBEDDINGS_TIMEOUT", "30")),
+}
+CHAT_MIN_TOKENS_PER_S = 20.0  # slowest generation rate a healthy completion is expected to keep
+DEFAULT_TIMEOUT_S = 60.0
+MAX_TIMEOUT_S = 600.0         # the OpenAI SDK's own default
+
+def http2_enabled() -> bool:
+    """
+    BRAINSTORMER_HTTP2=1/0 forces HTTP/2 on or off; by default it is used when the 'h2' package is installed.
+    """
+    setting = os.environ.get("BRAINSTORMER_HTTP2", "auto")
+    if setting == "auto":
+        return importlib.util.find_spec("h2") is not None
+    return setting == "1"
+
+def endpoint_timeout(path, max_tokens=None) -> httpx.Timeout:
+    """
+    Default timeout for a call to 'path'; pass it as the call's timeout= unless the caller chose one.
+    """
+    read_timeout = DEFAULT_TIMEOUT_S
+    for suffix, endpoint_read_timeout in ENDPOINT_TIMEOUTS.items():
+        if path.endswith(suffix):
+            read_timeout = endpoint_read_timeout
+    if path.endswith("/chat/completions") and max_tokens:
+        read_timeout = min(MAX_TIMEOUT_S, read_timeout + max_tokens / CHAT_MIN_TOKENS_PER_S)
+    return httpx.Timeout(read_timeout, connect=CONNECT_TIMEOUT_S)
+
+class ConnectionStats:
+    """
+    Counts requests, new TCP connections and TLS handshakes across every pooled client in the process.
+    A request that opened no connection reused a kept-alive one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.http2_requests = 0
+
+    def record(self, events, http_version):
+        opened = "connection.connect_tcp.started" in events
+        tls = "connection.start_tls.started" in events
+        http2 = http_version == b"HTTP/2"
+        with self._lock:
+            self.requests += 1
+            self.new_connections += opened
+            self.tls_handshakes += tls
+            self.http2_requests += http2
+        TRACER.incr("http.requests")
+        if opened:
+            TRACER.incr("http.connections.new")
+        if tls:
+            TRACER.incr("http.tls_handshakes")
+
+    @property
+    def reuse_rate(self) -> float:
+        if not self.requests:
+            return 0.0
+        return 1 - self.new_connections / self.requests
+
+    def report(self) -> str:
+        return (f"HTTP connections: {self.requests} requests over {self.new_connections} connections "
+                f"({self.reuse_rate:.0%} reused, {self.tls_handshakes} TLS handshakes, "
+                f"{self.http2_requests} over HTTP/2)")
+
+CONNECTION_STATS = ConnectionStats()
+
+class PooledTransport(httpx.BaseTransport):
+    """
+    Wraps httpx's pooled transport to record connection reuse. Timeouts are the request's own.
+    """
+
+    def __init__(self, limits, http2):
+        self._inner = httpx.HTTPTransport(limits=limits, http2=http2)
+
+    def handle_request(self, request):
+        events = set()
+        request.extensions["trace"] = lambda name, info: events.add(name)
+        response = self._inner.handle_request(request)
+        CONNECTION_STATS.record(events, response.extensions.get("http_version"))
+        return response
+
+    def close(self):
+        self._inner.close()
+
+def pool_limits(pool_size) -> httpx.Limits:
+    # Keep every connection the governor can have in flight alive between calls
+    return httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                        keepalive_expiry=KEEPALIVE_EXPIRY_S)
+
+def build_http_client(pool_size=DEFAULT_POOL_SIZE) -> httpx.Client:
+    # The SDK uses this as its default; app calls pass endpoint_timeout() per request
+    return httpx.Client(transport=PooledTransport(pool_limits(pool_size), http2_enabled()),
+                        timeout=httpx.Timeout(MAX_TIMEOUT_S, connect=CONNECT_TIMEOUT_S))
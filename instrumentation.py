@@ -0,0 +1,256 @@
+import functools
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+# Bounds for long-lived processes (the service): finished spans waiting for export_jsonl(),
+# and latency samples kept per histogram for the percentiles. Counts, totals and maxima
+# are kept exactly.
+MAX_PENDING_SPANS = 10_000
+HISTOGRAM_SAMPLES = 2_000
+
+class _NoopSpan:
+    """
+    Returned by Tracer.span() when tracing is disabled, so instrumented code costs one attribute check.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def set_usage(self, usage):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class Span:
+    __slots__ = ("tracer", "name", "attrs", "parent", "timestamp", "start", "duration_ms", "error")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.parent = None
+        self.timestamp = 0.0
+        self.start = 0.0
+        self.duration_ms = 0.0
+        self.error = None
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.timestamp = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self.start) * 1000
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        stack = self.tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        self.tracer._finish(self)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def set_usage(self, usage):
+        """
+        Copies token usage from an OpenAI response onto the span and the token counters.
+        """
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+        self.attrs.update(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+        )
+        self.tracer.incr("tokens.prompt", prompt_tokens)
+        self.tracer.incr("tokens.completion", completion_tokens)
+        self.tracer.incr("tokens.cached", cached_tokens)
+
+class Tracer:
+    """
+    In-process spans, counters and histograms for a brainstorming session.
+
+    Enable with BRAINSTORMER_TRACE=1; set BRAINSTORMER_TRACE_FILE to also export every span
+    as JSON lines. When disabled, span() returns a shared no-op object and counters return immediately.
+    Histograms keep the latest HISTOGRAM_SAMPLES values per name; spans are kept until exported,
+    at most MAX_PENDING_SPANS of them (older ones are dropped and counted in 'trace.dropped_spans').
+    """
+
+    def __init__(self, enabled=False, export_path=None):
+        self.enabled = enabled
+        self.export_path = export_path
+        self.spans = deque()
+        self.counters = {}
+        self.histograms = {}
+        self._histogram_totals = {}  # name -> [count, total, max]
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def traced(self, name):
+        """
+        Decorator that wraps every call of a function in a span.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with Span(self, name, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def wrap_collection(self, collection):
+        """
+        Returns a proxy that records a span for every Chroma call, or the collection itself when disabled.
+        """
+        if not self.enabled or collection is None:
+            return collection
+        return TracedCollection(self, collection)
+
+    def incr(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._record(name, value)
+
+    def _record(self, name, value):
+        self.histograms.setdefault(name, deque(maxlen=HISTOGRAM_SAMPLES)).append(value)
+        totals = self._histogram_totals.setdefault(name, [0, 0.0, value])
+        totals[0] += 1
+        totals[1] += value
+        totals[2] = max(totals[2], value)
+
+    def _finish(self, span):
+        with self._lock:
+            if len(self.spans) >= MAX_PENDING_SPANS:
+                self.spans.popleft()
+                self.counters["trace.dropped_spans"] = self.counters.get("trace.dropped_spans", 0) + 1
+            self.spans.append(span)
+            self._record(span.name, span.duration_ms)
+            self.counters[f"calls.{span.name}"] = self.counters.get(f"calls.{span.name}", 0) + 1
+            if span.error:
+                self.counters[f"errors.{span.name}"] = self.counters.get(f"errors.{span.name}", 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.spans = deque()
+            self.counters = {}
+            self.histograms = {}
+            self._histogram_totals = {}
+
+    def summary_table(self) -> str:
+        """
+        Per-span latency table (ms) followed by counters. Percentiles are over the retained samples.
+        """
+        if not self.enabled:
+            return "Tracing disabled (set BRAINSTORMER_TRACE=1)."
+
+        header = f"{'stage':<28}{'count':>7}{'total':>11}{'mean':>9}{'p50':>9}{'p95':>9}{'max':>9}"
+        lines = ["\n=== SESSION METRICS ===", header, "-" * len(header)]
+        with self._lock:
+            histograms = {name: sorted(values) for name, values in self.histograms.items()}
+            totals = {name: list(values) for name, values in self._histogram_totals.items()}
+            counters = dict(self.counters)
+
+        for name, (count, total, peak) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            values = histograms[name]
+            lines.append(
+                f"{name:<28}{count:>7}{total:>11.1f}{total / count:>9.1f}"
+                f"{percentile(values, 50):>9.1f}{percentile(values, 95):>9.1f}{peak:>9.1f}"
+            )
+        if counters:
+            lines.append("")
+            for name, value in sorted(counters.items()):
+                lines.append(f"{name:<40}{value:>10}")
+        return "\n".join(lines)
+
+    def export_jsonl(self, path=None):
+        """
+        Appends every span finished since the last export as one JSON object per line, and
+        drops them from memory.
+        """
+        path = path or self.export_path
+        if not self.enabled or not path:
+            return
+        with self._lock:
+            spans, self.spans = self.spans, deque()
+        with open(path, "a") as f:
+            for span in spans:
+                f.write(json.dumps({
+                    "name": span.name,
+                    "parent": span.parent,
+                    "timestamp": span.timestamp,
+                    "duration_ms": round(span.duration_ms, 3),
+                    "error": span.error,
+                    "attrs": span.attrs,
+                }, default=str) + "\n")
+
+class TracedCollection:
+    """
+    Thin proxy over a Chroma collection that records 'chroma.<method>' spans.
+    """
+    TRACED_METHODS = ("add", "upsert", "query", "get", "delete", "count", "update")
+
+    def __init__(self, tracer, collection):
+        self._tracer = tracer
+        self._collection = collection
+
+    def __getattr__(self, attr):
+        value = getattr(self._collection, attr)
+        if attr not in self.TRACED_METHODS:
+            return value
+
+        def traced_call(*args, **kwargs):
+            with self._tracer.span(f"chroma.{attr}", collection=self._collection.name):
+                return value(*args, **kwargs)
+        return traced_call
+
+def percentile(sorted_values, pct) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+TRACER = Tracer(
+    enabled=os.environ.get("BRAINSTORMER_TRACE", "").lower() in ("1", "true", "yes"),
+    export_path=os.environ.get("BRAINSTORMER_TRACE_FILE"),
+)
@@ -0,0 +1,114 @@
+import hashlib
+import math
+import os
+import re
+import numpy as np
+from bounded_cache import LRUCache
+from vector_utils import normalize_rows
+
+# Where local CPU embeddings replace OpenAI embeddings, set with BRAINSTORMER_LOCAL_EMBEDDINGS
+# ("all", or a comma-separated subset):
+# session_context: storing and retrieving messages within a session (in its own collection)
+# dedup:           near-duplicate removal when re-ranking retrieved context
+# drift:           the drift/coverage gate of the gap monitor and convergence detection
+LOCAL_EMBEDDING_USES = ("session_context", "dedup", "drift")
+
+def local_embedding_uses(setting=None) -> frozenset:
+    setting = os.environ.get("BRAINSTORMER_LOCAL_EMBEDDINGS", "") if setting is None else setting
+    if setting.strip() == "all":
+        return frozenset(LOCAL_EMBEDDING_USES)
+    uses = frozenset(use.strip() for use in setting.split(",") if use.strip())
+    unknown = uses - set(LOCAL_EMBEDDING_USES)
+    if unknown:
+        raise ValueError(f"Unknown local embedding uses: {', '.join(sorted(unknown))}")
+    return uses
+
+class HashedNgramEmbedder:
+    """
+    Dependency-free embedder: words, word bigrams and character 3-5-grams are hashed into 'dim'
+    signed buckets with sublinear term weights and the vector is L2-normalized. It captures
+    lexical overlap only, which is enough to rank a session's few dozen messages.
+    """
+
+    def __init__(self, dim=512, char_ngrams=(3, 5), cache_size=200_000):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+        self.name = f"hash{dim}"
+        self._buckets = LRUCache(cache_size)  # feature -> (bucket, sign)
+
+    def _features(self, text):
+        words = re.findall(r"\w+", text.lower())
+        for i, word in enumerate(words):
+            yield f"w:{word}"
+            if i:
+                yield f"b:{words[i - 1]} {word}"
+            padded = f" {word} "
+            for n in range(self.char_ngrams[0], self.char_ngrams[1] + 1):
+                for start in range(max(1, len(padded) - n + 1)):
+                    yield padded[start:start + n]
+
+    def _bucket(self, feature):
+        cached = self._buckets.get(feature)
+        if cached is None:
+            # A stable hash (Python's hash() is salted per process), split into bucket and sign
+            value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            cached = self._buckets[feature] = (value % self.dim, 1.0 if value >> 63 else -1.0)
+        return cached
+
+    def embed(self, texts) -> list:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = {}
+            for feature in self._features(text):
+                counts[feature] = counts.get(feature, 0) + 1
+            for feature, count in counts.items():
+                bucket, sign = self._bucket(feature)
+                matrix[row, bucket] += sign * (1.0 + math.log(count))
+        return normalize_rows(matrix).tolist()
+
+class OnnxEmbedder:
+    """
+    Sentence-transformer exported to ONNX, loaded from a directory holding model.onnx and
+    tokenizer.json. Mean-pools the last hidden state. Needs the optional onnxruntime and
+    tokenizers packages.
+    """
+
+    def __init__(self, model_dir, max_length=256):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("The ONNX embedder needs 'pip install onnxruntime tokenizers'") from e
+        self.session = onnxruntime.InferenceSession(os.path.join(model_dir, "model.onnx"),
+                                                    providers=["CPUExecutionProvider"])
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        # Used in collection names: [a-zA-Z0-9._-] only, and short
+        basename = re.sub(r"[^A-Za-z0-9._-]+", "-", os.path.basename(os.path.normpath(model_dir)))
+        self.name = f"onnx-{basename}"[:40].strip("-._")
+
+    def embed(self, texts) -> list:
+        if not texts:
+            return []
+        encodings = self.tokenizer.encode_batch(list(texts))
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+        }
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        hidden = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+        mask = inputs["attention_mask"][:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return normalize_rows(pooled.astype(np.float32)).tolist()
+
+def create_local_embedder(setting=None):
+    """
+    BRAINSTORMER_LOCAL_EMBEDDER: "hash" (default) or the path of an ONNX model directory.
+    """
+    setting = os.environ.get("BRAINSTORMER_LOCAL_EMBEDDER", "hash") if setting is None else setting
+    if setting == "hash":
+        return HashedNgramEmbedder()
+    return OnnxEmbedder(setting)
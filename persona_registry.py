@@ -0,0 +1,252 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from collections.abc import Sequence
+from personas import BUILTIN_PERSONAS
+from sqlite_utils import ThreadLocalConnection
+
+DEFAULT_REGISTRY_PATH = os.environ.get("BRAINSTORMER_PERSONA_DB", "./personas.sqlite")
+
+LIST_FIELDS = ("domain_expertise", "personality_traits", "style_keywords")
+TEXT_FIELDS = ("short_bio", "desc", "role_function", "experience_level")
+SUMMARY_COLUMNS = ("name", "short_bio") + LIST_FIELDS + ("role_function", "experience_level", "source", "version")
+# A persona added by add() stays 'pending' while it is indexed; one pending for longer than this
+# was left behind by a process that died mid-add, and the next add() of that name takes it over
+PENDING_TIMEOUT_S = 300
+
+def normalize_persona(persona) -> dict:
+    """
+    Returns a clean persona dict with every field present: lists for the list fields
+    (a comma-separated string is split) and strings for the rest.
+    """
+    name = str(persona.get("name") or "").strip()
+    if not name:
+        raise ValueError("A persona needs a name")
+    clean = {"name": name}
+    for field in TEXT_FIELDS:
+        clean[field] = str(persona.get(field) or "").strip()
+    for field in LIST_FIELDS:
+        value = persona.get(field) or []
+        if isinstance(value, str):
+            value = [part.strip() for part in value.split(",") if part.strip()]
+        clean[field] = [str(item) for item in value]
+    return clean
+
+@contextlib.contextmanager
+def _transaction(conn):
+    # BEGIN IMMEDIATE takes SQLite's write lock up front, so concurrent writers queue instead of failing
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+class PersonaRegistry:
+    """
+    SQLite-backed store of every persona: the built-in ones from personas.py and the ones the
+    manager agent creates. Writes are serialized across processes by SQLite's file lock
+    (BEGIN IMMEDIATE), held only for short transactions, never across network calls. Each
+    persona has a version, and the registry has an overall version that changes on every
+    write so readers know when to reload.
+    """
+
+    def __init__(self, path=DEFAULT_REGISTRY_PATH, builtin_personas=BUILTIN_PERSONAS):
+        self.path = path
+        self.builtin_personas = builtin_personas
+        # Autocommit mode: transactions are opened explicitly in _transaction()
+        self._connections = ThreadLocalConnection(path, isolation_level=None)
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self.local_writes = 0  # writes made through this instance, so views in this process reload at once
+
+    def _connection(self):
+        conn = self._connections()
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self._create_schema(conn)
+                    self._initialized = True
+        return conn
+
+    def _create_schema(self, conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS personas ("
+            " name TEXT PRIMARY KEY, short_bio TEXT, desc TEXT, domain_expertise TEXT,"
+            " personality_traits TEXT, role_function TEXT, experience_level TEXT, style_keywords TEXT,"
+            " source TEXT NOT NULL, version INTEGER NOT NULL DEFAULT 1, status TEXT NOT NULL DEFAULT 'ready',"
+            " created_at REAL, updated_at REAL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS registry_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO registry_meta (key, value) VALUES ('version', 0)")
+        self._seed_builtins(conn)
+
+    def _seed_builtins(self, conn):
+        # New built-ins are inserted; edited ones are updated and get a new version
+        with _transaction(conn) as cursor:
+            before = conn.total_changes
+            now = time.time()
+            for persona in self.builtin_personas:
+                row = self._row(normalize_persona(persona), "builtin", now)
+                cursor.execute(
+                    "INSERT INTO personas (name, short_bio, desc, domain_expertise, personality_traits,"
+                    " role_function, experience_level, style_keywords, source, created_at, updated_at)"
+                    " VALUES (:name, :short_bio, :desc, :domain_expertise, :personality_traits,"
+                    " :role_function, :experience_level, :style_keywords, :source, :created_at, :updated_at)"
+                    " ON CONFLICT(name) DO UPDATE SET short_bio = excluded.short_bio, desc = excluded.desc,"
+                    " domain_expertise = excluded.domain_expertise, personality_traits = excluded.personality_traits,"
+                    " role_function = excluded.role_function, experience_level = excluded.experience_level,"
+                    " style_keywords = excluded.style_keywords, version = version + 1,"
+                    " updated_at = excluded.updated_at"
+                    " WHERE source = 'builtin' AND (desc IS NOT excluded.desc OR short_bio IS NOT excluded.short_bio"
+                    " OR domain_expertise IS NOT excluded.domain_expertise"
+                    " OR personality_traits IS NOT excluded.personality_traits"
+                    " OR role_function IS NOT excluded.role_function"
+                    " OR experience_level IS NOT excluded.experience_level"
+                    " OR style_keywords IS NOT excluded.style_keywords)",
+                    row
+                )
+            if conn.total_changes != before:
+                cursor.execute("UPDATE registry_meta SET value = value + 1 WHERE key = 'version'")
+
+    @staticmethod
+    def _row(persona, source, now) -> dict:
+        row = {field: persona[field] for field in ("name",) + TEXT_FIELDS}
+        row.update({field: json.dumps(persona[field]) for field in LIST_FIELDS})
+        row.update(source=source, created_at=now, updated_at=now)
+        return row
+
+    def version(self) -> int:
+        return self._connection().execute("SELECT value FROM registry_meta WHERE key = 'version'").fetchone()[0]
+
+    def list_summaries(self) -> list:
+        """
+        Every indexed persona without its full description, in insertion order.
+        """
+        rows = self._connection().execute(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM personas WHERE status = 'ready' ORDER BY rowid"
+        ).fetchall()
+        summaries = []
+        for row in rows:
+            summary = dict(zip(SUMMARY_COLUMNS, row))
+            for field in LIST_FIELDS:
+                summary[field] = json.loads(summary[field] or "[]")
+            summaries.append(summary)
+        return summaries
+
+    def get_desc(self, name) -> str:
+        row = self._connection().execute("SELECT desc FROM personas WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0]
+
+    def add(self, persona, index=None) -> bool:
+        """
+        Stores a new persona. The name is claimed first with a 'pending' row, then 'index'
+        (e.g. writing it to Chroma) runs outside any transaction, and only then is the persona
+        marked ready and visible in list_summaries(). If 'index' raises, the claim is removed.
+        Returns False, changing nothing, when a persona with that name already exists.
+        """
+        persona = normalize_persona(persona)
+        conn = self._connection()
+        now = time.time()
+        with _transaction(conn) as cursor:
+            existing = cursor.execute("SELECT status, updated_at FROM personas WHERE name = ?",
+                                      (persona["name"],)).fetchone()
+            if existing and not (existing[0] == "pending" and existing[1] < now - PENDING_TIMEOUT_S):
+                return False
+            cursor.execute("DELETE FROM personas WHERE name = ?", (persona["name"],))
+            cursor.execute(
+                "INSERT INTO personas (name, short_bio, desc, domain_expertise, personality_traits,"
+                " role_function, experience_level, style_keywords, source, status, created_at, updated_at)"
+                " VALUES (:name, :short_bio, :desc, :domain_expertise, :personality_traits,"
+                " :role_function, :experience_level, :style_keywords, :source, 'pending', :created_at, :updated_at)",
+                self._row(persona, "generated", now)
+            )
+
+        try:
+            if index is not None:
+                index(persona)
+        except BaseException:
+            with _transaction(conn) as cursor:
+                cursor.execute("DELETE FROM personas WHERE name = ? AND status = 'pending' AND created_at = ?",
+                               (persona["name"], now))
+            raise
+
+        with _transaction(conn) as cursor:
+            cursor.execute("UPDATE personas SET status = 'ready', updated_at = ? WHERE name = ?",
+                           (time.time(), persona["name"]))
+            cursor.execute("UPDATE registry_meta SET value = value + 1 WHERE key = 'version'")
+        self.local_writes += 1
+        return True
+
+class LazyPersona(dict):
+    """
+    Persona dict whose 'desc' is read from the registry the first time it is accessed.
+    """
+
+    def __init__(self, registry, fields):
+        super().__init__(fields)
+        self._registry = registry
+
+    def __missing__(self, key):
+        if key != "desc":
+            raise KeyError(key)
+        desc = self._registry.get_desc(self["name"])
+        self["desc"] = desc
+        return desc
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+class PersonaLibraryView(Sequence):
+    """
+    Read-only, list-like view of the registry that reloads whenever the registry version changes.
+    Writes made in this process show at once; those of other processes within 'refresh_s'.
+    Use snapshot() to work on one consistent list across many accesses.
+    """
+
+    def __init__(self, registry, refresh_s=1.0):
+        self.registry = registry
+        self.refresh_s = refresh_s
+        self._entries = []
+        self._version = None
+        self._checked_at = 0.0
+        self._local_writes = None
+
+    def _current(self) -> list:
+        now = time.monotonic()
+        if (self._version is not None and now - self._checked_at < self.refresh_s
+                and self._local_writes == self.registry.local_writes):
+            return self._entries
+        self._local_writes = self.registry.local_writes
+        version = self.registry.version()
+        if version != self._version:
+            self._entries = [LazyPersona(self.registry, s) for s in self.registry.list_summaries()]
+            self._version = version
+        self._checked_at = now
+        return self._entries
+
+    def snapshot(self) -> list:
+        return list(self._current())
+
+    def __getitem__(self, index):
+        return self._current()[index]
+
+    def __len__(self):
+        return len(self._current())
+
+    def __iter__(self):
+        return iter(self._current())
+
+    def __repr__(self):
+        return f"PersonaLibraryView({len(self)} personas)"
+
+PERSONA_REGISTRY = PersonaRegistry()
+PERSONA_LIBRARY = PersonaLibraryView(PERSONA_REGISTRY)
@@ -0,0 +1,178 @@
+import numpy as np
+from vector_utils import as_matrix, normalize_rows
+
+# How much each persona field counts when matching an idea. Fields a persona lacks are left
+# out and the remaining weights are renormalized.
+FIELD_WEIGHTS = {
+    "desc": 0.35,
+    "domain_expertise": 0.30,
+    "role_function": 0.15,
+    "short_bio": 0.10,
+    "style_keywords": 0.05,
+    "personality_traits": 0.05,
+}
+
+# A local match is trusted when the best persona scores at least min_score and the chosen
+# personas stand out from the library average by at least min_separation.
+LOCAL_SELECTION_DEFAULTS = {"min_score": 0.30, "min_separation": 0.03}
+
+# Team objective: relevance of each member to the idea, plus how much of the idea's domain
+# space the team covers, minus how much a new member repeats someone already picked.
+# The relevance term alone keeps the total gain positive, so the team size is decided by
+# coverage: members stop being added once the team reaches coverage_target of the coverage
+# the whole candidate pool could give, or once the best candidate would add less than
+# min_coverage_gain times the coverage the first member brought. Both are ratios, so they
+# hold whatever the embedding model's similarity range.
+TEAM_OBJECTIVE = {"relevance": 1.0, "coverage": 1.0, "redundancy": 0.5,
+                  "coverage_target": 0.9, "min_coverage_gain": 0.25}
+
+def persona_field_texts(persona) -> dict:
+    """
+    Returns {field_name: text} for every non-empty field in FIELD_WEIGHTS; list fields are comma-joined.
+    """
+    texts = {}
+    for field in FIELD_WEIGHTS:
+        value = persona.get(field)
+        if isinstance(value, (list, tuple)):
+            value = ", ".join(value)
+        if value:
+            texts[field] = value
+    return texts
+
+class PersonaFieldIndex:
+    """
+    All personas' field embeddings as one (personas, fields, dim) array, so an idea is scored
+    against every field of every persona with a single matrix product.
+    """
+
+    def __init__(self, names, field_vectors, persona_domains=None, label_vectors=None):
+        """
+        'field_vectors' maps (persona_name, field_name) to an embedding. For team selection,
+        'persona_domains' maps persona_name to its domain_expertise labels and 'label_vectors'
+        maps each label to an embedding.
+        """
+        self.names = list(names)
+        self.fields = list(FIELD_WEIGHTS)
+        dim = len(next(iter(field_vectors.values()))) if field_vectors else 0
+        self.tensor = np.zeros((len(self.names), len(self.fields), dim), dtype=np.float32)
+        self.mask = np.zeros((len(self.names), len(self.fields)), dtype=bool)
+        for p, name in enumerate(self.names):
+            for f, field in enumerate(self.fields):
+                vector = field_vectors.get((name, field))
+                if vector is not None:
+                    self.tensor[p, f] = normalize_rows(as_matrix(vector))[0]
+                    self.mask[p, f] = True
+        # One vector per persona (mean of its fields) to measure how alike two personas are
+        self.persona_vectors = normalize_rows(self.tensor.sum(axis=1)) if dim else self.tensor.sum(axis=1)
+
+        # coverage[d, p]: how well persona p's expertise covers domain label d (best matching label)
+        persona_domains = persona_domains or {}
+        label_vectors = label_vectors or {}
+        self.labels = [label for label in label_vectors]
+        self.label_matrix = (normalize_rows(as_matrix([label_vectors[label] for label in self.labels]))
+                             if self.labels else np.zeros((0, dim), dtype=np.float32))
+        label_similarity = np.clip(self.label_matrix @ self.label_matrix.T, 0.0, 1.0)
+        label_position = {label: i for i, label in enumerate(self.labels)}
+        self.coverage = np.zeros((len(self.labels), len(self.names)), dtype=np.float32)
+        for p, name in enumerate(self.names):
+            own = [label_position[label] for label in persona_domains.get(name, []) if label in label_position]
+            if own:
+                self.coverage[:, p] = label_similarity[:, own].max(axis=1)
+
+    def score(self, query_embedding, weights=None):
+        """
+        Returns (fused, per_field): the weighted fusion per persona, shape (personas,), and the
+        cosine similarity of every field, shape (personas, fields).
+        """
+        query = normalize_rows(as_matrix(query_embedding))[0]
+        per_field = self.tensor @ query
+        weights = weights or FIELD_WEIGHTS
+        field_weights = np.array([weights.get(field, 0.0) for field in self.fields], dtype=np.float32)
+        masked = self.mask * field_weights
+        totals = masked.sum(axis=1)
+        totals[totals == 0] = 1.0
+        fused = (per_field * masked).sum(axis=1) / totals
+        return fused, per_field
+
+    def rank(self, query_embedding, k=3, weights=None, min_score=None, min_separation=None) -> dict:
+        """
+        Picks the top-k personas for a query embedding and says how much to trust the pick.
+        Returns {"personas": [{"name", "score", "top_field", "fields": {field: similarity}}],
+                 "confidence": {"top_score", "separation", "confident"}}.
+        """
+        min_score = LOCAL_SELECTION_DEFAULTS["min_score"] if min_score is None else min_score
+        if min_separation is None:
+            min_separation = LOCAL_SELECTION_DEFAULTS["min_separation"]
+        if not self.names:
+            return {"personas": [], "confidence": {"top_score": 0.0, "separation": 0.0, "confident": False}}
+
+        fused, per_field = self.score(query_embedding, weights)
+        order = np.argsort(-fused)[:k]
+        personas = [self._explain(p, fused, per_field, weights) for p in order]
+
+        top_score = float(fused[order[0]])
+        separation = float(fused[order].mean() - fused.mean())
+        return {
+            "personas": personas,
+            "confidence": {
+                "top_score": top_score,
+                "separation": separation,
+                "confident": top_score >= min_score and separation >= min_separation,
+            },
+        }
+
+    def _explain(self, p, fused, per_field, weights=None) -> dict:
+        weights = weights or FIELD_WEIGHTS
+        fields = {field: float(per_field[p, f]) for f, field in enumerate(self.fields) if self.mask[p, f]}
+        top_field = max(fields, key=lambda field: fields[field] * weights.get(field, 0.0)) if fields else None
+        return {"name": self.names[p], "score": float(fused[p]), "top_field": top_field, "fields": fields}
+
+    def team(self, query_embedding, budget=3, min_size=2, candidates=None, objective=None, weights=None) -> list:
+        """
+        Chooses a team by greedy maximization of
+            relevance * sum(idea relevance) + coverage * domain coverage - redundancy * overlap,
+        where domain coverage is a facility-location function over the domain labels the idea
+        is most about (weighted by their similarity to the idea) and overlap is a new member's
+        highest similarity to someone already picked. Adding personas stops at 'budget', or
+        earlier (but not before 'min_size') once the team reaches coverage_target of the
+        coverage all candidates together would give, or the best candidate's coverage gain
+        drops below min_coverage_gain of the first member's.
+        'candidates' restricts the choice to those persona names. Returns the picks in the
+        order chosen, each as in rank() plus "gain", "coverage_gain" and "redundancy".
+        """
+        objective = {**TEAM_OBJECTIVE, **(objective or {})}
+        fused, per_field = self.score(query_embedding, weights)
+        pool = [p for p, name in enumerate(self.names) if candidates is None or name in candidates]
+
+        label_weights = np.zeros(len(self.labels), dtype=np.float32)
+        if self.labels:
+            label_relevance = self.label_matrix @ normalize_rows(as_matrix(query_embedding))[0]
+            label_weights = np.clip(label_relevance - np.median(label_relevance), 0.0, None)
+            if label_weights.sum() == 0:
+                label_weights = np.ones(len(self.labels), dtype=np.float32)
+            label_weights /= label_weights.sum()
+
+        attainable = float(label_weights @ self.coverage[:, pool].max(axis=1)) if pool and self.labels else 0.0
+        covered = np.zeros(len(self.labels), dtype=np.float32)
+        picks = []
+        while pool and len(picks) < budget:
+            if (picks and len(picks) >= min_size
+                    and float(label_weights @ covered) >= objective["coverage_target"] * attainable):
+                break
+            coverage_gain = (label_weights[:, None] * np.clip(self.coverage[:, pool] - covered[:, None], 0.0, None)).sum(axis=0)
+            if picks:
+                chosen = [pick["index"] for pick in picks]
+                redundancy = (self.persona_vectors[pool] @ self.persona_vectors[chosen].T).max(axis=1)
+            else:
+                redundancy = np.zeros(len(pool), dtype=np.float32)
+            gains = (objective["relevance"] * fused[pool] + objective["coverage"] * coverage_gain
+                     - objective["redundancy"] * redundancy)
+            best = int(np.argmax(gains))
+            if (picks and len(picks) >= min_size
+                    and coverage_gain[best] < objective["min_coverage_gain"] * picks[0]["coverage_gain"]):
+                break
+            p = pool.pop(best)
+            covered = np.maximum(covered, self.coverage[:, p])
+            picks.append({**self._explain(p, fused, per_field, weights), "index": p, "gain": float(gains[best]),
+                          "coverage_gain": float(coverage_gain[best]), "redundancy": float(redundancy[best])})
+        return picks
@@ -1,4 +1,6 @@
-PERSONA_LIBRARY = [
+# Built-in personas. They are copied into the persona registry (persona_registry.py) on first use;
+# personas created by the manager agent live only in the registry.
+BUILTIN_PERSONAS = [
     {
         'name': 'Rebecca',
         'short_bio': 'A visionary entrepreneur pushing bold, AI-driven consumer products.', 
@@ -0,0 +1,118 @@
+import threading
+from bounded_cache import LRUCache
+from token_utils import count_tokens, truncate_to_tokens
+
+# Per-section token ceilings for persona prompts
+DEFAULT_SECTION_BUDGETS = {
+    "essence": 800,
+    "context": 1200,
+    "critique": 400,
+}
+
+PERSONA_INSTRUCTIONS = (
+    "Always leverage this mindset, worldview, and expertise. "
+    "You are participating in a dynamic brainstorming session with other experts. "
+    "Engage naturally with the other participants, responding to their points while adding your unique "
+    "expertise and perspective to the discussion. "
+    "Ask questions, challenge assumptions constructively, and help evolve the idea. Offer new insights,"
+    " reference previous points without repeating them verbatim, and move the conversation forward."
+    "Contribute to the discussion in a way that aligns with your persona's style."
+)
+
+class PromptAssembler:
+    """
+    Builds persona prompts with per-section token budgets and a cache-friendly layout.
+
+    Everything that stays the same across a persona's turns (instructions, essence, the idea)
+    goes first, in a developer message that is built once per persona and reused verbatim, so
+    the provider can serve it from its prompt cache. Everything that changes every turn
+    (retrieved context, critique) goes last, in the user message.
+    """
+
+    def __init__(self, budgets=None, max_prefixes=1024):
+        self.budgets = dict(DEFAULT_SECTION_BUDGETS)
+        if budgets:
+            self.budgets.update(budgets)
+        # { (persona_name, idea): developer message content }, for the most recent personas and ideas
+        self._static_prefixes = LRUCache(max_prefixes)
+        self.last_section_tokens = {}
+
+    def fit(self, section: str, text: str) -> str:
+        budget = self.budgets.get(section)
+        text = (text or "").strip()
+        if budget is None:
+            return text
+        return truncate_to_tokens(text, budget)
+
+    def static_prefix(self, persona_name: str, essence: str, idea: str) -> str:
+        key = (persona_name, idea)
+        prefix = self._static_prefixes.get(key)
+        if prefix is None:
+            prefix = (
+                f"You are {persona_name}. Below is your personality description or 'essence':\n\n"
+                f"{self.fit('essence', essence)}\n\n"
+                f"{PERSONA_INSTRUCTIONS}\n\n"
+                f"Original idea: {idea}"
+            )
+            self._static_prefixes[key] = prefix
+        return prefix
+
+    def invalidate(self, persona_name=None):
+        """
+        Drops cached prefixes (for one persona, or all) after an essence changes.
+        """
+        if persona_name is None:
+            self._static_prefixes.clear()
+        else:
+            for key in [key for key in self._static_prefixes.keys() if key[0] == persona_name]:
+                self._static_prefixes.pop(key)
+
+    def build_persona_messages(self, persona_name, essence, idea, context, critique="") -> list:
+        prefix = self.static_prefix(persona_name, essence, idea)
+        context = self.fit("context", context)
+        critique = self.fit("critique", critique)
+
+        dynamic = f"Relevant conversation context: \n{context}\n\n"
+        if critique:
+            dynamic += f"Reasoning Agent Critique:\n{critique}\n\n"
+        dynamic += "Please provide your next message in this brainstorming session."
+
+        self.last_section_tokens = {
+            "static_prefix": count_tokens(prefix),
+            "context": count_tokens(context),
+            "critique": count_tokens(critique),
+        }
+        return [
+            {"role": "developer", "content": prefix},
+            {"role": "user", "content": dynamic},
+        ]
+
+class PromptCacheStats:
+    """
+    Accumulates prompt-cache hits reported in the 'usage' of chat completion responses.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, usage):
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+
+    @property
+    def hit_rate(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def report(self) -> str:
+        return (f"Prompt cache: {self.cached_tokens}/{self.prompt_tokens} prompt tokens served from cache "
+                f"({self.hit_rate:.1%}) across {self.calls} calls.")
@@ -0,0 +1,59 @@
+import numpy as np
+from token_utils import count_tokens, truncate_to_tokens
+from vector_utils import cosine_similarity_matrix
+
+def mmr_rerank(relevance, candidate_embeddings, k, recency=None,
+               lambda_mult=0.7, recency_weight=0.1, dedup_threshold=0.95) -> list:
+    """
+    Maximal marginal relevance over an over-fetched candidate set.
+
+    relevance:       similarity of each candidate to the query (higher is better)
+    recency:         optional 0..1 score per candidate (1 = most recent message)
+    lambda_mult:     trade-off between relevance (1.0) and diversity (0.0)
+    dedup_threshold: candidates at least this similar to an already chosen one are dropped
+
+    Returns the indices of the chosen candidates, best first.
+    """
+    if len(candidate_embeddings) == 0:
+        return []
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    if recency is not None:
+        relevance = relevance + recency_weight * np.asarray(recency, dtype=np.float32)
+    pairwise = cosine_similarity_matrix(candidate_embeddings, candidate_embeddings)
+
+    chosen = []
+    remaining = list(range(len(relevance)))
+    while remaining and len(chosen) < k:
+        if chosen:
+            redundancy = pairwise[np.ix_(remaining, chosen)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+        scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        best = remaining[int(np.argmax(scores))]
+        remaining.remove(best)
+        # Drop near-duplicates of what we already have
+        if chosen and pairwise[best, chosen].max() >= dedup_threshold:
+            continue
+        chosen.append(best)
+    return chosen
+
+def fit_to_token_budget(docs, token_budget) -> list:
+    """
+    Keeps documents in order until the token budget is spent. The first document is
+    truncated rather than dropped if it alone exceeds the budget.
+    """
+    if token_budget is None:
+        return list(docs)
+
+    fitted = []
+    used = 0
+    for doc in docs:
+        doc_tokens = count_tokens(doc)
+        if used + doc_tokens <= token_budget:
+            fitted.append(doc)
+            used += doc_tokens
+        elif not fitted:
+            fitted.append(truncate_to_tokens(doc, token_budget))
+            break
+    return fitted
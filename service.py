@@ -0,0 +1,266 @@
+# Local HTTP service that hosts many brainstorming sessions in one process.
+#
+# Sessions run in worker threads and share the OpenAI client, the embedding caches and the
+# persona index from app.py; each one keeps its own SessionContext (id, conversation
+# collection, usage stats). Endpoints:
+#
+#   POST /sessions                  {"idea": "...", "selection": "auto", ...}  -> 201 {"session_id": ...}
+#   GET  /sessions                  list sessions and their status
+#   GET  /sessions/<id>             status of one session
+#   GET  /sessions/<id>/turns       NDJSON stream of turns (past turns first, then live ones)
+#   GET  /sessions/<id>/proposal    200 with the proposal once finished, 202 while running
+#
+#   python service.py --port 8400 --max-sessions 8 --max-concurrent 16 --rpm 600
+#
+# Finished sessions stay queryable for --run-ttl seconds (default an hour), then are dropped.
+import argparse
+import asyncio
+import json
+import logging
+import time
+from checkpoint import DEFAULT_CHECKPOINT_DIR
+from governor import RateGovernor
+
+SESSION_FIELDS = ("selection", "persona_names", "persona_query", "num_personas", "total_turns_each", "k",
+                  "convergence_policy", "store_learned", "budget")
+
+DEFAULT_RUN_TTL_S = 3600
+
+REASONS = {200: "OK", 201: "Created", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 500: "Internal Server Error"}
+
+class SessionRun:
+    """
+    One hosted session: its context, the turns produced so far and the clients streaming them.
+    Only touched from the event loop thread.
+    """
+
+    def __init__(self, session, idea, params):
+        self.session = session
+        self.idea = idea
+        self.params = params
+        self.status = "queued"  # queued -> running -> complete | error
+        self.turns = []
+        self.personas = []
+        self.proposal = None
+        self.budget = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.subscribers = []
+        self.task = None
+
+    def publish(self, event):
+        if event.get("type") == "turn":
+            self.turns.append(event)
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+    def summary(self) -> dict:
+        return {
+            "session_id": self.session.session_id,
+            "idea": self.idea,
+            "status": self.status,
+            "turns": len(self.turns),
+            "personas": self.personas,
+            "budget": self.budget,
+            "error": self.error,
+            "created_at": self.created_at,
+        }
+
+class BrainstormService:
+    def __init__(self, max_sessions=4, checkpoint_dir=DEFAULT_CHECKPOINT_DIR, run_ttl_s=DEFAULT_RUN_TTL_S):
+        self.max_sessions = max_sessions
+        self.checkpoint_dir = checkpoint_dir
+        self.run_ttl_s = run_ttl_s
+        self.runs = {}
+        self._slots = None
+
+    def evict_finished(self):
+        """
+        Drops runs that finished more than run_ttl_s ago, with their turns and session context.
+        """
+        cutoff = time.time() - self.run_ttl_s
+        for session_id in [session_id for session_id, run in self.runs.items()
+                           if run.finished_at is not None and run.finished_at < cutoff]:
+            del self.runs[session_id]
+
+    async def start_session(self, body) -> SessionRun:
+        import app
+        idea = (body.get("idea") or "").strip()
+        if not idea:
+            raise ValueError("'idea' is required")
+        params = {field: body[field] for field in SESSION_FIELDS if field in body}
+        session = await asyncio.to_thread(app.create_new_conversation_collection)
+        run = SessionRun(session, idea, params)
+        self.evict_finished()
+        self.runs[session.session_id] = run
+        # The task is kept on the run, so it is not garbage-collected while it runs
+        run.task = asyncio.create_task(self._run(run))
+        run.task.add_done_callback(lambda task: _log_task_failure(run, task))
+        return run
+
+    async def _run(self, run):
+        import app
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_sessions)
+        loop = asyncio.get_running_loop()
+
+        def on_turn(turn):
+            loop.call_soon_threadsafe(run.publish, {"type": "turn", **turn})
+
+        async with self._slots:
+            run.status = "running"
+            try:
+                result = await asyncio.to_thread(
+                    app.run_session, run.idea, session=run.session, on_turn=on_turn,
+                    checkpoint_dir=self.checkpoint_dir, **run.params
+                )
+            except Exception as e:
+                run.status = "error"
+                run.error = f"{type(e).__name__}: {e}"
+                run.publish({"type": "error", "error": run.error})
+            else:
+                run.personas = result["personas"]
+                run.proposal = result["proposal"]
+                run.budget = result["budget"]
+                run.status = "complete"
+                run.publish({"type": "complete", "personas": run.personas})
+            finally:
+                run.finished_at = time.time()
+
+    async def stream_turns(self, run, writer):
+        # Snapshot and subscribe in one step on the loop thread, so no turn is missed or repeated
+        queue = asyncio.Queue()
+        backlog = list(run.turns)
+        finished = run.status in ("complete", "error")
+        if not finished:
+            run.subscribers.append(queue)
+        try:
+            for event in backlog:
+                await write_chunk(writer, event)
+            if finished:
+                await write_chunk(writer, {"type": run.status, "personas": run.personas, "error": run.error})
+                return
+            while True:
+                event = await queue.get()
+                await write_chunk(writer, event)
+                if event["type"] in ("complete", "error"):
+                    return
+        finally:
+            if queue in run.subscribers:
+                run.subscribers.remove(queue)
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            if not request_line:
+                return
+            method, path, _ = request_line.split(" ", 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+            raw_body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+            await self.route(method, path.split("?", 1)[0].rstrip("/"), raw_body, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            await send_json(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            writer.close()
+
+    async def route(self, method, path, raw_body, writer):
+        parts = [p for p in path.split("/") if p]
+        if parts[:1] != ["sessions"]:
+            return await send_json(writer, 404, {"error": "not found"})
+
+        if len(parts) == 1:
+            if method == "POST":
+                try:
+                    body = json.loads(raw_body or b"{}")
+                    run = await self.start_session(body)
+                except ValueError as e:
+                    return await send_json(writer, 400, {"error": str(e)})
+                return await send_json(writer, 201, {"session_id": run.session.session_id, "status": run.status})
+            if method == "GET":
+                self.evict_finished()
+                return await send_json(writer, 200, [run.summary() for run in self.runs.values()])
+            return await send_json(writer, 405, {"error": "method not allowed"})
+
+        run = self.runs.get(parts[1])
+        if run is None:
+            return await send_json(writer, 404, {"error": f"unknown session '{parts[1]}'"})
+        if method != "GET":
+            return await send_json(writer, 405, {"error": "method not allowed"})
+
+        if len(parts) == 2:
+            return await send_json(writer, 200, run.summary())
+        if parts[2] == "turns":
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                         b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+            await self.stream_turns(run, writer)
+            writer.write(b"0\r\n\r\n")
+            return await writer.drain()
+        if parts[2] == "proposal":
+            if run.status == "complete":
+                return await send_json(writer, 200, {"session_id": run.session.session_id, "proposal": run.proposal,
+                                                     "prompt_cache": run.session.prompt_cache_stats.report()})
+            if run.status == "error":
+                return await send_json(writer, 500, {"error": run.error})
+            return await send_json(writer, 202, {"status": run.status, "turns": len(run.turns)})
+        return await send_json(writer, 404, {"error": "not found"})
+
+def _log_task_failure(run, task):
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        logging.getLogger(__name__).error("Session %s task failed", run.session.session_id, exc_info=error)
+        run.status = "error"
+        run.error = f"{type(error).__name__}: {error}"
+        run.finished_at = run.finished_at or time.time()
+
+async def send_json(writer, status, payload):
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+
+async def write_chunk(writer, event):
+    data = (json.dumps(event) + "\n").encode("utf-8")
+    writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+    await writer.drain()
+
+async def serve(host="127.0.0.1", port=8400, max_sessions=4, checkpoint_dir=DEFAULT_CHECKPOINT_DIR,
+                run_ttl_s=DEFAULT_RUN_TTL_S):
+    import app
+    service = BrainstormService(max_sessions=max_sessions, checkpoint_dir=checkpoint_dir, run_ttl_s=run_ttl_s)
+    # Build the shared persona index once, before the first session needs it
+    await asyncio.to_thread(app.initialize_persona_collection)
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Brainstorming service listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host concurrent brainstorming sessions over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--max-sessions", type=int, default=4, help="Sessions running at the same time")
+    parser.add_argument("--max-concurrent", type=int, default=16, help="API calls in flight across all sessions")
+    parser.add_argument("--rpm", type=float, default=None, help="API requests per minute across all sessions")
+    parser.add_argument("--checkpoint-dir", default=DEFAULT_CHECKPOINT_DIR)
+    parser.add_argument("--run-ttl", type=float, default=DEFAULT_RUN_TTL_S,
+                        help="Seconds a finished session stays queryable")
+    args = parser.parse_args()
+
+    import app
+    app.configure_shared_resources(governor=RateGovernor(max_concurrent=args.max_concurrent,
+                                                         requests_per_minute=args.rpm))
+    asyncio.run(serve(args.host, args.port, args.max_sessions, args.checkpoint_dir, args.run_ttl))
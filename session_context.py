@@ -0,0 +1,29 @@
+import time
+from budget import SessionBudget
+from prompt_assembler import PromptCacheStats
+
+class SessionContext:
+    """
+    Everything that belongs to one brainstorming session: its id, its Chroma conversation
+    collection, its own usage stats and its budget. Clients, caches and the persona index are shared by
+    all sessions in the process and live in app.py.
+    """
+
+    def __init__(self, session_id, collection, budget=None):
+        self.session_id = session_id
+        self.collection = collection
+        self.local_collection = None  # set when in-session retrieval uses local embeddings
+        self.prompt_cache_stats = PromptCacheStats()
+        self.budget = budget if budget is not None else SessionBudget()
+        self.created_at = time.time()
+
+    def record_usage(self, usage, model=None, purpose="chat"):
+        """
+        Records the usage of an API call made on behalf of this session.
+        """
+        if purpose != "embeddings":
+            self.prompt_cache_stats.record(usage)
+        self.budget.record(model, usage, purpose)
+
+    def __repr__(self):
+        return f"SessionContext({self.session_id!r})"
@@ -0,0 +1,196 @@
+# A local stand-in for the OpenAI chat completions and embeddings endpoints, used by the benchmark suite.
+# Point the OpenAI client at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+# Latency is modelled as a fixed per-request delay plus generated tokens / throughput.
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from token_utils import count_tokens
+
+EMBEDDING_DIMENSIONS = 1536
+CACHEABLE_PREFIX_TOKENS = 1024  # providers only cache prompt prefixes of at least this size
+
+FILLER_WORDS = (
+    "market user pilot platform risk cost data model privacy scale partner workflow sensor "
+    "prototype feedback roadmap revenue compliance latency adoption community hardware design "
+    "experiment metric retention onboarding integration safety automation budget launch"
+).split()
+
+def hashed_embedding(text: str, dimensions=EMBEDDING_DIMENSIONS) -> list:
+    """
+    Deterministic bag-of-words embedding: similar texts get similar vectors, with no model needed.
+    """
+    vector = [0.0] * dimensions
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        digest = hashlib.md5(word.encode()).digest()
+        index = int.from_bytes(digest[:4], "little") % dimensions
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+class SimulatedOpenAI:
+    """
+    Holds the latency model and counters shared by all request handler threads.
+    """
+
+    def __init__(self, base_latency_ms=50.0, tokens_per_sec=500.0, embedding_latency_ms=10.0,
+                 response_tokens=150, seed=0):
+        self.base_latency_ms = base_latency_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.embedding_latency_ms = embedding_latency_ms
+        self.response_tokens = response_tokens
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.seen_prefixes = set()
+
+    def chat_completion(self, body: dict) -> dict:
+        messages = body.get("messages", [])
+        prompt_text = "\n".join(str(m.get("content", "")) for m in messages)
+        prompt_tokens = count_tokens(prompt_text)
+
+        with self.lock:
+            self.request_count += 1
+            request_number = self.request_count
+            prefix = str(messages[0].get("content", "")) if messages else ""
+            prefix_tokens = count_tokens(prefix)
+            cached_tokens = prefix_tokens if prefix in self.seen_prefixes and \
+                prefix_tokens >= CACHEABLE_PREFIX_TOKENS else 0
+            self.seen_prefixes.add(prefix)
+
+        content = self.reply_for(prompt_text, body, request_number)
+        completion_tokens = count_tokens(content)
+        time.sleep((self.base_latency_ms / 1000) + completion_tokens / self.tokens_per_sec)
+
+        return {
+            "id": f"chatcmpl-sim-{request_number}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            },
+        }
+
+    def reply_for(self, prompt_text: str, body: dict, request_number: int) -> str:
+        """
+        Recognizes the app's structured prompts and answers in the format they expect;
+        everything else gets deterministic filler text.
+        """
+        if "gap-detecting manager agent" in prompt_text:
+            return "No Gap"
+        if "manager agent deciding domain expertise" in prompt_text:
+            return "1) Data Science\n2) AI Ethics\n3) Product Strategy"
+        if "'manager agent' that analyzes" in prompt_text:
+            return json.dumps(["Data Science", "AI Ethics", "Product Strategy"])
+        if "persona creator" in prompt_text:
+            persona = {
+                "name": f"Sim{request_number}",
+                "short_bio": "A simulated domain expert.",
+                "desc": "A simulated persona created by the benchmark backend.",
+                "domain_expertise": ["Simulation"],
+                "personality_traits": ["Consistent"],
+                "role_function": "Simulated Expert",
+                "experience_level": "Senior",
+                "style_keywords": ["Concise"],
+            }
+            return json.dumps(persona if "single unique persona" in prompt_text else [persona])
+
+        rng = random.Random(f"{self.seed}-{request_number}")
+        words = re.findall(r"[A-Za-z]+", prompt_text)[-200:] + FILLER_WORDS
+        max_tokens = body.get("max_tokens") or self.response_tokens
+        length = max(1, min(max_tokens, self.response_tokens))
+        return " ".join(rng.choice(words) for _ in range(length))
+
+    def embeddings(self, body: dict) -> dict:
+        inputs = body.get("input", "")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        with self.lock:
+            self.request_count += 1
+        time.sleep(self.embedding_latency_ms / 1000)
+
+        data = []
+        for index, text in enumerate(inputs):
+            vector = hashed_embedding(str(text), body.get("dimensions") or EMBEDDING_DIMENSIONS)
+            if body.get("encoding_format") == "base64":
+                encoded = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode()
+                data.append({"object": "embedding", "index": index, "embedding": encoded})
+            else:
+                data.append({"object": "embedding", "index": index, "embedding": vector})
+
+        tokens = sum(count_tokens(str(text)) for text in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-3-small"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+def make_handler(backend: SimulatedOpenAI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if self.path.endswith("/chat/completions"):
+                payload = backend.chat_completion(body)
+            elif self.path.endswith("/embeddings"):
+                payload = backend.embeddings(body)
+            else:
+                self.send_error(404, f"Unknown endpoint {self.path}")
+                return
+            encoded = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(encoded)))
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        def log_message(self, format, *args):
+            pass  # keep benchmark output clean
+
+    return Handler
+
+def start_server(backend: SimulatedOpenAI, host="127.0.0.1", port=0):
+    """
+    Starts the simulated API in a daemon thread. Returns (server, base_url).
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(backend))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a simulated OpenAI API for offline benchmarking.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=500.0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=10.0)
+    parser.add_argument("--response-tokens", type=int, default=150)
+    args = parser.parse_args()
+
+    backend = SimulatedOpenAI(args.latency_ms, args.tokens_per_sec, args.embedding_latency_ms,
+                              args.response_tokens)
+    server, base_url = start_server(backend, port=args.port)
+    print(f"Simulated OpenAI API listening on {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
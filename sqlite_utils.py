@@ -0,0 +1,23 @@
+import sqlite3
+import threading
+
+class ThreadLocalConnection:
+    """
+    Calling it returns this thread's connection to the SQLite file at 'path', opened on first use.
+    Connections run in WAL mode, so readers in other processes proceed during writes. Shared by
+    the on-disk stores that several threads and processes use at once.
+    """
+
+    def __init__(self, path, **connect_kwargs):
+        self.path = path
+        self._connect_kwargs = {"timeout": 30, **connect_kwargs}
+        self._local = threading.local()
+
+    def __call__(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, **self._connect_kwargs)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
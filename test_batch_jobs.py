@@ -0,0 +1,45 @@
+# Batch queue against LocalBatchProvider: results are applied once, however often the queue is
+# polled, and a crash while applying is repaired by the next poll.
+from batch_jobs import BatchQueue, LocalBatchProvider
+
+EMBEDDINGS = "/v1/embeddings"
+
+def _queue_requests(queue, n=3):
+    for i in range(n):
+        assert queue.enqueue(f"doc-{i}", EMBEDDINGS, {"model": "text-embedding-3-small", "input": [f"text {i}"]},
+                             {"type": "store"})
+
+def test_polling_twice_applies_each_result_once(tmp_path):
+    queue = BatchQueue(str(tmp_path / "queue"))
+    provider = LocalBatchProvider(str(tmp_path / "provider"))
+    _queue_requests(queue)
+    assert not queue.enqueue("doc-0", EMBEDDINGS, {"input": ["again"]}, {"type": "store"})
+    applied = []
+    handlers = {"store": lambda queue, custom_id, action, request, response: applied.append(custom_id)}
+
+    assert len(queue.submit(provider)) == 1
+    assert queue.poll(provider, handlers) == {"applied": 3}
+    assert queue.poll(provider, handlers) == {"applied": 3}
+    # A fresh queue on the same directory, as another process would open it
+    BatchQueue(str(tmp_path / "queue")).poll(provider, handlers)
+    assert sorted(applied) == ["doc-0", "doc-1", "doc-2"]
+
+def test_a_crash_while_applying_is_repaired_by_the_next_poll(tmp_path):
+    queue = BatchQueue(str(tmp_path / "queue"))
+    provider = LocalBatchProvider(str(tmp_path / "provider"))
+    _queue_requests(queue)
+    store, calls = {}, []
+
+    def upsert_then_crash_once(queue, custom_id, action, request, response):
+        # Handlers write with upserts on deterministic ids, so writing again is harmless
+        calls.append(custom_id)
+        store[custom_id] = response["data"][0]["embedding"]
+        if custom_id == "doc-1" and calls.count("doc-1") == 1:
+            raise RuntimeError("crashed before the request was marked applied")
+
+    queue.submit(provider)
+    assert queue.poll(provider, {"store": upsert_then_crash_once}) == {"applied": 2, "completed": 1}
+    assert queue.poll(provider, {"store": upsert_then_crash_once}) == {"applied": 3}
+    assert queue.poll(provider, {"store": upsert_then_crash_once}) == {"applied": 3}
+    assert sorted(calls) == ["doc-0", "doc-1", "doc-1", "doc-2"]
+    assert sorted(store) == ["doc-0", "doc-1", "doc-2"]
@@ -0,0 +1,37 @@
+# Crash-and-resume against the simulated OpenAI backend: a session that fails in the middle of
+# a round continues from its checkpoint without repeating any turn.
+import pytest
+import app
+from checkpoint import SessionCheckpoint
+
+PERSONAS = ["Rebecca", "Joy", "Lucas"]
+
+class Crash(Exception):
+    pass
+
+def test_resume_from_a_mid_round_checkpoint_repeats_no_turn(simulated_api, tmp_path):
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    session = app.create_new_conversation_collection()
+    before = []
+
+    def crash_after_four_turns(turn):
+        before.append(turn["message"])
+        if turn["turn"] == 4:
+            raise Crash()  # round 2, after its first turn
+    with pytest.raises(Crash):
+        app.run_session("Crop disease detection app", selection="names", persona_names=PERSONAS,
+                        total_turns_each=3, convergence_policy="off", store_learned=False,
+                        checkpoint_dir=checkpoint_dir, session=session, on_turn=crash_after_four_turns)
+
+    state = SessionCheckpoint.load(session.session_id, checkpoint_dir).state
+    assert state["phase"] == "brainstorming"
+    assert state["next_turn_index"] == 4
+    assert state["rounds_done"] == 1
+
+    result = app.resume_session(session.session_id, checkpoint_dir, store_learned=False)
+    turns = [(turn.round, persona_name, message) for turn, persona_name, message in result["turn_log"]]
+    assert [(r, p) for r, p, _ in turns] == [(r, p) for r in range(3) for p in PERSONAS]
+    assert [message for _, _, message in turns[:4]] == before
+    # Every turn was stored in the session collection once
+    assert app.get_context_collection(result["session"]).count() == len(turns)
+    assert SessionCheckpoint.load(session.session_id, checkpoint_dir).state["phase"] == "complete"
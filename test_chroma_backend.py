@@ -0,0 +1,80 @@
+# Integration tests for the Chroma client/server backend: a real `chroma run` server on a
+# temporary directory. Run with `python -m pytest test_chroma_backend.py`.
+import socket
+import threading
+import time
+import httpx
+import pytest
+import chroma_backend
+
+pytest.importorskip("chromadb")
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def chroma_server(tmp_path, monkeypatch):
+    """
+    Starts a local Chroma server and points create_chroma_client() at it.
+    Yields {"path", "port", "process"}; the test may replace "process" after restarting it.
+    """
+    port = _free_port()
+    server = {"path": str(tmp_path / "chroma"), "port": port,
+              "process": chroma_backend.start_local_server(str(tmp_path / "chroma"), port=port)}
+    for key, value in chroma_backend.use_server(port=port, env={}).items():
+        monkeypatch.setenv(key, value)
+    yield server
+    server["process"].terminate()
+    server["process"].wait()
+
+def test_http_client_is_pooled_and_round_trips(chroma_server):
+    client = chroma_backend.create_chroma_client(pool_size=4)
+    session = client._client._server._session
+    assert isinstance(session, httpx.Client)
+    assert session.timeout.read == chroma_backend.CHROMA_TIMEOUT_S
+
+    collection = client.get_or_create_collection("roundtrip")
+    assert isinstance(collection, chroma_backend.RetryingCollection)
+    collection.upsert(ids=["a", "b"], documents=["x", "y"], embeddings=[[1.0, 0.0], [0.0, 1.0]])
+    result = collection.query(query_embeddings=[[0.9, 0.1]], n_results=1)
+    assert result["ids"] == [["a"]]
+
+def test_retrying_client_survives_a_server_restart(chroma_server, monkeypatch):
+    monkeypatch.setitem(chroma_backend.CHROMA_RETRY, "attempts", 30)
+    monkeypatch.setitem(chroma_backend.CHROMA_RETRY, "max_delay_s", 0.5)
+    client = chroma_backend.create_chroma_client()
+    collection = client.get_or_create_collection("restart")
+    collection.upsert(ids=["a"], documents=["x"], embeddings=[[1.0, 0.0]])
+
+    chroma_server["process"].terminate()
+    chroma_server["process"].wait()
+    retries = []
+    monkeypatch.setattr(chroma_backend.TRACER, "incr", lambda name, value=1: retries.append(name))
+
+    def restart():
+        time.sleep(1.0)
+        chroma_server["process"] = chroma_backend.start_local_server(chroma_server["path"],
+                                                                     port=chroma_server["port"])
+    restarter = threading.Thread(target=restart)
+    restarter.start()
+    try:
+        # Issued while the server is down: connection errors are retried until it is back
+        assert collection.get(ids=["a"])["documents"] == ["x"]
+    finally:
+        restarter.join()
+    assert retries and set(retries) == {"chroma.retries"}
+
+def test_non_transient_errors_are_not_retried(chroma_server):
+    client = chroma_backend.create_chroma_client()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise ValueError("bad request")
+    with pytest.raises(ValueError):
+        chroma_backend.with_retries(failing)
+    assert len(calls) == 1
+    with pytest.raises(Exception):
+        client.get_collection("does-not-exist")
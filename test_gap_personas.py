@@ -0,0 +1,34 @@
+# Gap-filling personas against the simulated OpenAI backend: reusing an existing persona
+# whose expertise matches the gap, and creating one when none does.
+import app
+from personas import BUILTIN_PERSONAS
+from gap_personas import GapPersonaCreator
+
+def test_existing_persona_with_matching_expertise_is_reused(simulated_api):
+    persona = BUILTIN_PERSONAS[0]
+    assert app.create_gap_filling_persona("idea", list(persona["domain_expertise"])) == [persona["name"]]
+
+def test_new_persona_is_created_below_the_threshold(simulated_api):
+    persona = BUILTIN_PERSONAS[0]
+    builtin = {p["name"] for p in BUILTIN_PERSONAS}
+
+    unrelated = app.create_gap_filling_persona("idea", ["zymurgy", "glassblowing"])
+    assert len(unrelated) == 1 and unrelated[0] not in builtin
+    assert app.PERSONA_REGISTRY.get_desc(unrelated[0])
+
+    # Even an exact match is not reused above it, nor when the persona is already in the session
+    for kwargs in ({"reuse_similarity": 1.01}, {"exclude": [persona["name"]]}):
+        created = app.create_gap_filling_persona("idea", list(persona["domain_expertise"]), **kwargs)
+        assert created[0] not in builtin
+
+def test_handled_domains_survive_a_resume():
+    creator = GapPersonaCreator(lambda domains: [domains[0]])
+    assert creator.request(["Robotics", "IoT"])
+    while creator.pending:
+        creator.ready()
+    creator.close()
+
+    resumed = GapPersonaCreator(lambda domains: [domains[0]], handled=creator.handled_domains())
+    assert not resumed.request(["robotics"])
+    assert resumed.pending == 0
+    resumed.close()
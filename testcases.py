@@ -1,66 +1,313 @@
-# To be imported into main file when needing to test persona matching
+# Persona-matching evaluation harness.
+#
+# Builds a test persona collection for each HNSW configuration from cached embeddings, then measures
+# recall@k against the expected personas, aspect coverage, query latency, build time and memory.
+#
+#   python testcases.py                      # sweep configs_to_test and print a comparison table
+#   python testcases.py --k 5 --repeat 20 --synthetic 2000
+#
+# Embeddings are cached in persona_eval_embeddings.json, so only the first run calls the API.
+import argparse
+import json
+import os
+import random
+import time
+import chromadb
+from app import PERSONA_HNSW_CONFIG
+from instrumentation import percentile
+from personas import BUILTIN_PERSONAS
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+DEFAULT_CACHE_PATH = "persona_eval_embeddings.json"
 
 test_cases = [
     {
         "input": "I want to build a warehouse automation system that uses computer vision",
-        "expected_personas": ["Frida", "Alex", "Maria"],  # Known good matches
+        "expected_personas": ["Frida", "Priya", "Amir"],  # Known good matches
         "required_aspects": {
-            "technical": ["Robotics", "Computer Vision"],
+            "technical": ["Robotics", "Machine Learning", "IoT"],
             "soft_skills": ["Safety-conscious"],
             "experience_level": ["Intermediate", "Senior"]
         }
     },
-    # More test cases...
+    {
+        "input": "A mental-health chatbot that adapts its tone to each user's emotional state",
+        "expected_personas": ["Leo", "Nina", "Evelyn"],
+        "required_aspects": {
+            "technical": ["AI Ethics", "Cognitive Science", "Consumer Psychology"],
+            "soft_skills": ["Empathetic"],
+            "experience_level": ["Senior", "Expert"]
+        }
+    },
+    {
+        "input": "An AR shopping experience that lets people try furniture in their living room",
+        "expected_personas": ["Joy", "Anya", "Lucas"],
+        "required_aspects": {
+            "technical": ["AR/VR", "UI/UX Design"],
+            "soft_skills": ["Playful", "User-first"],
+            "experience_level": ["Intermediate", "Expert"]
+        }
+    },
+    {
+        "input": "Carbon-footprint tracking for mid-size manufacturers' supply chains",
+        "expected_personas": ["Genevieve", "Aurora", "Kai"],
+        "required_aspects": {
+            "technical": ["Supply Chain Management", "Sustainability", "Environmental Impact"],
+            "soft_skills": ["Eco-conscious", "Cost-conscious"],
+            "experience_level": ["Intermediate", "Expert"]
+        }
+    },
+    {
+        "input": "A fintech app that automates small-business budgeting and cash-flow forecasts",
+        "expected_personas": ["Diego", "Bianca", "Xavier"],
+        "required_aspects": {
+            "technical": ["Financial Analysis", "Budgeting", "Security Engineering"],
+            "soft_skills": ["Analytical"],
+            "experience_level": ["Senior"]
+        }
+    },
+    {
+        "input": "Scaling a multiplayer game backend to millions of concurrent players",
+        "expected_personas": ["Hiro", "Arjun", "Anya"],
+        "required_aspects": {
+            "technical": ["Cloud Architecture", "DevOps", "Gamification"],
+            "soft_skills": ["Performance-focused"],
+            "experience_level": ["Intermediate", "Senior"]
+        }
+    },
 ]
 
-def evaluate_matches(collection, test_cases, config):
+configs_to_test = [
+    dict(PERSONA_HNSW_CONFIG),  # what 'persona_library' is built with
+    {"M": 64, "construction_ef": 200, "search_ef": 100},
+    {"M": 16, "construction_ef": 100, "search_ef": 50},
+    {"M": 16, "construction_ef": 200, "search_ef": 100},
+    {"M": 8, "construction_ef": 64, "search_ef": 32},
+]
+
+def persona_document(persona) -> str:
+    return persona["desc"]
+
+def load_cached_embeddings(texts, cache_path=DEFAULT_CACHE_PATH) -> dict:
+    """
+    Returns { text: embedding } for every text, calling the embeddings API only for texts
+    missing from the on-disk cache.
+    """
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cache = json.load(f)
+
+    missing = [t for t in dict.fromkeys(texts) if t not in cache]
+    if missing:
+        from openai import OpenAI
+        client = OpenAI()
+        print(f"Embedding {len(missing)} texts (cached afterwards in {cache_path})...")
+        for start in range(0, len(missing), 100):
+            batch = missing[start:start + 100]
+            response = client.embeddings.create(model=EMBEDDING_MODEL, input=batch)
+            for text, item in zip(batch, response.data):
+                cache[text] = item.embedding
+        with open(cache_path, "w") as f:
+            json.dump(cache, f)
+
+    return {t: cache[t] for t in texts}
+
+def current_rss_mb() -> float:
+    """
+    Current resident set size, read from /proc on Linux (0.0 elsewhere).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return 0.0
+
+def synthetic_vectors(base_vectors, count, noise=0.05, seed=0) -> list:
+    """
+    Jittered copies of the persona vectors, used to grow the index so HNSW settings matter.
+    """
+    rng = random.Random(seed)
+    vectors = []
+    for i in range(count):
+        base = base_vectors[i % len(base_vectors)]
+        vectors.append([v + rng.gauss(0, noise / len(base) ** 0.5) for v in base])
+    return vectors
+
+def create_test_collection(config, persona_embeddings, chroma_client, synthetic=0):
+    """
+    Builds a fresh persona collection with the given HNSW config.
+    Returns (collection, build_time_s, memory_mb).
+    """
+    name = f"persona_eval_M{config['M']}_c{config['construction_ef']}_s{config['search_ef']}"
+    try:
+        chroma_client.delete_collection(name=name)
+    except Exception:
+        pass
+
+    rss_before = current_rss_mb()
+    start_time = time.time()
+    collection = chroma_client.create_collection(
+        name=name,
+        metadata={
+            "hnsw:space": "cosine",
+            "hnsw:construction_ef": config["construction_ef"],
+            "hnsw:search_ef": config["search_ef"],
+            "hnsw:M": config["M"]
+        }
+    )
+
+    ids, documents, embeddings, metadatas = [], [], [], []
+    for p in BUILTIN_PERSONAS:
+        ids.append(f"persona-{p['name'].lower().replace(' ', '-')}")
+        documents.append(persona_document(p))
+        embeddings.append(persona_embeddings[persona_document(p)])
+        metadatas.append({
+            "persona_name": p["name"],
+            "domain_expertise": ", ".join(p["domain_expertise"]),
+            "personality_traits": ", ".join(p["personality_traits"]),
+            "experience_level": p["experience_level"],
+        })
+    for i, vector in enumerate(synthetic_vectors(embeddings, synthetic)):
+        ids.append(f"synthetic-{i}")
+        documents.append("")
+        embeddings.append(vector)
+        metadatas.append({"persona_name": f"synthetic-{i}"})
+
+    for start in range(0, len(ids), 1000):
+        end = start + 1000
+        collection.add(ids=ids[start:end], documents=documents[start:end],
+                       embeddings=embeddings[start:end], metadatas=metadatas[start:end])
+
+    build_time = time.time() - start_time
+    return collection, build_time, max(0.0, current_rss_mb() - rss_before)
+
+def find_relevant_personas(collection, query_embedding, k=3) -> list:
+    results = collection.query(query_embeddings=[query_embedding], n_results=k)
+    if not results or not results["metadatas"]:
+        return []
+    return [meta["persona_name"] for meta in results["metadatas"][0]]
+
+def evaluate_aspect_coverage(matched_personas, required_aspects) -> float:
+    """
+    Fraction of required aspect values covered by at least one matched persona.
+    'technical' is checked against domain_expertise, 'soft_skills' against personality_traits
+    and 'experience_level' against experience_level.
+    """
+    by_name = {p["name"]: p for p in BUILTIN_PERSONAS}
+    matched = [by_name[name] for name in matched_personas if name in by_name]
+
+    field_for_aspect = {
+        "technical": "domain_expertise",
+        "soft_skills": "personality_traits",
+        "experience_level": "experience_level",
+    }
+    required = 0
+    covered = 0
+    for aspect, values in required_aspects.items():
+        field = field_for_aspect.get(aspect)
+        if field is None:
+            continue
+        if aspect == "experience_level":
+            # Any of the acceptable levels counts
+            required += 1
+            if any(p[field] in values for p in matched):
+                covered += 1
+            continue
+        for value in values:
+            required += 1
+            if any(value.lower() in (item.lower() for item in p[field]) for p in matched):
+                covered += 1
+    return covered / required if required else 1.0
+
+def evaluate_matches(collection, test_cases, config, query_embeddings, k=3, repeat=10):
     results = {
         "relevance_scores": [],
         "coverage_scores": [],
         "latency_measurements": [],
         "aspect_match_scores": []
     }
-    
+
     for test_case in test_cases:
-        start_time = time.time()
-        
-        # Get matches from your manager agent
-        matched_personas = manager_agent.find_relevant_personas(
-            test_case["input"], collection
-        )
-        
-        # Measure latency
-        latency = time.time() - start_time
-        results["latency_measurements"].append(latency)
-        
-        # Evaluate relevance (how many of the expected personas were found)
+        query_embedding = query_embeddings[test_case["input"]]
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            matched_personas = find_relevant_personas(collection, query_embedding, k=k)
+            # Measure latency
+            results["latency_measurements"].append(time.perf_counter() - start_time)
+
+        # Evaluate relevance: recall@k of the expected personas
         relevance = len(set(matched_personas) & set(test_case["expected_personas"])) / \
                    len(test_case["expected_personas"])
         results["relevance_scores"].append(relevance)
-        
+
         # Evaluate aspect coverage (technical, soft skills, experience)
         coverage = evaluate_aspect_coverage(
-            matched_personas, 
+            matched_personas,
             test_case["required_aspects"]
         )
         results["coverage_scores"].append(coverage)
-        
+
     return aggregate_results(results)
 
-configs_to_test = [
-    {"M": 32, "construction_ef": 250, "search_ef": 150},
-    {"M": 64, "construction_ef": 200, "search_ef": 100},
-    # Add more configurations to test
-]
+def aggregate_results(results) -> dict:
+    latencies_ms = sorted(l * 1000 for l in results["latency_measurements"])
+
+    def mean(values):
+        return sum(values) / len(values) if values else 0.0
+
+    return {
+        "recall_at_k": mean(results["relevance_scores"]),
+        "aspect_coverage": mean(results["coverage_scores"]),
+        "latency_mean_ms": mean(latencies_ms),
+        "latency_p50_ms": percentile(latencies_ms, 50),
+        "latency_p95_ms": percentile(latencies_ms, 95),
+        "latency_p99_ms": percentile(latencies_ms, 99),
+    }
+
+def format_comparison_table(results) -> str:
+    header = (f"{'config':<36}{'recall@k':>9}{'coverage':>9}{'p50 ms':>8}{'p95 ms':>8}"
+              f"{'p99 ms':>8}{'build s':>9}{'mem MB':>8}")
+    lines = [header, "-" * len(header)]
+    for label, r in results.items():
+        lines.append(
+            f"{label:<36}{r['recall_at_k']:>9.2f}{r['aspect_coverage']:>9.2f}{r['latency_p50_ms']:>8.2f}"
+            f"{r['latency_p95_ms']:>8.2f}{r['latency_p99_ms']:>8.2f}{r['build_time_s']:>9.3f}{r['memory_mb']:>8.1f}"
+        )
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate persona matching across HNSW configurations.")
+    parser.add_argument("--k", type=int, default=3, help="Number of personas retrieved per query")
+    parser.add_argument("--repeat", type=int, default=10, help="Queries per test case for latency stats")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Extra jittered vectors added to each index to simulate a larger library")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH)
+    args = parser.parse_args()
+
+    texts = [persona_document(p) for p in BUILTIN_PERSONAS] + [tc["input"] for tc in test_cases]
+    embeddings = load_cached_embeddings(texts, args.cache)
+    chroma_client = chromadb.EphemeralClient()
+
+    results = {}
+    for config in configs_to_test:
+        # Create test collection with this config
+        test_collection, build_time, memory_mb = create_test_collection(
+            config, embeddings, chroma_client, synthetic=args.synthetic
+        )
+
+        # Run evaluation
+        label = f"M={config['M']} construction_ef={config['construction_ef']} search_ef={config['search_ef']}"
+        results[label] = evaluate_matches(
+            test_collection,
+            test_cases,
+            config,
+            embeddings,
+            k=args.k,
+            repeat=args.repeat
+        )
+        results[label]["build_time_s"] = build_time
+        results[label]["memory_mb"] = memory_mb
 
-results = {}
-for config in configs_to_test:
-    # Create test collection with this config
-    test_collection = create_test_collection(config)
-    
-    # Run evaluation
-    results[str(config)] = evaluate_matches(
-        test_collection, 
-        test_cases, 
-        config
-    )
\ No newline at end of file
+    print(format_comparison_table(results))
@@ -0,0 +1,48 @@
+import math
+
+# tiktoken is optional: it is used when installed and its encoding files are available
+# offline, otherwise we fall back to a characters-per-token estimate.
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4
+_ENCODING = None
+_ENCODING_LOADED = False
+
+def _get_encoding():
+    global _ENCODING, _ENCODING_LOADED
+    if not _ENCODING_LOADED:
+        _ENCODING_LOADED = True
+        if tiktoken is not None:
+            try:
+                _ENCODING = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                # Encoding not cached locally and no network: use the estimator
+                _ENCODING = None
+    return _ENCODING
+
+def count_tokens(text: str) -> int:
+    """
+    Returns the number of tokens in text (exact with tiktoken, estimated otherwise).
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cuts text down to at most max_tokens tokens.
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+    return text[:max_tokens * CHARS_PER_TOKEN]
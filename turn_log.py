@@ -0,0 +1,163 @@
+import io
+import threading
+
+class Turn:
+    """
+    One turn of a session. 'index' is the global speaking order and 'round' the round it
+    belongs to (both 0-based). The message text lives in the log's text buffer at
+    [offset, offset + length). 'embedding_id' is the id of the message's record in the
+    session's Chroma collection.
+    """
+    __slots__ = ("index", "persona_index", "round", "offset", "length", "embedding_id")
+
+    def __init__(self, index, persona_index, round, offset, length, embedding_id=None):
+        self.index = index
+        self.persona_index = persona_index
+        self.round = round
+        self.offset = offset
+        self.length = length
+        self.embedding_id = embedding_id
+
+    def __repr__(self):
+        return f"Turn(index={self.index}, persona_index={self.persona_index}, round={self.round})"
+
+class TurnLog:
+    """
+    Append-only log of a session's turns in the order they were spoken.
+
+    Messages are appended to one text buffer and every Turn records where its text is, so
+    appends are O(1), views are generators over the records and a transcript is rendered
+    (or streamed to a file or socket) in a single linear pass. Personas can be added at any
+    time; they keep the position in which they joined.
+    """
+
+    def __init__(self, persona_names=()):
+        self.personas = []            # persona_index -> name
+        self._persona_index = {}      # name -> persona_index
+        self._persona_turns = []      # persona_index -> list of turn indices
+        self.turns = []
+        self._text = io.StringIO()
+        self._size = 0
+        self._lock = threading.Lock()
+        for name in persona_names:
+            self.add_persona(name)
+
+    def add_persona(self, persona_name) -> int:
+        if persona_name not in self._persona_index:
+            self._persona_index[persona_name] = len(self.personas)
+            self.personas.append(persona_name)
+            self._persona_turns.append([])
+        return self._persona_index[persona_name]
+
+    @property
+    def persona_names(self) -> list:
+        return list(self.personas)
+
+    def append(self, persona_name, message, round_number, embedding_id=None) -> Turn:
+        with self._lock:
+            persona_index = self.add_persona(persona_name)
+            self._text.seek(self._size)
+            self._text.write(message)
+            turn = Turn(len(self.turns), persona_index, round_number, self._size, len(message), embedding_id)
+            self._size += len(message)
+            self.turns.append(turn)
+            self._persona_turns[persona_index].append(turn.index)
+        return turn
+
+    def text(self, turn) -> str:
+        with self._lock:
+            self._text.seek(turn.offset)
+            return self._text.read(turn.length)
+
+    def persona_of(self, turn) -> str:
+        return self.personas[turn.persona_index]
+
+    def __len__(self):
+        return len(self.turns)
+
+    def __iter__(self):
+        """
+        Yields (turn, persona_name, message) in speaking order.
+        """
+        for turn in list(self.turns):
+            yield turn, self.personas[turn.persona_index], self.text(turn)
+
+    @property
+    def rounds(self) -> int:
+        return self.turns[-1].round + 1 if self.turns else 0
+
+    def count(self, persona_name) -> int:
+        persona_index = self._persona_index.get(persona_name)
+        return 0 if persona_index is None else len(self._persona_turns[persona_index])
+
+    def for_persona(self, persona_name):
+        """
+        Yields the persona's messages in order.
+        """
+        persona_index = self._persona_index.get(persona_name)
+        if persona_index is None:
+            return
+        for turn_index in list(self._persona_turns[persona_index]):
+            yield self.text(self.turns[turn_index])
+
+    def for_round(self, round_number):
+        """
+        Yields (turn, persona_name, message) for one round.
+        """
+        # Rounds are contiguous in the log
+        for turn in list(self.turns):
+            if turn.round == round_number:
+                yield turn, self.personas[turn.persona_index], self.text(turn)
+            elif turn.round > round_number:
+                break
+
+    def last(self, n=1):
+        """
+        Yields the last n turns as (turn, persona_name, message), oldest first.
+        """
+        for turn in self.turns[max(0, len(self.turns) - n):]:
+            yield turn, self.personas[turn.persona_index], self.text(turn)
+
+    def last_message(self, persona_name):
+        persona_index = self._persona_index.get(persona_name)
+        if persona_index is None or not self._persona_turns[persona_index]:
+            return None
+        return self.text(self.turns[self._persona_turns[persona_index][-1]])
+
+    def render(self, out, template="\n{persona}, Turn {round}:\n{message}\n", personas=None) -> int:
+        """
+        Streams the transcript to 'out' (anything with write(), or a socket with sendall()),
+        one turn at a time. The template gets {turn} and {round} (1-based), {persona} and
+        {message}; 'personas' optionally maps persona names to what {persona} should show.
+        Returns the number of characters written.
+        """
+        write = out.write if hasattr(out, "write") else (lambda chunk: out.sendall(chunk.encode("utf-8")))
+        written = 0
+        for turn, persona_name, message in self:
+            chunk = template.format(turn=turn.index + 1, round=turn.round + 1, message=message,
+                                    persona=personas.get(persona_name, persona_name) if personas else persona_name)
+            write(chunk)
+            written += len(chunk)
+        return written
+
+    def render_text(self, template="\n{persona}, Turn {round}:\n{message}\n", personas=None) -> str:
+        buffer = io.StringIO()
+        self.render(buffer, template, personas)
+        return buffer.getvalue()
+
+    def to_state(self) -> dict:
+        """
+        JSON-serializable form, for checkpoints.
+        """
+        return {
+            "personas": list(self.personas),
+            "turns": [[t.persona_index, t.round, t.embedding_id] for t in self.turns],
+            "messages": [message for _, _, message in self],
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        log = cls(state["personas"])
+        for (persona_index, round_number, embedding_id), message in zip(state["turns"], state["messages"]):
+            log.append(state["personas"][persona_index], message, round_number, embedding_id)
+        return log
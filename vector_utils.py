@@ -0,0 +1,45 @@
+import numpy as np
+
+def as_matrix(vectors) -> np.ndarray:
+    """
+    Converts a list of embedding vectors (or a single vector) into a 2D float32 array.
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    return matrix
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    L2-normalizes every row so dot products become cosine similarities.
+    Zero rows are left as zeros instead of producing NaNs.
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def cosine_similarity_matrix(a, b) -> np.ndarray:
+    """
+    Returns the (len(a), len(b)) matrix of cosine similarities between two sets of vectors.
+    """
+    a = normalize_rows(as_matrix(a))
+    b = normalize_rows(as_matrix(b))
+    return a @ b.T
+
+def centroid(vectors) -> np.ndarray:
+    """
+    Returns the unit-length mean direction of a set of vectors.
+    """
+    mean = normalize_rows(as_matrix(vectors)).mean(axis=0, keepdims=True)
+    return normalize_rows(mean)[0]
+
+def weighted_sum_vector(vectors, weights=None) -> np.ndarray:
+    """
+    Combines several embeddings into one query vector: each is unit-normalized, weighted,
+    summed and re-normalized. With no weights every vector counts equally.
+    """
+    matrix = normalize_rows(as_matrix(vectors))
+    if weights is None:
+        weights = [1.0] * len(matrix)
+    combined = (np.asarray(weights, dtype=np.float32).reshape(-1, 1) * matrix).sum(axis=0, keepdims=True)
+    return normalize_rows(combined)[0]